@@ -1,6 +1,151 @@
-from django.contrib import admin
+import csv
 
-from . import models
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
 
-# Register your models here.
-admin.site.register(models.Profile)
\ No newline at end of file
+from . import avatars, models, profiles, transfer
+
+
+# selected profiles are processed this many at a time by the actions
+ACTION_BATCH_SIZE = 500
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator counting at most count_cap rows, so large changelists don't
+    run a full COUNT(*) for every page. Pages past the cap aren't linked.
+    """
+
+    count_cap = 10000
+
+    @cached_property
+    def count(self):
+        try:
+            return self.object_list.values('pk')[:self.count_cap].count()
+        except (AttributeError, TypeError):
+            return len(self.object_list)
+
+
+def _batches(queryset, *fields):
+    """
+    Yields lists of value tuples (the primary key first) of queryset, at most
+    ACTION_BATCH_SIZE per query, in primary key order
+    """
+
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by(
+            'pk').values_list('pk', *fields)[:ACTION_BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1][0]
+
+
+class _Echo(object):
+    # file-like object handing written rows to the streaming response
+    def write(self, value):
+        return value
+
+
+@admin.register(models.Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = [
+        'username',
+        'first_name',
+        'last_name',
+        'email',
+        'date_of_birth',
+        'avatar_ready',
+    ]
+    list_select_related = ['user']
+    list_filter = ['avatar_ready']
+    # prefix matches of the username, full name or email, see
+    # get_search_results
+    search_fields = ['user__username', 'search_name', 'email']
+    raw_id_fields = ['user']
+    readonly_fields = ['avatar_ready']
+    paginator = CappedCountPaginator
+    list_per_page = 50
+    show_full_result_count = False
+    actions = ['clear_avatars', 'export_csv']
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # index range scans instead of the icontains of the default search
+        return queryset.search(search_term, usernames=True), False
+
+    def save_model(self, request, obj, form, change):
+        """
+        Saves the profile like ProfileForm.save: drops its cached copy,
+        queues a new avatar for processing and releases a replaced one
+        """
+
+        avatar_changed = 'avatar' in form.changed_data
+        if avatar_changed:
+            obj.avatar_ready = False
+        previous_avatar = form.initial.get('avatar')
+
+        super(ProfileAdmin, self).save_model(request, obj, form, change)
+        profiles.invalidate_profile(obj.user_id)
+
+        if avatar_changed and obj.avatar:
+            avatars.schedule_avatar_processing(
+                obj, form.cleaned_data['avatar'])
+
+        if previous_avatar and previous_avatar.name != obj.avatar.name:
+            avatars.schedule_avatar_release(previous_avatar.name)
+
+    def username(self, profile):
+        return profile.user.username
+    username.admin_order_field = 'user__username'
+
+    def clear_avatars(self, request, queryset):
+        """
+        Removes the avatars of the selected profiles, a batch per transaction
+        """
+
+        count = 0
+        for batch in _batches(queryset.exclude(avatar=''), 'user_id',
+                              'avatar'):
+            with transaction.atomic():
+                models.Profile.objects.filter(
+                    pk__in=[pk for pk, _, _ in batch]).update(
+                        avatar=None, avatar_ready=False)
+                for _, user_id, avatar_name in batch:
+                    profiles.invalidate_profile(user_id)
+                    if avatar_name:
+                        avatars.schedule_avatar_release(avatar_name)
+            count += len(batch)
+
+        self.message_user(
+            request,
+            'Cleared {} avatar(s)'.format(count),
+            messages.SUCCESS)
+    clear_avatars.short_description = 'Clear avatars of selected profiles'
+
+    def export_csv(self, request, queryset):
+        """
+        Streams the selected profiles as CSV, in the format of the
+        export_profiles command without password hashes
+        """
+
+        fields = [name for name in transfer.FIELDS if name != 'password']
+        writer = csv.DictWriter(
+            _Echo(), fieldnames=fields, extrasaction='ignore')
+
+        def rows():
+            yield writer.writerow(dict(zip(fields, fields)))
+            for row in transfer.export_rows(
+                    chunk_size=ACTION_BATCH_SIZE, queryset=queryset):
+                yield writer.writerow(row)
+
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        response['Content-Disposition'] = (
+            'attachment; filename="profiles.csv"')
+        return response
+    export_csv.short_description = 'Export selected profiles as CSV'
@@ -0,0 +1,345 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image
+
+from . import models, profiles
+
+
+logger = logging.getLogger(__name__)
+
+# EXIF orientation tag value -> transpositions restoring an upright image
+EXIF_ORIENTATION_TAG = 274
+ORIENTATION_TRANSPOSES = {
+    2: [Image.FLIP_LEFT_RIGHT],
+    3: [Image.ROTATE_180],
+    4: [Image.FLIP_TOP_BOTTOM],
+    5: [Image.ROTATE_90, Image.FLIP_TOP_BOTTOM],
+    6: [Image.ROTATE_270],
+    7: [Image.ROTATE_270, Image.FLIP_TOP_BOTTOM],
+    8: [Image.ROTATE_90],
+}
+
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True,
+             'progressive': True},
+}
+
+# suffix of files moved aside by release_avatar until they are deleted
+RELEASED_SUFFIX = '.released'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _storage():
+    return models.Profile._meta.get_field('avatar').storage
+
+
+def rendition_sizes():
+    """
+    Returns configured rendition labels and edge lengths in pixels, largest
+    first, e.g. [('large', 512), ('medium', 256), ('small', 96)]
+    """
+
+    sizes = getattr(settings, 'AVATAR_RENDITION_SIZES', {
+        'small': 96,
+        'medium': 256,
+        'large': 512,
+    })
+    return sorted(sizes.items(), key=lambda item: item[1], reverse=True)
+
+
+def rendition_formats():
+    return getattr(settings, 'AVATAR_RENDITION_FORMATS', ('webp', 'jpeg'))
+
+
+def rendition_name(avatar_name, label, fmt):
+    """
+    Returns storage name of a rendition of the given avatar
+
+    Args:
+        avatar_name: storage name of the original avatar (string)
+        label: rendition label, e.g. 'small' (string)
+        fmt: rendition format, 'webp' or 'jpeg' (string)
+
+    Returns:
+        String, e.g. 'avatars/renditions/moe_small.webp'
+    """
+
+    root = os.path.splitext(os.path.basename(avatar_name))[0]
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    return 'avatars/renditions/{}_{}.{}'.format(root, label, extension)
+
+
+def rendition_names(avatar_name):
+    return [
+        rendition_name(avatar_name, label, fmt)
+        for label, size in rendition_sizes()
+        for fmt in rendition_formats()
+    ]
+
+
+def _upright(image):
+    """
+    Applies EXIF orientation to the pixels, since EXIF is not carried over
+    to the renditions
+    """
+
+    try:
+        exif = image._getexif() or {}
+    except (AttributeError, IndexError, KeyError, OSError, SyntaxError):
+        exif = {}
+
+    for method in ORIENTATION_TRANSPOSES.get(
+            exif.get(EXIF_ORIENTATION_TAG), []):
+        image = image.transpose(method)
+
+    return image
+
+
+def _square(image):
+    width, height = image.size
+    edge = min(width, height)
+    left = (width - edge) // 2
+    top = (height - edge) // 2
+    return image.crop((left, top, left + edge, top + edge))
+
+
+def _flatten(image):
+    """
+    Returns RGB copy of the image with transparency composed onto white
+    """
+
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+
+    return image.convert('RGB')
+
+
+def render_renditions(source):
+    """
+    Decodes the source image once and renders square renditions of every
+    configured size and format. Each size is scaled down from the previous
+    (larger) one, so the full resolution image is resampled only once.
+    EXIF metadata is not written to the renditions.
+
+    Args:
+        source: file-like object containing the original image
+
+    Returns:
+        Dictionary of (label, format) -> encoded image bytes
+    """
+
+    image = Image.open(source)
+    largest = rendition_sizes()[0][1]
+    # let the JPEG decoder downscale by a power of two while decoding
+    image.draft('RGB', (largest, largest))
+    image = _flatten(_square(_upright(image)))
+
+    renditions = {}
+    for label, size in rendition_sizes():
+        if image.size[0] > size:
+            image = image.resize((size, size), Image.LANCZOS)
+
+        for fmt in rendition_formats():
+            output = BytesIO()
+            image.save(output, **SAVE_OPTIONS[fmt])
+            renditions[(label, fmt)] = output.getvalue()
+
+    return renditions
+
+
+def process_avatar(profile_pk, avatar_name):
+    """
+    Renders and stores the renditions of an avatar, then marks the profile
+    as ready. Nothing is marked if the avatar was replaced in the meantime.
+
+    Args:
+        profile_pk: primary key of the profile (int)
+        avatar_name: storage name of the original avatar (string)
+
+    Returns:
+        None
+    """
+
+    storage = _storage()
+
+    # renditions are named after the content addressed original, so they
+    # already exist if another profile uses the same image
+    if not all(storage.exists(name) for name in rendition_names(avatar_name)):
+        with storage.open(avatar_name) as source:
+            renditions = render_renditions(source)
+
+        # content addressed storages would rename the renditions after their
+        # own content
+        save = getattr(storage, 'save_as', storage.save)
+        for (label, fmt), content in renditions.items():
+            name = rendition_name(avatar_name, label, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            save(name, ContentFile(content))
+
+    profile = models.Profile.objects.filter(
+        pk=profile_pk, avatar=avatar_name)
+    user_id = profile.values_list('user_id', flat=True).first()
+
+    if profile.update(avatar_ready=True):
+        profiles.invalidate_profile(user_id)
+
+
+def _executor_instance():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'AVATAR_WORKERS', 2))
+        return _executor
+
+
+def _run(profile_pk, avatar_name):
+    try:
+        process_avatar(profile_pk, avatar_name)
+    except Exception:
+        logger.exception('Processing of avatar %s failed', avatar_name)
+    finally:
+        close_old_connections()
+
+
+def replace_avatar(profile, name, content):
+    """
+    Stores new avatar content for the profile and queues its processing
+
+    Args:
+        profile: Profile instance
+        name: file name of the new avatar (string)
+        content: File with the avatar content
+
+    Returns:
+        None
+    """
+
+    previous_name = profile.avatar.name
+
+    profile.avatar.save(name, content, save=False)
+    profile.avatar_ready = False
+    profile.save(update_fields=['avatar', 'avatar_ready'])
+    profiles.invalidate_profile(profile.user_id)
+    schedule_avatar_processing(profile, content)
+
+    if previous_name != profile.avatar.name:
+        schedule_avatar_release(previous_name)
+
+
+def release_avatar(avatar_name):
+    """
+    Deletes an avatar file and its renditions once no profile references it
+    anymore. Files are shared by all profiles with identical avatars, so
+    they are reference counted by the profiles pointing at them.
+
+    The files are moved aside before the references are counted a last
+    time, and moved back if an identical avatar was saved meanwhile. A
+    profile saving that avatar after the count finds the file missing and
+    writes it again (see schedule_avatar_processing).
+
+    Args:
+        avatar_name: storage name of the original avatar (string)
+
+    Returns:
+        True if the files have been deleted, False otherwise
+    """
+
+    if not avatar_name:
+        return False
+
+    references = models.Profile.objects.filter(avatar=avatar_name)
+    if references.exists():
+        return False
+
+    storage = _storage()
+    released = []
+    for name in [avatar_name] + rendition_names(avatar_name):
+        path = storage.path(name)
+        try:
+            os.replace(path, path + RELEASED_SUFFIX)
+        except FileNotFoundError:
+            continue
+        released.append(path)
+
+    if references.exists():
+        for path in released:
+            os.replace(path + RELEASED_SUFFIX, path)
+        return False
+
+    for path in released:
+        os.remove(path + RELEASED_SUFFIX)
+
+    return True
+
+
+def schedule_avatar_release(avatar_name):
+    """
+    Releases the avatar (see release_avatar) once the current transaction
+    commits
+    """
+
+    transaction.on_commit(lambda: release_avatar(avatar_name))
+
+
+def schedule_avatar_processing(profile, content=None):
+    """
+    Queues rendering of the profile's avatar on the worker pool once the
+    current transaction commits. Processing runs inline if the
+    AVATAR_PROCESS_ASYNC setting is False.
+
+    Args:
+        profile: Profile instance with a saved avatar
+        content: File the avatar was saved from, written again if a
+            concurrent release_avatar removed the shared file before the
+            profile referenced it
+
+    Returns:
+        None
+    """
+
+    profile_pk, avatar_name = profile.pk, profile.avatar.name
+
+    def submit():
+        storage = _storage()
+        if content is not None and not storage.exists(avatar_name):
+            content.seek(0)
+            # avatar_name is already the content addressed name
+            getattr(storage, 'save_as', storage.save)(avatar_name, content)
+
+        if getattr(settings, 'AVATAR_PROCESS_ASYNC', True):
+            _executor_instance().submit(_run, profile_pk, avatar_name)
+        else:
+            process_avatar(profile_pk, avatar_name)
+
+    transaction.on_commit(submit)
+
+
+def wait_for_avatar_processing():
+    """
+    Waits until the avatars queued on the worker pool have been processed.
+    The pool is started again by the next scheduled avatar.
+    """
+
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+
+    if executor is not None:
+        executor.shutdown(wait=True)
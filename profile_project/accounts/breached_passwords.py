@@ -0,0 +1,197 @@
+import gzip
+import hashlib
+import heapq
+import mmap
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth.password_validation import CommonPasswordValidator
+from django.core.exceptions import ValidationError
+
+
+# index files start with this header, followed by sorted unique keys
+MAGIC = b'PWIDX\x00\x00\x01'
+KEY_SIZE = 8
+
+_indexes = {}
+
+
+def password_key(password):
+    """
+    Returns the index key of a password: the first 8 bytes of the SHA-1 of
+    the stripped, lowercased password. Collisions are negligible for corpora
+    of millions of passwords.
+
+    Args:
+        password: (string)
+
+    Returns:
+        Bytes
+    """
+
+    return hashlib.sha1(
+        password.strip().lower().encode('utf-8')).digest()[:KEY_SIZE]
+
+
+def read_passwords(path):
+    """
+    Yields the passwords of a plain text list, one per line. Lists ending
+    in .gz are decompressed on the fly.
+    """
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def _write_run(keys, directory):
+    keys.sort()
+    f = tempfile.TemporaryFile(dir=directory)
+    f.write(b''.join(keys))
+    f.seek(0)
+    return f
+
+
+def _read_run(f):
+    while True:
+        chunk = f.read(KEY_SIZE * 8192)
+        if not chunk:
+            return
+        for offset in range(0, len(chunk), KEY_SIZE):
+            yield chunk[offset:offset + KEY_SIZE]
+
+
+def build_index(passwords, path, chunk_size=1000000):
+    """
+    Writes an index of passwords to path. Keys are sorted in chunks of
+    chunk_size, which are then merged, so memory use doesn't grow with the
+    size of the corpus. The index replaces an existing file atomically.
+
+    Args:
+        passwords: iterable of passwords (strings)
+        path: location of the index (string)
+        chunk_size: number of keys sorted in memory at once (int)
+
+    Returns:
+        Number of unique keys written (int)
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    runs = []
+    keys = []
+    count = 0
+
+    try:
+        for password in passwords:
+            keys.append(password_key(password))
+            if len(keys) >= chunk_size:
+                runs.append(_write_run(keys, directory))
+                keys = []
+        if keys:
+            runs.append(_write_run(keys, directory))
+        del keys
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                output.write(MAGIC)
+                previous = None
+                for key in heapq.merge(*[_read_run(run) for run in runs]):
+                    if key != previous:
+                        output.write(key)
+                        previous = key
+                        count += 1
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    finally:
+        for run in runs:
+            run.close()
+
+    _indexes.pop(os.path.abspath(path), None)
+    return count
+
+
+class PasswordIndex(object):
+    """
+    Sorted password keys of an index file, looked up by binary search. The
+    file is memory-mapped read-only, so worker processes share its pages
+    through the page cache instead of each loading the corpus.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError('{} is not a password index'.format(path))
+            size = os.fstat(f.fileno()).st_size
+            self._map = (
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                if size > len(MAGIC) else b'')
+        self.path = path
+        self.count = (size - len(MAGIC)) // KEY_SIZE
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, password):
+        key = password_key(password)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            start = len(MAGIC) + middle * KEY_SIZE
+            current = self._map[start:start + KEY_SIZE]
+            if current < key:
+                low = middle + 1
+            elif current > key:
+                high = middle
+            else:
+                return True
+        return False
+
+
+def password_index(path=None):
+    """
+    Returns PasswordIndex of the BREACHED_PASSWORDS_INDEX setting (or the
+    given path), opened once per process, or None if there is no index
+    """
+
+    path = os.path.abspath(
+        path or getattr(settings, 'BREACHED_PASSWORDS_INDEX', None) or '')
+    if path not in _indexes:
+        try:
+            _indexes[path] = PasswordIndex(path)
+        except (OSError, ValueError):
+            return None
+    return _indexes[path]
+
+
+class BreachedPasswordValidator(object):
+    """
+    Rejects passwords found in the index built by the build_password_index
+    command. Without an index, Django's list of common passwords is used.
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self._fallback = None
+
+    def validate(self, password, user=None):
+        index = password_index(self.index_path)
+        if index is None:
+            if self._fallback is None:
+                self._fallback = CommonPasswordValidator()
+            return self._fallback.validate(password, user)
+
+        if password in index:
+            raise ValidationError(
+                'This password has appeared in a data breach and can\'t be '
+                'used.',
+                code='password_breached')
+
+    def get_help_text(self):
+        return 'Your password can\'t be a commonly used or breached password.'
@@ -0,0 +1,171 @@
+import hashlib
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import caches
+from PIL import Image
+
+from . import avatars
+
+
+FLIPS = {
+    'horizontal': Image.FLIP_LEFT_RIGHT,
+    'vertical': Image.FLIP_TOP_BOTTOM,
+}
+ROTATIONS = {
+    90: Image.ROTATE_270,  # operations rotate clockwise
+    180: Image.ROTATE_180,
+    270: Image.ROTATE_90,
+}
+
+
+def _cache():
+    # previews and digests are kept next to the profiles they belong to
+    return caches[getattr(settings, 'PROFILE_CACHE_ALIAS', 'default')]
+
+
+def source_digest(avatar):
+    """
+    Returns SHA-256 hex digest of the avatar content. The digest is cached by
+    name and size, so the file is read only once.
+
+    Args:
+        avatar: FieldFile of Profile.avatar
+
+    Returns:
+        String
+    """
+
+    key = 'accounts:avatar-digest:{}:{}'.format(
+        hashlib.md5(avatar.name.encode()).hexdigest(), avatar.size)
+    digest = _cache().get(key)
+
+    if digest is None:
+        sha = hashlib.sha256()
+        with avatar.storage.open(avatar.name) as source:
+            for chunk in iter(lambda: source.read(64 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _cache().set(key, digest, None)
+
+    return digest
+
+
+def _crop_span(length, start, extent):
+    # pixel range of a crop in percent of length, at least one pixel wide
+    first = min(int(length * max(start, 0) / 100), length - 1)
+    last = int(length * min(start + extent, 100) / 100)
+    return first, max(last, first + 1)
+
+
+def apply_operations(image, operations):
+    """
+    Applies edit operations in the given order. Crop boxes are given in
+    percent of the current image, so the same operations can be applied to
+    images of any resolution. They are clamped to the image and keep at
+    least one pixel.
+
+    Args:
+        image: PIL image
+        operations: list of (name, argument) tuples; ('rotate', 90|180|270),
+        ('flip', 'horizontal'|'vertical') or
+        ('crop', (left, top, width, height))
+
+    Returns:
+        PIL image
+    """
+
+    for name, argument in operations:
+        if name == 'rotate':
+            image = image.transpose(ROTATIONS[argument])
+        elif name == 'flip':
+            image = image.transpose(FLIPS[argument])
+        elif name == 'crop':
+            left, top, width, height = argument
+            box_left, box_right = _crop_span(image.size[0], left, width)
+            box_top, box_bottom = _crop_span(image.size[1], top, height)
+            image = image.crop((box_left, box_top, box_right, box_bottom))
+        else:
+            raise ValueError('Unknown operation {}'.format(name))
+
+    return image
+
+
+def _open(avatar, max_size=None):
+    """
+    Returns the avatar as PIL image with its EXIF orientation applied to the
+    pixels, so edits start from the upright image, and its format
+    """
+
+    with avatar.storage.open(avatar.name) as source:
+        image = Image.open(source)
+        image_format = image.format
+        if max_size:
+            image.draft('RGB', (max_size, max_size))
+            image.thumbnail((max_size, max_size), Image.LANCZOS)
+        image.load()
+    return avatars._upright(image), image_format
+
+
+def render_preview(avatar, operations):
+    """
+    Returns a low resolution JPEG preview of the edited avatar. Previews are
+    cached by content hash of source image and operation list, so repeated
+    previews of the same edit are not rendered again.
+
+    Args:
+        avatar: FieldFile of Profile.avatar
+        operations: list of operations (see apply_operations)
+
+    Returns:
+        Encoded JPEG (bytes)
+    """
+
+    size = getattr(settings, 'AVATAR_PREVIEW_SIZE', 256)
+    key = 'accounts:avatar-preview:{}'.format(hashlib.sha256(json.dumps(
+        [source_digest(avatar), operations, size]).encode()).hexdigest())
+    preview = _cache().get(key)
+
+    if preview is None:
+        # work on twice the preview size, so crops stay reasonably sharp
+        image = apply_operations(_open(avatar, size * 2)[0], operations)
+        image.thumbnail((size, size), Image.LANCZOS)
+
+        output = BytesIO()
+        image.convert('RGB').save(output, 'JPEG', quality=80)
+        preview = output.getvalue()
+
+        _cache().set(
+            key,
+            preview,
+            getattr(settings, 'AVATAR_PREVIEW_CACHE_TIMEOUT', 600))
+
+    return preview
+
+
+def render_full(avatar, operations):
+    """
+    Applies the operations to the full resolution avatar. The result is
+    upright without EXIF metadata, JPEG and WebP are encoded with the
+    options of the renditions.
+
+    Args:
+        avatar: FieldFile of Profile.avatar
+        operations: list of operations (see apply_operations)
+
+    Returns:
+        Encoded image (bytes) in the format of the original
+    """
+
+    image, image_format = _open(avatar)
+    image_format = image_format or 'PNG'
+    image = apply_operations(image, operations)
+
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    output = BytesIO()
+    image.save(output, **avatars.SAVE_OPTIONS.get(
+        image_format.lower(), {'format': image_format}))
+    return output.getvalue()
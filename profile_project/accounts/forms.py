@@ -1,85 +1,54 @@
-import re
-
 from django import forms
-from django.core.validators import MinLengthValidator
-from django.contrib.auth.password_validation import (
-    validate_password,
-    UserAttributeSimilarityValidator,
-    MinimumLengthValidator
-)
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
+from django.template.defaultfilters import filesizeformat
 
-from . import models
+from . import avatars, models, password_policy, profiles
 
 
-def contains_first_or_last_name_or_username(value, user, profile):
-    """
-    Checks if password contains first last or username
+# required in new passwords by the change password form, as they were before
+# the password policy; sign up requires those of PASSWORD_POLICY only
+CHANGE_PASSWORD_CHARACTER_CLASSES = ['upper', 'lower', 'digit', 'special']
 
-    Args:
-        value: user password (strng)
 
-    Returns:
-        Boolean
+class AvatarField(forms.ImageField):
     """
-
-    if profile.first_name.lower() in value.lower():
-        return True
-
-    if profile.last_name.lower() in value.lower():
-        return True
-
-    if user.username.lower() in value.lower():
-        return True
-
-    return False
-
-
-# Custom Validators
-def contains_combination_upper_lower(value):
-    """
-    Checks if a string contains both uppercase and lowercase letters
-
-    Args:
-        value: user password (strng)
-
-    Returns:
-        Boolean
-    """
-    if not re.search(r'[a-z]+', value) or not re.search(r'[A-Z]+', value):
-        return False
-    return True
-
-
-def contains_numerical_digits(value):
-    """
-    Checks if a string contains numerical digits
-
-    Args:
-        value: user password (strng)
-
-    Returns:
-        Boolean
+    Image field rejecting uploads larger than AVATAR_MAX_UPLOAD_SIZE bytes or
+    AVATAR_MAX_DIMENSIONS pixels. Dimensions are read from the image header,
+    so oversized images are rejected before Pillow verifies the whole file.
     """
-    if not re.search(r'[0-9]+', value):
-        return False
 
-    return True
+    default_error_messages = {
+        'file_too_large': 'Avatar must be %(max_size)s or smaller',
+        'image_too_large': (
+            'Avatar must be at most %(max_width)sx%(max_height)s pixels'),
+    }
 
+    def to_python(self, data):
+        if data in self.empty_values:
+            return super(AvatarField, self).to_python(data)
 
-def contains_special_characters(value):
-    """
-    Checks if a string contains special characters (non-alphanumerical symbols)
+        max_size = settings.AVATAR_MAX_UPLOAD_SIZE
+        if getattr(data, 'rejected', False) or data.size > max_size:
+            raise forms.ValidationError(
+                self.error_messages['file_too_large'],
+                code='file_too_large',
+                params={'max_size': filesizeformat(max_size)})
 
-    Args:
-        value: user password (strng)
+        max_width, max_height = settings.AVATAR_MAX_DIMENSIONS
+        width, height = get_image_dimensions(data)
+        if width is None or height is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_image'],
+                code='invalid_image')
 
-    Returns:
-        Boolean
-    """
-    if not re.search(r'[^a-zA-Z0-9]+', value):
-        return False
+        if width > max_width or height > max_height:
+            raise forms.ValidationError(
+                self.error_messages['image_too_large'],
+                code='image_too_large',
+                params={'max_width': max_width, 'max_height': max_height})
 
-    return True
+        return super(AvatarField, self).to_python(data)
 
 
 class ChangePasswordForm(forms.Form):
@@ -99,6 +68,7 @@ class ChangePasswordForm(forms.Form):
         Checks if validation for ChangePasswordForm satisfies the following
         criteria
             - Must not be the same as the current password
+            - Must match the confirm password
             - Minimum password length of 14 characters.
             - Must use of both uppercase and lowercase letters
             - Must include of one or more numerical digits
@@ -113,66 +83,82 @@ class ChangePasswordForm(forms.Form):
             None
 
         Raises:
-            Validation Error if any one of the above criteria are not met
+            Validation Error listing every criterion that is not met
         """
 
         current_pw = self.cleaned_data.get('current_password', '')
         new_pw = self.cleaned_data.get('new_password', '')
         confirm_pw = self.cleaned_data.get('confirm_password', '')
 
-        # if current password is not correct, then raise validation error
-        # if new password has length less than 14, then raise validation error
-        if len(new_pw) < 14:
-            raise forms.ValidationError(
-                'Password must be more than 14 characters'
-            )
+        # every rule of the policy is checked in a single pass over the
+        # password; hashing the current password is by far the most expensive
+        # check, so it runs only once all other checks pass
+        errors = password_policy.password_policy(
+            CHARACTER_CLASSES=CHANGE_PASSWORD_CHARACTER_CLASSES,
+        ).violations(new_pw, self.user, self.profile)
+
+        # if new and confirm password don't match, then raise error
+        if new_pw != confirm_pw:
+            errors.append(forms.ValidationError(
+                'New password and confirm password must match'
+            ))
+
+        # if current password and the new password are the same, raise error
+        if current_pw == new_pw:
+            errors.append(forms.ValidationError(
+                'New password must not be the same as old'
+            ))
 
+        if errors:
+            raise forms.ValidationError(errors)
+
+        # if current password is not correct, then raise validation error
         if not current_pw or not self.user.check_password(current_pw):
             raise forms.ValidationError(
                 'Entered password is incorrect'
             )
 
-        if contains_first_or_last_name_or_username(
-                new_pw,
-                self.user,
-                self.profile):
-            raise forms.ValidationError(
-                'Entered password must not contain first or last name '
-                'nor username')
 
-        # if new password doesn't have combination of lower and uppercase
-        # letters, then raise error
-        if not contains_combination_upper_lower(new_pw):
-            raise forms.ValidationError(
-                'Must contain combination of upper and '
-                'lowercase letters')
+# formats accepted for dates of birth, by forms and profile imports alike
+DATE_INPUT_FORMATS = [
+    '%Y-%m-%d',
+    '%m/%d/%Y',
+    '%m/%d/%y'
+]
 
-        # if new password doesn't have numerical digits, then raise error
-        if not contains_numerical_digits(new_pw):
-            raise forms.ValidationError('Must contain numerical digits')
+DATE_INPUT_ERROR = (
+    'Date must be one of the following formats '
+    '(YYYY-MM-DD, MM/DD/YYYY, MM/DD/YY)'
+)
 
-        # if new password doesn't contain special characters, then raise error
-        if not contains_special_characters(new_pw):
-            raise forms.ValidationError(
-                'Must contain one or more special '
-                'characters')
 
-        # if current password and the new password are the same, raise error
-        if current_pw == new_pw:
-            raise forms.ValidationError(
-                'New password must not be the same as old'
-            )
+def validate_matching_emails(email, confirm_email):
+    """
+    Checks if email and confirm email match
+
+    Args:
+        email: (string)
+        confirm_email: (string)
+
+    Returns:
+        None
+
+    Raises:
+        ValidationError if only one is given or they differ
+    """
+
+    if (email or confirm_email) and email != confirm_email:
+        raise forms.ValidationError((
+                'Please ensure that Confirm Email and '
+                'Email match'
+            ))
 
 
 class ProfileForm(forms.ModelForm):
-    date_of_birth = forms.DateField(input_formats=[
-        '%Y-%m-%d',
-        '%m/%d/%Y',
-        '%m/%d/%y'
-    ], error_messages={'invalid': (
-            'Date must be one of the following formats '
-            '(YYYY-MM-DD, MM/DD/YYYY, MM/DD/YY)'
-        )})
+    date_of_birth = forms.DateField(
+        input_formats=DATE_INPUT_FORMATS,
+        error_messages={'invalid': DATE_INPUT_ERROR})
+    avatar = AvatarField(required=False)
 
     class Meta:
         model = models.Profile
@@ -207,11 +193,109 @@ class ProfileForm(forms.ModelForm):
         """
 
         # get sanitized data
-        email = self.cleaned_data['email']
-        email_verify = self.cleaned_data['confirm_email']
-
-        if (email or email_verify) and email != email_verify:
-            raise forms.ValidationError((
-                    'Please ensure that Confirm Email and '
-                    'Email match'
-                ))
+        validate_matching_emails(
+            self.cleaned_data.get('email'),
+            self.cleaned_data.get('confirm_email'))
+
+    def save(self, commit=True):
+        """
+        Saves the profile and drops its cached copy so that the next read
+        reflects the change. A new avatar is queued for processing into
+        resized renditions, a replaced one is released.
+        """
+
+        avatar_changed = 'avatar' in self.changed_data
+        if avatar_changed:
+            self.instance.avatar_ready = False
+
+        previous_avatar = self.initial.get('avatar')
+        profile = super(ProfileForm, self).save(commit=False)
+
+        if commit:
+            # only the edited fields, since the instance may be a cached copy
+            # older than what avatar processing wrote meanwhile
+            update_fields = list(self._meta.fields)
+            if avatar_changed:
+                update_fields.append('avatar_ready')
+            profile.save(update_fields=update_fields if profile.pk else None)
+            self.save_m2m()
+            profiles.invalidate_profile(profile.user_id)
+
+            if avatar_changed and profile.avatar:
+                avatars.schedule_avatar_processing(
+                    profile, self.cleaned_data['avatar'])
+
+            if previous_avatar and previous_avatar.name != profile.avatar.name:
+                avatars.schedule_avatar_release(previous_avatar.name)
+
+        return profile
+
+
+class AvatarEditForm(forms.Form):
+    rotate = forms.TypedChoiceField(
+        choices=[(0, 'None'), (90, '90°'), (180, '180°'), (270, '270°')],
+        coerce=int,
+        required=False,
+        empty_value=0)
+    flip_horizontal = forms.BooleanField(required=False)
+    flip_vertical = forms.BooleanField(required=False)
+    # crop box in percent of the (rotated) image
+    crop_left = forms.FloatField(
+        min_value=0, max_value=100, required=False)
+    crop_top = forms.FloatField(
+        min_value=0, max_value=100, required=False)
+    crop_width = forms.FloatField(
+        min_value=1, max_value=100, required=False)
+    crop_height = forms.FloatField(
+        min_value=1, max_value=100, required=False)
+
+    def clean(self):
+        """
+        Checks that the crop box lies within the image
+
+        Raises:
+            ValidationError if the box reaches past the right or bottom edge
+        """
+
+        data = self.cleaned_data
+        if data.get('crop_width') or data.get('crop_height'):
+            if ((data.get('crop_left') or 0) +
+                    (data.get('crop_width') or 100) > 100 or
+                    (data.get('crop_top') or 0) +
+                    (data.get('crop_height') or 100) > 100):
+                raise forms.ValidationError(
+                    'The crop area must lie within the image')
+
+    def operations(self):
+        """
+        Returns the edit as list of operations for accounts.editor, in the
+        order rotate, flip, crop
+
+        Args:
+            None
+
+        Returns:
+            List of (name, argument) tuples
+        """
+
+        data = self.cleaned_data
+        operations = []
+
+        if data.get('rotate'):
+            operations.append(('rotate', data['rotate']))
+
+        if data.get('flip_horizontal'):
+            operations.append(('flip', 'horizontal'))
+
+        if data.get('flip_vertical'):
+            operations.append(('flip', 'vertical'))
+
+        if data.get('crop_width') or data.get('crop_height'):
+            operations.append(('crop', (
+                data.get('crop_left') or 0,
+                data.get('crop_top') or 0,
+                data.get('crop_width') or 100,
+                data.get('crop_height') or 100,
+            )))
+
+        return operations
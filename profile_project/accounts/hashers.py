@@ -0,0 +1,158 @@
+import functools
+import re
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.dispatch import Signal
+from django.utils.encoding import force_bytes
+from django.utils.translation import ugettext_noop as _
+
+
+ARGON2_PARAMETERS = re.compile(r'm=(\d+),t=(\d+),p=(\d+)')
+
+DEFAULT_PASSWORD_HASHING = {
+    'PBKDF2_ITERATIONS': hashers.PBKDF2PasswordHasher.iterations,
+    'BCRYPT_ROUNDS': hashers.BCryptSHA256PasswordHasher.rounds,
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 512,
+    'ARGON2_PARALLELISM': 2,
+}
+
+
+# sent after each password hash with the algorithm and duration (seconds),
+# i.e. for request metrics (see project_7.metrics)
+password_hashed = Signal(providing_args=['algorithm', 'duration'])
+
+
+def timed(method):
+    """
+    Decorates a hasher method to send password_hashed once it returns
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            password_hashed.send(
+                sender=self.__class__,
+                algorithm=self.algorithm,
+                duration=time.perf_counter() - start)
+    return wrapper
+
+
+def cost(name):
+    """
+    Returns a cost parameter of the PASSWORD_HASHING setting
+
+    Args:
+        name: i.e. 'PBKDF2_ITERATIONS' (string)
+
+    Returns:
+        Int
+    """
+
+    return getattr(settings, 'PASSWORD_HASHING', {}).get(
+        name, DEFAULT_PASSWORD_HASHING[name])
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 with the iteration count of PASSWORD_HASHING. Stored hashes
+    with a different count are upgraded on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return cost('PBKDF2_ITERATIONS')
+
+    # verify hashes through encode
+    encode = timed(hashers.PBKDF2PasswordHasher.encode)
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    """
+    bcrypt (of the SHA-256 of the password) with the rounds of
+    PASSWORD_HASHING. Requires the bcrypt library.
+    """
+
+    @property
+    def rounds(self):
+        return cost('BCRYPT_ROUNDS')
+
+    # verify hashes through encode
+    encode = timed(hashers.BCryptSHA256PasswordHasher.encode)
+
+
+class Argon2PasswordHasher(hashers.BasePasswordHasher):
+    """
+    Argon2id with the time cost, memory cost (KiB) and parallelism of
+    PASSWORD_HASHING. Requires the argon2-cffi library. Hashes are stored as
+    'argon2' followed by the encoded hash of the library, i.e.
+    argon2$argon2id$v=19$m=512,t=2,p=2$salt$hash
+    """
+
+    algorithm = 'argon2'
+    library = 'argon2'
+
+    @timed
+    def encode(self, password, salt):
+        argon2 = self._load_library()
+        data = argon2.low_level.hash_secret(
+            force_bytes(password),
+            force_bytes(salt),
+            time_cost=cost('ARGON2_TIME_COST'),
+            memory_cost=cost('ARGON2_MEMORY_COST'),
+            parallelism=cost('ARGON2_PARALLELISM'),
+            hash_len=32,
+            type=argon2.low_level.Type.ID)
+        return self.algorithm + data.decode('ascii')
+
+    @timed
+    def verify(self, password, encoded):
+        argon2 = self._load_library()
+        algorithm, rest = encoded.split('$', 1)
+        assert algorithm == self.algorithm
+        variety = rest.split('$', 1)[0]
+        try:
+            return argon2.low_level.verify_secret(
+                force_bytes('$' + rest),
+                force_bytes(password),
+                type=getattr(argon2.low_level.Type, variety[6:].upper()))
+        except (argon2.exceptions.VerificationError, AttributeError):
+            return False
+
+    def _parameters(self, encoded):
+        memory_cost, time_cost, parallelism = ARGON2_PARAMETERS.search(
+            encoded).groups()
+        return int(time_cost), int(memory_cost), int(parallelism)
+
+    def safe_summary(self, encoded):
+        algorithm, variety, version, parameters, salt, data = (
+            encoded.split('$', 5))
+        time_cost, memory_cost, parallelism = self._parameters(encoded)
+        return OrderedDict([
+            (_('algorithm'), algorithm),
+            (_('variety'), variety),
+            (_('version'), version[2:]),
+            (_('memory cost'), memory_cost),
+            (_('time cost'), time_cost),
+            (_('parallelism'), parallelism),
+            (_('salt'), hashers.mask_hash(salt)),
+            (_('hash'), hashers.mask_hash(data)),
+        ])
+
+    def must_update(self, encoded):
+        return (
+            not encoded.startswith(self.algorithm + '$argon2id$') or
+            self._parameters(encoded) != (
+                cost('ARGON2_TIME_COST'),
+                cost('ARGON2_MEMORY_COST'),
+                cost('ARGON2_PARALLELISM')))
+
+    def harden_runtime(self, password, encoded):
+        # memory cost can't be made up for by extra work
+        pass
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from accounts import profiles
+
+
+class Command(BaseCommand):
+    help = 'Creates empty profiles for users that do not have one'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of profiles created per transaction')
+
+    def handle(self, *args, **options):
+        created = profiles.create_missing_profiles(
+            batch_size=options['batch_size'])
+
+        self.stdout.write('Created {} profile(s)'.format(created))
@@ -0,0 +1,85 @@
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+from django.utils.crypto import get_random_string
+
+
+def _hash_until(args):
+    """
+    Hashes a password repeatedly for the given number of seconds
+
+    Returns:
+        (number of hashes, elapsed seconds)
+    """
+
+    algorithm, duration = args
+    hasher = next(h for h in get_hashers() if h.algorithm == algorithm)
+    password = get_random_string(16)
+    count = 0
+
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        hasher.encode(password, hasher.salt())
+        count += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return count, now - start
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures password hashes per second per core of the configured '
+        'hashers, to size the PASSWORD_HASHING cost parameters')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--algorithm', action='append',
+            help='Hasher algorithm to measure, i.e. pbkdf2_sha256 (defaults '
+                 'to the hashers of PASSWORD_HASHERS with their libraries '
+                 'installed)')
+        parser.add_argument(
+            '--duration', type=float, default=3.0,
+            help='Seconds to hash for, per hasher')
+        parser.add_argument(
+            '--processes', type=int, default=multiprocessing.cpu_count(),
+            help='Number of processes hashing in parallel')
+
+    def handle(self, *args, **options):
+        algorithms = options['algorithm'] or [
+            hasher.algorithm for hasher in get_hashers()
+            if self.available(hasher)]
+        processes = options['processes']
+
+        self.stdout.write('{} process(es), {:.1f}s per hasher, {}'.format(
+            processes,
+            options['duration'],
+            settings.PASSWORD_HASHING))
+        self.stdout.write('{:<24} {:>14} {:>14} {:>12}'.format(
+            'algorithm', 'hashes/s/core', 'hashes/s', 'ms/hash'))
+
+        with multiprocessing.Pool(processes) as pool:
+            for algorithm in algorithms:
+                results = pool.map(
+                    _hash_until,
+                    [(algorithm, options['duration'])] * processes)
+
+                per_core = sum(
+                    count / elapsed for count, elapsed in results) / processes
+                self.stdout.write(
+                    '{:<24} {:>14.1f} {:>14.1f} {:>12.2f}'.format(
+                        algorithm,
+                        per_core,
+                        per_core * processes,
+                        1000 / per_core))
+
+    def available(self, hasher):
+        try:
+            if hasher.library:
+                hasher._load_library()
+        except ValueError:
+            return False
+        return True
@@ -0,0 +1,144 @@
+import os
+import random
+import shutil
+import string
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.utils import ConnectionHandler
+
+from accounts import models
+
+
+FIRST_NAMES = [
+    'Moe', 'Ada', 'Grace', 'Alan', 'Linus', 'Guido', 'Barbara', 'Ken',
+    'Dennis', 'Margaret', 'Edsger', 'Donald', 'Frances', 'John', 'Radia',
+]
+
+
+def _random_name(rng):
+    return rng.choice(FIRST_NAMES), ''.join(
+        rng.choice(string.ascii_lowercase)
+        for _ in range(rng.randint(4, 9))).capitalize()
+
+
+def create_fixture(connection, rows, seed=0):
+    """
+    Creates the user and profile tables on connection and fills them with
+    rows random profiles
+    """
+
+    rng = random.Random(seed)
+    with connection.schema_editor() as editor:
+        editor.create_model(User)
+        editor.create_model(models.Profile)
+
+    batch_size = 20000
+    with connection.cursor() as cursor:
+        # scratch database, durability doesn't matter
+        cursor.execute('PRAGMA journal_mode=off')
+        cursor.execute('PRAGMA synchronous=off')
+        for start in range(0, rows, batch_size):
+            users = []
+            profiles = []
+            for number in range(start, min(start + batch_size, rows)):
+                first_name, last_name = _random_name(rng)
+                users.append((
+                    number + 1, '!', False, 'user{}'.format(number), '', '',
+                    '', False, True, '2016-01-01 00:00:00'))
+                email = '{}.{}{}@example.com'.format(
+                    first_name, last_name, number).lower()
+                profiles.append((
+                    number + 1, number + 1, first_name, last_name, email,
+                    email, '', False,
+                    models.search_name(first_name, last_name)))
+
+            cursor.executemany(
+                'INSERT INTO auth_user (id, password, is_superuser, username, '
+                'first_name, last_name, email, is_staff, is_active, '
+                'date_joined) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)',
+                users)
+            cursor.executemany(
+                'INSERT INTO accounts_profile (id, user_id, first_name, '
+                'last_name, email, confirm_email, short_bio, avatar_ready, '
+                'search_name) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)',
+                profiles)
+        cursor.execute('ANALYZE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills a scratch SQLite database with random profiles and compares '
+        'query plans and latencies of icontains lookups against the indexed '
+        'prefix search of Profile.objects.search')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=1000000,
+            help='Number of profiles')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Times each query is run')
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        connection = ConnectionHandler({'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'benchmark.sqlite3'),
+        }})['default']
+
+        try:
+            start = time.perf_counter()
+            create_fixture(connection, options['rows'])
+            self.stdout.write('Created {} profiles in {:.1f}s'.format(
+                options['rows'], time.perf_counter() - start))
+
+            # look up a profile from the middle of the table
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT first_name, last_name, email FROM '
+                    'accounts_profile WHERE id = %s',
+                    [options['rows'] // 2 + 1])
+                first_name, last_name, email = cursor.fetchone()
+            name = '{} {}'.format(first_name, last_name)
+            email = email.split('@')[0]
+
+            queries = [
+                ('icontains name', models.Profile.objects.filter(
+                    first_name__icontains=first_name,
+                    last_name__icontains=last_name)),
+                ('search name', models.Profile.objects.search(name)),
+                ('icontains email', models.Profile.objects.filter(
+                    email__icontains=email)),
+                ('search email', models.Profile.objects.search(email)),
+            ]
+
+            for label, queryset in queries:
+                self.measure(
+                    connection, label, queryset.values('pk')[:20],
+                    options['repeat'])
+        finally:
+            connection.close()
+            shutil.rmtree(directory)
+
+    def measure(self, connection, label, queryset, repeat):
+        sql, params = queryset.query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                cursor.execute(sql, params)
+                count = len(cursor.fetchall())
+                timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        self.stdout.write('{}: {} row(s), median {:.3f}ms'.format(
+            label, count, timings[len(timings) // 2] * 1000))
+        for step in plan:
+            self.stdout.write('    ' + step)
@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import breached_passwords
+
+
+class Command(BaseCommand):
+    help = (
+        'Builds the breached password index used by '
+        'BreachedPasswordValidator from a plain text list of passwords, one '
+        'per line (optionally gzipped)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Path of the password list')
+        parser.add_argument(
+            '--output',
+            help='Path of the index (defaults to BREACHED_PASSWORDS_INDEX)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000000,
+            help='Number of passwords sorted in memory at once')
+
+    def handle(self, *args, **options):
+        output = options['output'] or getattr(
+            settings, 'BREACHED_PASSWORDS_INDEX', None)
+        if not output:
+            raise CommandError(
+                '--output is required without BREACHED_PASSWORDS_INDEX')
+        if not os.path.isfile(options['source']):
+            raise CommandError('{} does not exist'.format(options['source']))
+
+        start = time.perf_counter()
+        count = breached_passwords.build_index(
+            breached_passwords.read_passwords(options['source']),
+            output,
+            chunk_size=options['chunk_size'])
+
+        self.stdout.write('Indexed {} password(s) into {} ({} bytes) in '
+                          '{:.1f}s'.format(
+                              count,
+                              output,
+                              os.path.getsize(output),
+                              time.perf_counter() - start))
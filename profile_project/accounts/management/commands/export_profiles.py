@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Streams users and their profiles to a CSV or JSON lines file '
+        '(passwords are exported as hashes)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to write, - for standard output')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='Defaults to the extension of path')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Number of profiles read per query')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            file_format = transfer.format_of(
+                path, options['format'] or ('csv' if path == '-' else None))
+        except ValueError as error:
+            raise CommandError(error)
+
+        rows = transfer.export_rows(chunk_size=options['chunk_size'])
+        if path == '-':
+            transfer.write_rows(rows, sys.stdout, file_format)
+            return
+
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            count = transfer.write_rows(rows, f, file_format)
+
+        self.stdout.write('Exported {} profile(s) to {}'.format(count, path))
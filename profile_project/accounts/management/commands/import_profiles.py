@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates users and profiles from a CSV or JSON lines file written by '
+        'export_profiles. Existing users and invalid rows are skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='File to read, - for standard input')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='Defaults to the extension of path')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows created per transaction')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            file_format = transfer.format_of(
+                path, options['format'] or ('csv' if path == '-' else None))
+        except ValueError as error:
+            raise CommandError(error)
+
+        def report(number, error):
+            self.stderr.write('Row {}: {}'.format(
+                number, '; '.join(error.messages)))
+
+        if path == '-':
+            created, skipped = transfer.import_rows(
+                transfer.read_rows(sys.stdin, file_format),
+                batch_size=options['batch_size'],
+                on_error=report)
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                created, skipped = transfer.import_rows(
+                    transfer.read_rows(f, file_format),
+                    batch_size=options['batch_size'],
+                    on_error=report)
+
+        self.stdout.write('Imported {} profile(s), skipped {}'.format(
+            created, skipped))
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-18 16:14
+from __future__ import unicode_literals
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(blank=True, max_length=255)),
+                ('last_name', models.CharField(blank=True, max_length=255)),
+                ('date_of_birth', models.DateField(blank=True, null=True)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('confirm_email', models.EmailField(blank=True, max_length=254)),
+                ('short_bio', models.TextField(blank=True, validators=[django.core.validators.MinLengthValidator(10, 'Entry must be 10 characters or longer')])),
+                ('avatar', models.ImageField(blank=True, null=True, upload_to='avatars')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='user', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
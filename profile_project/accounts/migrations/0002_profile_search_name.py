@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-18 16:14
+from __future__ import unicode_literals
+
+import accounts.storage
+from django.db import migrations, models
+
+
+# profiles read at a time by the backfill
+BATCH_SIZE = 1000
+
+
+def search_name(first_name, last_name):
+    # copy of accounts.models.search_name as of this migration, so later
+    # changes to it don't change what the backfill writes
+    return ' '.join(
+        ' '.join(name.split()) for name in (first_name, last_name) if name
+    ).casefold()
+
+
+def backfill_search_fields(apps, schema_editor):
+    """
+    Sets the search name and lowercases the emails of existing profiles,
+    which Profile.save does for new ones
+    """
+
+    Profile = apps.get_model('accounts', 'Profile')
+    profiles = Profile.objects.using(schema_editor.connection.alias)
+    last_pk = 0
+    while True:
+        batch = list(profiles.filter(pk__gt=last_pk).order_by(
+            'pk').values_list(
+                'pk', 'first_name', 'last_name', 'email', 'confirm_email',
+            )[:BATCH_SIZE])
+        if not batch:
+            return
+        for pk, first_name, last_name, email, confirm_email in batch:
+            profiles.filter(pk=pk).update(
+                search_name=search_name(first_name, last_name),
+                email=email.lower(),
+                confirm_email=confirm_email.lower())
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_ready',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=511),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=accounts.storage.ContentAddressedStorage(), upload_to='avatars'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='email',
+            field=models.EmailField(blank=True, db_index=True, max_length=254),
+        ),
+        migrations.RunPython(
+            backfill_search_fields, migrations.RunPython.noop),
+    ]
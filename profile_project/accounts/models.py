@@ -3,6 +3,60 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinLengthValidator
 
+from .storage import avatar_storage
+
+
+def search_name(first_name, last_name):
+    """
+    Returns the case folded full name profiles are searched by, i.e.
+    'Moe Gu' -> 'moe gu'
+    """
+
+    return ' '.join(
+        ' '.join(name.split()) for name in (first_name, last_name) if name
+    ).casefold()
+
+
+def _prefix_range(prefix):
+    # strings starting with prefix sort within [prefix, upper), which any
+    # index can scan, unlike LIKE 'prefix%' under case insensitive LIKE
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class ProfileQuerySet(models.QuerySet):
+    def search(self, term, usernames=False):
+        """
+        Returns profiles whose full name or email starts with term, case
+        insensitively. Both are matched by index range scans.
+
+        Args:
+            term: (string)
+            usernames: also match prefixes of the username, as entered
+                (bool)
+
+        Returns:
+            QuerySet
+        """
+
+        term = term.strip()
+        if not term:
+            return self.none()
+
+        name_from, name_to = _prefix_range(search_name(term, ''))
+        # emails are stored lowercased (see Profile.save)
+        email_from, email_to = _prefix_range(term.lower())
+        matches = (
+            models.Q(search_name__gte=name_from, search_name__lt=name_to) |
+            models.Q(email__gte=email_from, email__lt=email_to))
+        if usernames:
+            # a subquery on the username index, since a condition across the
+            # user join in the OR would turn the search into a table scan
+            username_from, username_to = _prefix_range(term)
+            matches |= models.Q(user_id__in=User.objects.filter(
+                username__gte=username_from,
+                username__lt=username_to).values('pk'))
+        return self.filter(matches)
+
 
 class Profile(models.Model):
     user = models.OneToOneField(
@@ -12,11 +66,86 @@ class Profile(models.Model):
     first_name = models.CharField(max_length=255, blank=True)
     last_name = models.CharField(max_length=255, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
-    email = models.EmailField(blank=True)
+    # indexed for profile searches (see ProfileQuerySet.search)
+    email = models.EmailField(blank=True, db_index=True)
     confirm_email = models.EmailField(blank=True)
     short_bio = models.TextField(
         blank=True,
         validators=[
             MinLengthValidator(10, 'Entry must be 10 characters or longer')
             ])
-    avatar = models.ImageField(upload_to='avatars', null=True, blank=True)
\ No newline at end of file
+    avatar = models.ImageField(
+        upload_to='avatars',
+        storage=avatar_storage,
+        null=True,
+        blank=True)
+    # set once the resized renditions of the avatar have been written
+    avatar_ready = models.BooleanField(default=False, editable=False)
+    # case folded first and last name, kept up to date by save, which also
+    # lowercases the emails
+    search_name = models.CharField(
+        max_length=511, blank=True, db_index=True, editable=False)
+
+    objects = ProfileQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        self.search_name = search_name(self.first_name, self.last_name)
+        self.email = self.email.lower()
+        self.confirm_email = self.confirm_email.lower()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and (
+                {'first_name', 'last_name'} & set(update_fields)):
+            kwargs['update_fields'] = set(update_fields) | {'search_name'}
+        super(Profile, self).save(*args, **kwargs)
+
+    def __str__(self):
+        # no user lookup, so listing profiles doesn't query each user
+        return ' '.join(
+            name for name in (self.first_name, self.last_name) if name
+        ) or 'Profile of user {}'.format(self.user_id)
+
+    @property
+    def avatar_renditions(self):
+        """
+        Returns URLs of the resized avatar renditions, keyed by label and
+        format (i.e. avatar_renditions['small']['webp']). Empty until the
+        renditions have been processed.
+        """
+
+        # imported here since accounts.avatars depends on this module
+        from .avatars import rendition_formats, rendition_name, rendition_sizes
+
+        if not self.avatar or not self.avatar_ready:
+            return {}
+
+        storage = self.avatar.storage
+        return {
+            label: {
+                fmt: storage.url(rendition_name(self.avatar.name, label, fmt))
+                for fmt in rendition_formats()
+            }
+            for label, size in rendition_sizes()
+        }
+
+    @property
+    def avatar_srcsets(self):
+        """
+        Returns srcset attribute values of the avatar renditions keyed by
+        format, with their widths from AVATAR_RENDITION_SIZES, i.e.
+        avatar_srcsets['webp'] == '/media/..._small.webp 96w, ...'. Empty
+        until the renditions have been processed.
+        """
+
+        from .avatars import rendition_sizes
+
+        renditions = self.avatar_renditions
+        if not renditions:
+            return {}
+
+        sizes = sorted(rendition_sizes(), key=lambda item: item[1])
+        return {
+            fmt: ', '.join(
+                '{} {}w'.format(renditions[label][fmt], size)
+                for label, size in sizes)
+            for fmt in renditions[sizes[0][0]]
+        }
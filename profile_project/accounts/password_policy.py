@@ -0,0 +1,193 @@
+import re
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+
+from . import profiles
+
+
+# character classes a policy can require, in the order they are reported
+CHARACTER_CLASSES = [
+    ('upper', '[A-Z]', 'Must contain combination of upper and '
+                       'lowercase letters'),
+    ('lower', '[a-z]', 'Must contain combination of upper and '
+                       'lowercase letters'),
+    ('digit', '[0-9]', 'Must contain numerical digits'),
+    ('special', '[^a-zA-Z0-9]', 'Must contain one or more special '
+                                'characters'),
+]
+
+# the sign up rules of the validators this policy replaced; character
+# classes are opt-in, except for password changes (see ChangePasswordForm)
+DEFAULT_PASSWORD_POLICY = {
+    'MIN_LENGTH': 14,
+    'CHARACTER_CLASSES': [],
+    # attributes of the user, 'profile.' ones are read from its profile
+    'USER_ATTRIBUTES': ['username', 'profile.first_name', 'profile.last_name'],
+}
+
+
+class PasswordPolicy(object):
+    """
+    Password rules compiled into a single regular expression, so that a
+    password is scanned once for all required character classes. Every
+    violated rule is reported, not only the first one.
+
+    Args:
+        min_length: minimum number of characters (int)
+        character_classes: names of CHARACTER_CLASSES that are required
+        user_attributes: attributes the password must not contain (list)
+    """
+
+    def __init__(self, min_length=14, character_classes=None,
+                 user_attributes=None):
+        self.min_length = min_length
+        self.user_attributes = list(
+            DEFAULT_PASSWORD_POLICY['USER_ATTRIBUTES']
+            if user_attributes is None else user_attributes)
+
+        required = (
+            DEFAULT_PASSWORD_POLICY['CHARACTER_CLASSES']
+            if character_classes is None else character_classes)
+        unknown = set(required) - {name for name, _, _ in CHARACTER_CLASSES}
+        if unknown:
+            raise ValueError('Unknown character classes: {}'.format(
+                ', '.join(sorted(unknown))))
+
+        self.character_classes = [
+            (name, message) for name, pattern, message in CHARACTER_CLASSES
+            if name in required]
+        self.pattern = re.compile('|'.join(
+            '(?P<{}>{})'.format(name, pattern)
+            for name, pattern, _ in CHARACTER_CLASSES if name in required))
+
+    def character_classes_of(self, password):
+        """
+        Returns names of the required character classes found in password,
+        stopping the scan as soon as all of them are found
+        """
+
+        found = set()
+        if not self.character_classes:
+            return found
+
+        for match in self.pattern.finditer(password):
+            found.add(match.lastgroup)
+            if len(found) == len(self.character_classes):
+                break
+
+        return found
+
+    def attributes_of(self, user, profile=None):
+        """
+        Returns the configured user attributes, i.e. {'username': 'moe'}.
+        Profile attributes are read from profile, or from the profile of the
+        user if none is given.
+        """
+
+        values = {}
+        for attribute in self.user_attributes:
+            if attribute.startswith('profile.'):
+                if profile is None and user is not None and user.pk:
+                    try:
+                        profile = profiles.get_profile(user)
+                    except ObjectDoesNotExist:
+                        pass
+                source, name = profile, attribute[len('profile.'):]
+            else:
+                source, name = user, attribute
+            value = getattr(source, name, None)
+            if value:
+                values[attribute] = str(value)
+        return values
+
+    def violations(self, password, user=None, profile=None):
+        """
+        Checks a password against every rule of the policy
+
+        Args:
+            password: (string)
+            user: User the password is for (optional)
+            profile: Profile of the user (optional)
+
+        Returns:
+            ValidationErrors of the violated rules (list)
+        """
+
+        errors = []
+
+        if len(password) < self.min_length:
+            errors.append(ValidationError(
+                'Password must be more than %(min_length)d characters',
+                code='password_too_short',
+                params={'min_length': self.min_length}))
+
+        lowered = password.lower()
+        if any(value.lower() in lowered for value in
+               self.attributes_of(user, profile).values()):
+            errors.append(ValidationError(
+                'Entered password must not contain first or last name '
+                'nor username',
+                code='password_too_similar'))
+
+        found = self.character_classes_of(password)
+        messages = []
+        for name, message in self.character_classes:
+            if name not in found and message not in messages:
+                messages.append(message)
+        errors.extend(
+            ValidationError(message, code='password_missing_characters')
+            for message in messages)
+
+        return errors
+
+    def help_text(self):
+        return (
+            'Your password must contain at least {} characters, must not '
+            'contain your name nor username{}.'.format(
+                self.min_length,
+                ', and must include ' + ', '.join(
+                    name for name, _ in self.character_classes) +
+                ' characters' if self.character_classes else ''))
+
+
+def password_policy(**overrides):
+    """
+    Returns PasswordPolicy of the PASSWORD_POLICY setting
+
+    Args:
+        overrides: settings to override, i.e. MIN_LENGTH=8
+    """
+
+    options = dict(DEFAULT_PASSWORD_POLICY)
+    options.update(getattr(settings, 'PASSWORD_POLICY', {}))
+    options.update(overrides)
+    return PasswordPolicy(
+        min_length=options['MIN_LENGTH'],
+        character_classes=options['CHARACTER_CLASSES'],
+        user_attributes=options['USER_ATTRIBUTES'])
+
+
+class PasswordPolicyValidator(object):
+    """
+    AUTH_PASSWORD_VALIDATORS entry validating passwords against the
+    PASSWORD_POLICY setting. OPTIONS override single settings, i.e.
+    {'min_length': 14}.
+    """
+
+    def __init__(self, **options):
+        self.overrides = {
+            name.upper(): value for name, value in options.items()}
+
+    @property
+    def policy(self):
+        # built per call, so that PASSWORD_POLICY overrides take effect
+        return password_policy(**self.overrides)
+
+    def validate(self, password, user=None):
+        errors = self.policy.violations(password, user)
+        if errors:
+            raise ValidationError(errors)
+
+    def get_help_text(self):
+        return self.policy.help_text()
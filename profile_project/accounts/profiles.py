@@ -0,0 +1,214 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.http import Http404
+
+from . import models
+
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _cache():
+    return caches[getattr(settings, 'PROFILE_CACHE_ALIAS', 'default')]
+
+
+def _cache_key(user_id):
+    return 'accounts:profile:{}'.format(user_id)
+
+
+def _version_key(user_id):
+    return 'accounts:profile-version:{}'.format(user_id)
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def get_profile(user):
+    """
+    Returns the profile of the given user, reading through the profile cache.
+    On a miss, profile and user are fetched together in a single query and
+    the result is stored in the cache until it is invalidated.
+
+    Args:
+        user: the (usually authenticated) user instance
+
+    Returns:
+        Profile instance
+
+    Raises:
+        Profile.DoesNotExist if the user has no profile
+    """
+
+    key = _cache_key(user.pk)
+    profile = _cache().get(key)
+
+    if profile is not None:
+        _record('hits')
+        # use the live user of the request rather than the cached copy
+        profile.user = user
+        return profile
+
+    _record('misses')
+
+    profile = models.Profile.objects.select_related('user').get(
+        user_id=user.pk)
+
+    _cache().set(
+        key,
+        profile,
+        getattr(settings, 'PROFILE_CACHE_TIMEOUT', 300))
+
+    return profile
+
+
+def get_profile_or_404(user):
+    """
+    Same as get_profile, but raises Http404 if the user has no profile
+    """
+
+    try:
+        return get_profile(user)
+    except models.Profile.DoesNotExist:
+        raise Http404('Profile does not exist')
+
+
+def create_missing_profiles(batch_size=500):
+    """
+    Creates empty profiles for users that don't have one, e.g. users created
+    before profiles were created on signup or inserted with bulk_create
+    (which skips the post_save signal). Each batch is its own transaction.
+
+    Args:
+        batch_size: number of profiles inserted per query (int)
+
+    Returns:
+        Number of created profiles (int)
+    """
+
+    created = 0
+
+    while True:
+        user_ids = list(
+            User.objects.filter(user__isnull=True)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size])
+
+        if not user_ids:
+            return created
+
+        with transaction.atomic():
+            models.Profile.objects.bulk_create(
+                models.Profile(user_id=user_id) for user_id in user_ids)
+
+        created += len(user_ids)
+
+
+def invalidate_profile(user_id):
+    """
+    Removes the cached profile of the given user and bumps the profile
+    version, which retires pages cached for the previous version. Must be
+    called whenever the profile is changed.
+
+    Args:
+        user_id: primary key of the profile's user (int)
+
+    Returns:
+        None
+    """
+
+    _cache().delete(_cache_key(user_id))
+
+    try:
+        _cache().incr(_version_key(user_id))
+    except ValueError:
+        profile_version(user_id)
+
+
+def profile_version(user_id):
+    """
+    Returns the version counter of the user's profile. A missing counter
+    (never set or evicted) starts at the current time in milliseconds, so
+    it never falls back to a version that has been used before.
+
+    Args:
+        user_id: primary key of the profile's user (int)
+
+    Returns:
+        Int
+    """
+
+    key = _version_key(user_id)
+    version = _cache().get(key)
+
+    if version is None:
+        version = int(time.time() * 1000)
+        if not _cache().add(key, version, None):
+            version = _cache().get(key, version)
+
+    return version
+
+
+def get_cached_page(user_id, page):
+    """
+    Returns HTML of a page rendered for the current version of the user's
+    profile, or None
+
+    Args:
+        user_id: primary key of the profile's user (int)
+        page: name of the page, i.e. 'profile_view' (string)
+
+    Returns:
+        String or None
+    """
+
+    return _cache().get(_page_key(user_id, page))
+
+
+def set_cached_page(user_id, page, content):
+    """
+    Caches HTML of a page rendered for the current version of the user's
+    profile, for PROFILE_PAGE_CACHE_TIMEOUT seconds
+    """
+
+    _cache().set(
+        _page_key(user_id, page),
+        content,
+        getattr(settings, 'PROFILE_PAGE_CACHE_TIMEOUT', 600))
+
+
+def _page_key(user_id, page):
+    return 'accounts:profile-page:{}:{}:{}'.format(
+        page, user_id, profile_version(user_id))
+
+
+def cache_stats():
+    """
+    Returns hit and miss counts of the profile cache for this process
+
+    Args:
+        None
+
+    Returns:
+        Dictionary with 'hits' and 'misses' keys
+    """
+
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_cache_stats():
+    """
+    Resets hit and miss counts of the profile cache to zero
+    """
+
+    with _stats_lock:
+        for outcome in _stats:
+            _stats[outcome] = 0
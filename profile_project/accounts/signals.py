@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import avatars, models, profiles
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    """
+    Creates an empty profile for every newly created user. Runs within the
+    same transaction as the user insert, so a user never exists without a
+    profile
+    """
+
+    if created and not raw:
+        models.Profile.objects.create(user=instance)
+
+
+@receiver(post_delete, sender=models.Profile)
+def release_profile(sender, instance, **kwargs):
+    """
+    Drops the cached copy of a deleted profile and releases its avatar,
+    whether it was deleted on its own, in bulk or with its user
+    """
+
+    profiles.invalidate_profile(instance.user_id)
+    if instance.avatar:
+        avatars.schedule_avatar_release(instance.avatar.name)
@@ -0,0 +1,81 @@
+import hashlib
+import os
+import posixpath
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, get_storage_class
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import LazyObject, empty
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files by the SHA-256 digest of their content,
+    i.e. 'avatars/3f/3fa9...e1.png'. Identical content is stored only once;
+    saving it again returns the name of the existing file. Names never
+    change content, so they can be cached forever.
+    """
+
+    def content_name(self, name, content):
+        """
+        Returns the content addressed name for the given content
+
+        Args:
+            name: name requested by the caller, its directory and extension
+            are kept (string)
+            content: File object
+
+        Returns:
+            String
+        """
+
+        sha = hashlib.sha256()
+        for chunk in content.chunks():
+            sha.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+
+        digest = sha.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        name = self.content_name(name, content)
+
+        if self.exists(name):
+            return name
+
+        return super(ContentAddressedStorage, self).save(
+            name, content, max_length=max_length)
+
+    def save_as(self, name, content, max_length=None):
+        """
+        Saves content under name as given, replacing an existing file. Meant
+        for files named after a content addressed original, i.e. its
+        renditions.
+        """
+
+        if self.exists(name):
+            self.delete(name)
+
+        return super(ContentAddressedStorage, self).save(
+            name, content, max_length=max_length)
+
+
+class AvatarStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = get_storage_class(settings.AVATAR_STORAGE)()
+
+
+avatar_storage = AvatarStorage()
+
+
+@receiver(setting_changed)
+def reset_avatar_storage(setting, **kwargs):
+    if setting in ('AVATAR_STORAGE', 'MEDIA_ROOT', 'MEDIA_URL'):
+        avatar_storage._wrapped = empty
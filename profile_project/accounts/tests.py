@@ -1,10 +1,37 @@
-from django.test import TestCase
+import gzip
+import os
+import shutil
+import tempfile
+from importlib import import_module
+from io import BytesIO
+from unittest import mock, skipUnless
+
+from django.test import TestCase, override_settings
+from PIL import Image
 
 # Create your tests here.
+from django.apps import apps
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.http import HttpRequest
+from django.test.utils import CaptureQueriesContext
+from django.utils.six import StringIO
 from accounts.models import Profile
 from accounts.forms import ProfileForm, ChangePasswordForm
+from accounts import (
+    avatars,
+    breached_passwords,
+    editor,
+    password_policy,
+    profiles,
+    throttling,
+    transfer)
 
 
 # MODEL TEST
@@ -14,12 +41,11 @@ class PasswordFromTest(TestCase):
         self.user = User.objects.create(
             password="hello1", username="test")
 
-        # create derivate profile
-        self.profile = Profile.objects.create(
-            user=self.user,
-            first_name="Moe",
-            last_name="Gu"
-        )
+        # fill in derivate profile (created along with user)
+        self.profile = Profile.objects.get(user=self.user)
+        self.profile.first_name = "Moe"
+        self.profile.last_name = "Gu"
+        self.profile.save()
 
     def test_return_form_invalid_if_current_password_incorrect(self):
         expected = False
@@ -172,4 +198,1166 @@ class PasswordFromTest(TestCase):
 
         result = form.is_valid()
 
-        self.assertEqual(expected, result)
\ No newline at end of file
+        self.assertEqual(expected, result)
+
+
+class ProfileLoadingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiles.reset_cache_stats()
+
+        self.user = User.objects.create(
+            password="hello1", username="test")
+
+        self.profile = Profile.objects.get(user=self.user)
+        self.profile.first_name = "Moe"
+        self.profile.last_name = "Gu"
+        self.profile.save()
+
+    def test_return_profile_with_user_in_single_query(self):
+        expected = self.profile.pk
+
+        with self.assertNumQueries(1):
+            result = profiles.get_profile(self.user).pk
+
+        self.assertEqual(expected, result)
+
+    def test_return_cached_profile_without_query(self):
+        expected = {'hits': 1, 'misses': 1}
+
+        profiles.get_profile(self.user)
+
+        with self.assertNumQueries(0):
+            profiles.get_profile(self.user)
+
+        result = profiles.cache_stats()
+
+        self.assertEqual(expected, result)
+
+    def test_return_updated_profile_after_form_save(self):
+        expected = "Moses"
+
+        profile = profiles.get_profile(self.user)
+        form = ProfileForm(
+            data={
+                'first_name': 'Moses',
+                'last_name': 'Gu',
+                'date_of_birth': '1990-01-01',
+                'short_bio': 'Hello, my name is Moses'},
+            instance=profile)
+        form.is_valid()
+        form.save()
+
+        result = profiles.get_profile(self.user).first_name
+
+        self.assertEqual(expected, result)
+
+    def test_return_processed_avatar_kept_by_save_of_cached_profile(self):
+        expected = ['Moses', True]
+
+        profile = profiles.get_profile(self.user)
+        # avatar processing finishing after the profile has been cached
+        Profile.objects.filter(pk=profile.pk).update(avatar_ready=True)
+        form = ProfileForm(
+            data={
+                'first_name': 'Moses',
+                'last_name': 'Gu',
+                'date_of_birth': '1990-01-01',
+                'short_bio': 'Hello, my name is Moses'},
+            instance=profile)
+        form.is_valid()
+        form.save()
+
+        saved = Profile.objects.get(pk=profile.pk)
+        result = [saved.first_name, saved.avatar_ready]
+
+        self.assertEqual(expected, result)
+
+
+class ProfileCreationTest(TestCase):
+    def test_return_profile_created_with_user(self):
+        expected = True
+
+        user = User.objects.create(password="hello1", username="test")
+
+        result = Profile.objects.filter(user=user).exists()
+
+        self.assertEqual(expected, result)
+
+    def test_return_profiles_backfilled_for_bulk_created_users(self):
+        expected = 3
+
+        User.objects.bulk_create(
+            User(username="test{}".format(i)) for i in range(3))
+
+        call_command('backfill_profiles', batch_size=2, stdout=StringIO())
+
+        result = Profile.objects.count()
+
+        self.assertEqual(expected, result)
+
+
+def make_image(size=(1000, 600), fmt='PNG', color=(200, 30, 30)):
+    output = BytesIO()
+    Image.new('RGB', size, color).save(output, fmt)
+    output.seek(0)
+    return output
+
+
+class AvatarProcessingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = User.objects.create(
+            password="hello1", username="test")
+        self.profile = Profile.objects.get(user=self.user)
+        self.profile.avatar.save(
+            'moe.png', ContentFile(make_image().read()))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_return_square_renditions_of_every_size_and_format(self):
+        expected = {
+            (label, fmt): (size, size)
+            for label, size in avatars.rendition_sizes()
+            for fmt in avatars.rendition_formats()
+        }
+
+        renditions = avatars.render_renditions(make_image())
+
+        result = {
+            key: Image.open(BytesIO(content)).size
+            for key, content in renditions.items()
+        }
+
+        self.assertEqual(expected, result)
+
+    def test_return_no_renditions_before_processing(self):
+        expected = {}
+
+        result = Profile.objects.get(pk=self.profile.pk).avatar_renditions
+
+        self.assertEqual(expected, result)
+
+    def test_return_rendition_urls_after_processing(self):
+        expected = '/media/' + avatars.rendition_name(
+            self.profile.avatar.name, 'small', 'webp')
+
+        avatars.process_avatar(self.profile.pk, self.profile.avatar.name)
+
+        profile = Profile.objects.get(pk=self.profile.pk)
+        result = profile.avatar_renditions['small']['webp']
+
+        self.assertEqual(expected, result)
+
+    @override_settings(AVATAR_RENDITION_SIZES={'small': 64, 'large': 640})
+    def test_return_srcsets_with_configured_widths(self):
+        expected = '/media/{} 64w, /media/{} 640w'.format(
+            avatars.rendition_name(self.profile.avatar.name, 'small', 'jpeg'),
+            avatars.rendition_name(self.profile.avatar.name, 'large', 'jpeg'))
+
+        avatars.process_avatar(self.profile.pk, self.profile.avatar.name)
+
+        profile = Profile.objects.get(pk=self.profile.pk)
+        result = profile.avatar_srcsets['jpeg']
+
+        self.assertEqual(expected, result)
+
+    def test_return_rendition_files_stored_under_their_names(self):
+        expected = [True] * len(avatars.rendition_names(
+            self.profile.avatar.name))
+
+        avatars.process_avatar(self.profile.pk, self.profile.avatar.name)
+
+        result = [
+            self.profile.avatar.storage.exists(name)
+            for name in avatars.rendition_names(self.profile.avatar.name)]
+
+        self.assertEqual(expected, result)
+
+    def test_return_avatar_and_renditions_deleted_on_release(self):
+        expected = [True, []]
+
+        name = self.profile.avatar.name
+        avatars.process_avatar(self.profile.pk, name)
+        Profile.objects.update(avatar=None)
+
+        result = [
+            avatars.release_avatar(name),
+            [filename
+             for _, _, filenames in os.walk(self.media_root)
+             for filename in filenames],
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_files_moved_back_if_referenced_meanwhile(self):
+        expected = [False, True, True]
+
+        name = self.profile.avatar.name
+        avatars.process_avatar(self.profile.pk, name)
+
+        # an identical avatar is saved between the two reference counts
+        with mock.patch.object(
+                QuerySet, 'exists', side_effect=[False, True]):
+            released = avatars.release_avatar(name)
+
+        result = [
+            released,
+            self.profile.avatar.storage.exists(name),
+            all(self.profile.avatar.storage.exists(rendition)
+                for rendition in avatars.rendition_names(name)),
+        ]
+
+        self.assertEqual(expected, result)
+
+    @override_settings(AVATAR_PROCESS_ASYNC=False)
+    def test_return_avatar_written_again_if_released_before_commit(self):
+        expected = [True, True]
+
+        name = self.profile.avatar.name
+        storage = self.profile.avatar.storage
+        with storage.open(name) as avatar:
+            content = ContentFile(avatar.read())
+        storage.delete(name)
+
+        with mock.patch.object(
+                avatars.transaction, 'on_commit', lambda func: func()):
+            avatars.schedule_avatar_processing(self.profile, content)
+
+        result = [
+            storage.exists(name),
+            Profile.objects.get(pk=self.profile.pk).avatar_ready,
+        ]
+
+        self.assertEqual(expected, result)
+
+
+class AvatarUploadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user(
+            username="test", password="hello1")
+        self.client.login(username="test", password="hello1")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def profile_data(self, avatar):
+        return {
+            'first_name': 'Moe',
+            'last_name': 'Gu',
+            'date_of_birth': '1990-01-01',
+            'short_bio': 'Hello, my name is Moe',
+            'avatar': avatar,
+        }
+
+    @override_settings(AVATAR_MAX_UPLOAD_SIZE=1024)
+    def test_return_error_if_upload_exceeds_size_limit(self):
+        expected = ['Avatar must be 1.0\xa0KB or smaller']
+
+        # random pixels don't compress below the limit
+        avatar = BytesIO()
+        Image.frombytes('RGB', (64, 64), os.urandom(64 * 64 * 3)).save(
+            avatar, 'PNG')
+        avatar.seek(0)
+        avatar.name = 'moe.png'
+
+        response = self.client.post(
+            '/profile/edit', self.profile_data(avatar))
+
+        result = response.context['form'].errors['avatar']
+
+        self.assertEqual(expected, result)
+
+    @override_settings(AVATAR_MAX_DIMENSIONS=(100, 100))
+    def test_return_form_invalid_if_image_dimensions_too_large(self):
+        expected = False
+
+        avatar = SimpleUploadedFile(
+            'moe.png', make_image(size=(200, 50)).read())
+        form = ProfileForm(
+            data=self.profile_data(None),
+            files={'avatar': avatar},
+            instance=Profile.objects.get(user=self.user))
+
+        result = form.is_valid()
+
+        self.assertEqual(expected, result)
+
+    def test_return_form_valid_if_image_within_limits(self):
+        expected = True
+
+        avatar = SimpleUploadedFile(
+            'moe.png', make_image(size=(200, 50)).read())
+        form = ProfileForm(
+            data=self.profile_data(None),
+            files={'avatar': avatar},
+            instance=Profile.objects.get(user=self.user))
+
+        result = form.is_valid()
+
+        self.assertEqual(expected, result)
+
+
+class AvatarEditorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user(
+            username="test", password="hello1")
+        self.profile = Profile.objects.get(user=self.user)
+        self.profile.avatar.save(
+            'moe.png', ContentFile(make_image(size=(400, 200)).read()))
+        self.client.login(username="test", password="hello1")
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_return_rotated_flipped_and_cropped_image(self):
+        expected = (100, 200)
+
+        image = editor.apply_operations(Image.open(make_image((400, 200))), [
+            ('rotate', 90),
+            ('flip', 'horizontal'),
+            ('crop', (0, 0, 50, 50)),
+        ])
+
+        result = image.size
+
+        self.assertEqual(expected, result)
+
+    def test_return_crop_box_of_at_least_one_pixel(self):
+        expected = [(1, 50), (1, 1)]
+
+        result = [
+            editor.apply_operations(Image.open(make_image((400, 50))), [
+                ('crop', (100, 0, 100, 100))]).size,
+            editor.apply_operations(Image.open(make_image((50, 50))), [
+                ('crop', (99, 99, 1, 1))]).size,
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_not_found_for_crop_box_outside_image(self):
+        expected = [404, 200]
+
+        result = [
+            self.client.get('/profile/avatar/preview', {
+                'crop_left': 100, 'crop_width': 50}).status_code,
+            self.client.get('/profile/avatar/preview', {
+                'crop_left': 50, 'crop_width': 50}).status_code,
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_cached_preview_for_same_operations(self):
+        expected = False
+
+        editor.render_preview(self.profile.avatar, [('rotate', 90)])
+
+        with mock.patch.object(editor, 'apply_operations') as apply:
+            editor.render_preview(self.profile.avatar, [('rotate', 90)])
+
+        result = apply.called
+
+        self.assertEqual(expected, result)
+
+    def test_return_upright_edit_of_rotated_jpeg(self):
+        expected = [(200, 400), 'JPEG', None]
+
+        # EXIF orientation 6: the pixels are stored rotated 90° left
+        exif = (b'Exif\x00\x00MM\x00*\x00\x00\x00\x08\x00\x01'
+                b'\x01\x12\x00\x03\x00\x00\x00\x01\x00\x06\x00\x00'
+                b'\x00\x00\x00\x00')
+        output = BytesIO()
+        Image.new('RGB', (400, 200)).save(output, 'JPEG', exif=exif)
+        self.profile.avatar.save('moe.jpg', ContentFile(output.getvalue()))
+
+        image = Image.open(BytesIO(editor.render_full(
+            self.profile.avatar, [('flip', 'horizontal')])))
+
+        result = [image.size, image.format, image.info.get('exif')]
+
+        self.assertEqual(expected, result)
+
+    def test_return_edited_avatar_after_save(self):
+        expected = (200, 400)
+
+        self.client.post('/profile/avatar/edit', {'rotate': 90})
+
+        profile = Profile.objects.get(pk=self.profile.pk)
+        result = Image.open(profile.avatar.path).size
+
+        self.assertEqual(expected, result)
+
+
+class AvatarStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.profiles = []
+        for username in ('test1', 'test2'):
+            user = User.objects.create(password="hello1", username=username)
+            profile = Profile.objects.get(user=user)
+            profile.avatar.save('moe.png', ContentFile(make_image().read()))
+            self.profiles.append(profile)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_return_same_file_for_identical_avatars(self):
+        expected = self.profiles[0].avatar.name
+
+        result = self.profiles[1].avatar.name
+
+        self.assertEqual(expected, result)
+
+    def test_return_file_kept_while_still_referenced(self):
+        expected = [False, True]
+
+        name = self.profiles[0].avatar.name
+        self.profiles[0].avatar = None
+        self.profiles[0].save()
+
+        result = [
+            avatars.release_avatar(name),
+            self.profiles[0].avatar.storage.exists(name),
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_file_deleted_once_unreferenced(self):
+        expected = [True, False]
+
+        name = self.profiles[0].avatar.name
+        Profile.objects.update(avatar=None)
+
+        result = [
+            avatars.release_avatar(name),
+            self.profiles[0].avatar.storage.exists(name),
+        ]
+
+        self.assertEqual(expected, result)
+
+
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class ProfilePageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+        self.user = User.objects.create_user(
+            username="test", password="hello1")
+        self.client.login(username="test", password="hello1")
+
+    def test_return_cached_page_without_profile_query(self):
+        expected = self.client.get('/profile/').content
+
+        # user lookup only, the session is read from the cache
+        with self.assertNumQueries(1):
+            result = self.client.get('/profile/').content
+
+        self.assertEqual(expected, result)
+
+    def test_return_updated_page_after_profile_edit(self):
+        expected = True
+
+        self.client.get('/profile/')
+        self.client.post('/profile/edit', {
+            'first_name': 'Moses',
+            'last_name': 'Gu',
+            'date_of_birth': '1990-01-01',
+            'short_bio': 'Hello, my name is Moses'})
+        # consume the success message
+        self.client.get('/profile/')
+
+        result = 'Moses' in self.client.get('/profile/').content.decode()
+
+        self.assertEqual(expected, result)
+
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+
+class PasswordHashingTest(TestCase):
+    @override_settings(PASSWORD_HASHING={'PBKDF2_ITERATIONS': 1000})
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="test", password="hello1")
+
+    @override_settings(PASSWORD_HASHING={'PBKDF2_ITERATIONS': 2000})
+    def test_return_rehashed_password_if_iterations_changed(self):
+        expected = 'pbkdf2_sha256$2000$'
+
+        self.user.check_password("hello1")
+
+        result = User.objects.get(pk=self.user.pk).password[:19]
+
+        self.assertEqual(expected, result)
+
+    @skipUnless(argon2, 'argon2-cffi is not installed')
+    @override_settings(PASSWORD_HASHERS=[
+        'accounts.hashers.Argon2PasswordHasher',
+        'accounts.hashers.PBKDF2PasswordHasher'])
+    def test_return_password_upgraded_to_preferred_hasher(self):
+        expected = [True, 'argon2$argon2id$']
+
+        result = [
+            self.user.check_password("hello1"),
+            User.objects.get(pk=self.user.pk).password[:16],
+        ]
+
+        self.assertEqual(expected, result)
+
+
+class PasswordChangeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="test", password="Current5!2345444555")
+        self.profile = Profile.objects.get(user=self.user)
+        self.profile.first_name = "Moe"
+        self.profile.last_name = "Gu"
+        self.profile.save()
+        self.client.login(username="test", password="Current5!2345444555")
+
+    def test_return_no_hashing_if_cheaper_check_fails(self):
+        expected = [False, 0]
+
+        form = ChangePasswordForm(
+            data={
+                'current_password': 'Current5!2345444555',
+                'new_password': 'nodigitsnorupper!!',
+                'confirm_password': 'nodigitsnorupper!!'},
+            user=self.user,
+            profile=self.profile)
+
+        with mock.patch.object(User, 'check_password') as check_password:
+            result = [form.is_valid(), check_password.call_count]
+
+        self.assertEqual(expected, result)
+
+    def test_return_session_kept_after_password_change(self):
+        expected = [302, 200, True]
+
+        response = self.client.post('/profile/password/edit', {
+            'current_password': 'Current5!2345444555',
+            'new_password': 'Changed5!2345444555',
+            'confirm_password': 'Changed5!2345444555'})
+
+        result = [
+            response.status_code,
+            self.client.get('/profile/').status_code,
+            User.objects.get(pk=self.user.pk).check_password(
+                'Changed5!2345444555'),
+        ]
+
+        self.assertEqual(expected, result)
+
+
+class PasswordPolicyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="test")
+        self.profile = Profile.objects.get(user=self.user)
+        self.profile.first_name = "Moe"
+        self.profile.last_name = "Gu"
+        self.profile.save()
+
+    def test_return_every_violation_at_once(self):
+        expected = [
+            'password_too_short',
+            'password_too_similar',
+            'password_missing_characters',
+            'password_missing_characters',
+            'password_missing_characters',
+        ]
+
+        errors = password_policy.password_policy(
+            CHARACTER_CLASSES=['upper', 'lower', 'digit', 'special'],
+        ).violations('moetest', self.user, self.profile)
+
+        result = [error.code for error in errors]
+
+        self.assertEqual(expected, result)
+
+    def test_return_no_violation_if_names_are_empty(self):
+        expected = []
+
+        self.profile.first_name = ""
+        self.profile.last_name = ""
+
+        result = password_policy.password_policy().violations(
+            'Is5!2345123454a', self.user, self.profile)
+
+        self.assertEqual(expected, result)
+
+    def test_return_sign_up_policy_without_character_classes(self):
+        expected = []
+
+        result = password_policy.PasswordPolicyValidator().policy.violations(
+            'correct horse battery', self.user, self.profile)
+
+        self.assertEqual(expected, result)
+
+    @override_settings(PASSWORD_POLICY={'MIN_LENGTH': 4})
+    def test_return_validator_using_policy_of_settings(self):
+        validator = password_policy.PasswordPolicyValidator()
+
+        validator.validate('Is5!', self.user)
+
+        with self.assertRaises(ValidationError):
+            validator.validate('Moe5!aaa', self.user)
+
+    def test_return_form_errors_for_every_violation(self):
+        expected = 3
+
+        form = ChangePasswordForm(
+            data={
+                'current_password': 'hello1',
+                'new_password': 'lowercaseonlypassword',
+                'confirm_password': 'lowercaseonlypassword'},
+            user=self.user,
+            profile=self.profile)
+
+        form.is_valid()
+
+        result = len(form.non_field_errors())
+
+        self.assertEqual(expected, result)
+
+
+class BreachedPasswordTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.index_path = os.path.join(self.directory, 'breached.idx')
+
+        source = os.path.join(self.directory, 'passwords.txt.gz')
+        with gzip.open(source, 'wt') as f:
+            f.write('hunter2\nCorrectHorse\n\nhunter2\nletmein\n')
+
+        call_command(
+            'build_password_index', source,
+            output=self.index_path, chunk_size=2, stdout=StringIO())
+
+    def test_return_unique_sorted_keys_merged_from_chunks(self):
+        expected = [3, True]
+
+        index = breached_passwords.PasswordIndex(self.index_path)
+        keys = [
+            index._map[offset:offset + 8]
+            for offset in range(8, 8 + len(index) * 8, 8)]
+
+        result = [len(index), keys == sorted(keys)]
+
+        self.assertEqual(expected, result)
+
+    def test_return_breached_passwords_found_case_insensitively(self):
+        expected = [True, True, False]
+
+        index = breached_passwords.PasswordIndex(self.index_path)
+
+        result = [
+            'hunter2' in index,
+            'correcthorse' in index,
+            'Unbreached5!2345' in index,
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_validation_error_for_breached_password(self):
+        validator = breached_passwords.BreachedPasswordValidator(
+            index_path=self.index_path)
+
+        validator.validate('Unbreached5!2345')
+
+        with self.assertRaises(ValidationError):
+            validator.validate('LetMeIn')
+
+    def test_return_common_passwords_checked_without_index(self):
+        validator = breached_passwords.BreachedPasswordValidator(
+            index_path=os.path.join(self.directory, 'missing.idx'))
+
+        with self.assertRaises(ValidationError):
+            validator.validate('password')
+
+
+@override_settings(LOGIN_THROTTLING={
+    'STORE': 'memory',
+    'USERNAME_LIMIT': 3,
+    'BACKOFF_AFTER': 10})
+class LoginThrottlingTest(TestCase):
+    def setUp(self):
+        throttling.reset_throttle_stats()
+        User.objects.create_user(username="test", password="hello1")
+
+    def sign_in(self, password):
+        return self.client.post('/accounts/sign_in/', {
+            'username': 'test', 'password': password})
+
+    def test_return_locked_out_without_hashing_after_limit(self):
+        expected = [429, 0, 1]
+
+        for _ in range(3):
+            self.sign_in('wrong')
+
+        with mock.patch('django.contrib.auth.forms.authenticate') as auth:
+            response = self.sign_in('hello1')
+
+        result = [
+            response.status_code,
+            auth.call_count,
+            throttling.throttle_stats()['throttled'],
+        ]
+
+        self.assertEqual(expected, result)
+
+    @override_settings(LOGIN_THROTTLING={
+        'STORE': 'memory', 'BACKOFF_AFTER': 2, 'BACKOFF_BASE': 30})
+    def test_return_backoff_after_repeated_failures(self):
+        expected = [200, 200, 429]
+
+        result = [
+            self.sign_in('wrong').status_code,
+            self.sign_in('wrong').status_code,
+            self.sign_in('hello1').status_code,
+        ]
+
+        self.assertEqual(expected, result)
+
+    @override_settings(TRUSTED_PROXIES=['10.0.0.0/8', '127.0.0.1'])
+    def test_return_client_ip_behind_trusted_proxies(self):
+        expected = [
+            '203.0.113.9',
+            '203.0.113.9',
+            '198.51.100.1',
+            '10.0.0.2',
+            '10.0.0.2',
+        ]
+
+        result = []
+        for remote_addr, forwarded in [
+                ('127.0.0.1', '203.0.113.9'),
+                ('127.0.0.1', '198.51.100.1, 203.0.113.9, 10.0.0.3'),
+                ('198.51.100.1', '203.0.113.9'),
+                ('127.0.0.1', '10.0.0.2'),
+                ('10.0.0.2', '')]:
+            request = HttpRequest()
+            request.META = {
+                'REMOTE_ADDR': remote_addr,
+                'HTTP_X_FORWARDED_FOR': forwarded}
+            result.append(throttling.client_ip(request))
+
+        self.assertEqual(expected, result)
+
+    @override_settings(TRUSTED_PROXIES=['127.0.0.1'], LOGIN_THROTTLING={
+        'STORE': 'memory', 'IP_LIMIT': 2, 'BACKOFF_AFTER': 10})
+    def test_return_clients_behind_proxy_throttled_separately(self):
+        expected = [429, 302]
+
+        for username in ('a', 'b'):
+            self.client.post('/accounts/sign_in/', {
+                'username': username, 'password': 'wrong'},
+                HTTP_X_FORWARDED_FOR='203.0.113.9')
+
+        result = [
+            self.client.post('/accounts/sign_in/', {
+                'username': 'test', 'password': 'hello1'},
+                HTTP_X_FORWARDED_FOR=forwarded).status_code
+            for forwarded in ('203.0.113.9', '198.51.100.1')]
+
+        self.assertEqual(expected, result)
+
+    def test_return_failures_cleared_by_successful_sign_in(self):
+        expected = 302
+
+        self.sign_in('wrong')
+        self.sign_in('wrong')
+        self.sign_in('hello1')
+        self.sign_in('wrong')
+
+        result = self.sign_in('hello1').status_code
+
+        self.assertEqual(expected, result)
+
+    def test_return_attempts_outside_window_not_counted(self):
+        expected = [2, 1]
+
+        store = throttling.MemoryStore()
+        store.hit('key', 60, 0)
+
+        result = [store.hit('key', 60, 30), store.hit('key', 60, 100)]
+
+        self.assertEqual(expected, result)
+
+    def test_return_expired_keys_dropped(self):
+        expected = [['new'], []]
+
+        store = throttling.MemoryStore()
+        store.hit('old', 60, 0)
+        store.block('old', 30)
+        for _ in range(throttling.PRUNE_INTERVAL):
+            store.hit('new', 60, 100)
+
+        result = [list(store._attempts), list(store._blocks)]
+
+        self.assertEqual(expected, result)
+
+    def test_return_least_recently_used_keys_dropped_beyond_limit(self):
+        expected = ['a', 'c']
+
+        store = throttling.MemoryStore(max_keys=2)
+        store.hit('a', 60, 0)
+        store.hit('b', 60, 1)
+        store.hit('a', 60, 2)
+        store.hit('c', 60, 3)
+
+        result = list(store._attempts)
+
+        self.assertEqual(expected, result)
+
+    def test_return_attempts_shared_through_cache(self):
+        expected = 3
+
+        cache.clear()
+        throttling.CacheStore('default').hit('key', 60, 0)
+        throttling.CacheStore('default').hit('key', 60, 10)
+
+        result = throttling.CacheStore('default').hit('key', 60, 20)
+
+        self.assertEqual(expected, result)
+
+
+class ProfileTransferTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+        for number in range(5):
+            user = User.objects.create_user(
+                username="user{}".format(number), password="hello1")
+            Profile.objects.filter(user=user).update(
+                first_name="Moe{}".format(number),
+                date_of_birth="1990-01-0{}".format(number + 1),
+                email="moe{}@example.com".format(number),
+                confirm_email="moe{}@example.com".format(number))
+
+    def round_trip(self, name):
+        path = os.path.join(self.directory, name)
+        call_command(
+            'export_profiles', path, chunk_size=2, stdout=StringIO())
+        expected = list(Profile.objects.order_by('pk').values_list(
+            'user__username', 'user__password', 'first_name',
+            'date_of_birth', 'email'))
+
+        User.objects.all().delete()
+        call_command(
+            'import_profiles', path, batch_size=2, stdout=StringIO())
+
+        result = list(Profile.objects.order_by('pk').values_list(
+            'user__username', 'user__password', 'first_name',
+            'date_of_birth', 'email'))
+
+        self.assertEqual(expected, result)
+
+    def test_return_same_profiles_after_csv_round_trip(self):
+        self.round_trip('profiles.csv')
+
+    def test_return_same_profiles_after_jsonl_round_trip(self):
+        self.round_trip('profiles.jsonl')
+
+    def test_return_invalid_and_existing_rows_skipped(self):
+        expected = [(1, 3), ['new1']]
+
+        rows = [
+            {'username': 'new1', 'date_of_birth': '01/31/1990',
+             'email': 'new@example.com', 'confirm_email': 'new@example.com'},
+            {'username': 'new2', 'date_of_birth': '31.01.1990'},
+            {'username': 'new3', 'email': 'a@example.com'},
+            {'username': 'user0'},
+        ]
+
+        result = [
+            transfer.import_rows(rows, batch_size=2),
+            list(User.objects.filter(
+                username__startswith='new').values_list(
+                    'username', flat=True)),
+        ]
+
+        self.assertEqual(expected, result)
+
+
+class ProfileAdminTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="hello1")
+        self.client.login(username="admin", password="hello1")
+
+        for number in range(3):
+            user = User.objects.create_user(username="user{}".format(number))
+            profile = Profile.objects.get(user=user)
+            profile.first_name = "Moe{}".format(number)
+            profile.avatar = "avatars/{}.png".format(number)
+            profile.save()
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/accounts/profile/')
+        self.assertEqual(200, response.status_code)
+        return len(queries)
+
+    def test_return_changelist_queries_independent_of_row_count(self):
+        expected = self.changelist_queries()
+
+        for number in range(3, 13):
+            User.objects.create_user(username="user{}".format(number))
+
+        result = self.changelist_queries()
+
+        self.assertEqual(expected, result)
+
+    def test_return_profiles_matching_search_prefix(self):
+        expected = [True, False]
+
+        response = self.client.get('/admin/accounts/profile/', {'q': 'moe1'})
+
+        result = [b'user1' in response.content, b'user2' in response.content]
+
+        self.assertEqual(expected, result)
+
+    def test_return_profiles_matching_username_prefix(self):
+        expected = [False, True, False]
+
+        response = self.client.get('/admin/accounts/profile/', {'q': 'user1'})
+
+        result = [
+            'Moe{}'.format(number).encode() in response.content
+            for number in range(3)]
+
+        self.assertEqual(expected, result)
+
+    def test_return_avatars_cleared_by_action(self):
+        expected = 0
+
+        with mock.patch.object(avatars, 'release_avatar'):
+            self.client.post('/admin/accounts/profile/', {
+                'action': 'clear_avatars',
+                '_selected_action': list(Profile.objects.values_list(
+                    'pk', flat=True))})
+
+        result = Profile.objects.exclude(avatar='').exclude(
+            avatar=None).count()
+
+        self.assertEqual(expected, result)
+
+    def test_return_admin_edit_invalidating_cache_and_replacing_avatar(self):
+        expected = ['Ada', False, 1, ['avatars/0.png']]
+
+        profile = Profile.objects.get(user__username='user0')
+        profiles.get_profile(profile.user)
+
+        with mock.patch.object(
+                avatars, 'schedule_avatar_processing') as processing, \
+                mock.patch.object(
+                    avatars, 'schedule_avatar_release') as release:
+            self.client.post(
+                '/admin/accounts/profile/{}/change/'.format(profile.pk), {
+                    'user': profile.user_id,
+                    'first_name': 'Ada',
+                    'avatar': SimpleUploadedFile(
+                        'ada.png', make_image().read(), 'image/png'),
+                })
+
+        profile.refresh_from_db()
+        result = [
+            profiles.get_profile(profile.user).first_name,
+            profile.avatar_ready,
+            processing.call_count,
+            [args[0] for args, _ in release.call_args_list],
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_avatar_released_and_cache_invalidated_on_delete(self):
+        expected = [['avatars/0.png'], False]
+
+        profile = Profile.objects.get(user__username='user0')
+        profiles.get_profile(profile.user)
+
+        with mock.patch.object(
+                avatars, 'schedule_avatar_release') as release:
+            self.client.post(
+                '/admin/accounts/profile/{}/delete/'.format(profile.pk),
+                {'post': 'yes'})
+
+        result = [
+            [args[0] for args, _ in release.call_args_list],
+            cache.get(profiles._cache_key(profile.user_id)) is not None,
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_selected_profiles_exported_as_csv(self):
+        expected = ['username', 'user0', 'user2']
+
+        response = self.client.post('/admin/accounts/profile/', {
+            'action': 'export_csv',
+            '_selected_action': list(Profile.objects.filter(
+                user__username__in=['user0', 'user2']).values_list(
+                    'pk', flat=True))})
+
+        result = [
+            line.split(',')[0] for line in
+            b''.join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual(expected, result)
+
+
+class ProfileSearchTest(TestCase):
+    def setUp(self):
+        for username, first_name, last_name, email in [
+                ("moe", "Moe", "Gu", "moe@example.com"),
+                ("ada", "Ada", "Lovelace", "ada@example.com"),
+                ("grace", "Grace", "Hopper", "hopper@example.com")]:
+            user = User.objects.create_user(
+                username=username, password="hello1")
+            profile = Profile.objects.get(user=user)
+            profile.first_name = first_name
+            profile.last_name = last_name
+            profile.email = email
+            profile.save()
+
+    def search(self, term):
+        return sorted(Profile.objects.search(term).values_list(
+            'user__username', flat=True))
+
+    def test_return_case_folded_name_kept_up_to_date(self):
+        expected = ['moe gu', 'mo guo']
+
+        profile = Profile.objects.get(user__username="moe")
+        result = [profile.search_name]
+
+        profile.first_name = "  MO "
+        profile.last_name = "Guo"
+        profile.save(update_fields=['first_name', 'last_name'])
+        result.append(Profile.objects.get(pk=profile.pk).search_name)
+
+        self.assertEqual(expected, result)
+
+    def test_return_profiles_matching_prefix_of_name_or_email(self):
+        expected = [['moe'], ['ada'], ['grace'], []]
+
+        result = [
+            self.search('MOE g'),
+            self.search('ada lovelace'),
+            self.search('hopper@'),
+            self.search('race'),
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_profiles_matching_email_case_insensitively(self):
+        expected = ['ada@example.com', ['ada'], ['ada']]
+
+        profile = Profile.objects.get(user__username="ada")
+        profile.email = "Ada@Example.com"
+        profile.confirm_email = "Ada@Example.com"
+        profile.save()
+
+        result = [
+            Profile.objects.get(pk=profile.pk).email,
+            self.search('ADA@EX'),
+            self.search('ada@ex'),
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_index_searches_including_usernames(self):
+        expected = [False, True]
+
+        queryset = Profile.objects.search('moe', usernames=True).values('pk')
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        result = [
+            any(step.startswith('SCAN') for step in plan),
+            any('auth_user' in step and '(username>? AND username<?)' in step
+                for step in plan),
+        ]
+
+        self.assertEqual(expected, result, plan)
+
+    def test_return_profiles_matching_username_prefix(self):
+        expected = [['gh'], []]
+
+        User.objects.filter(username="grace").update(username="gh")
+
+        result = [
+            sorted(Profile.objects.search('gh', usernames=True).values_list(
+                'user__username', flat=True)),
+            self.search('gh'),
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_search_fields_backfilled_by_migration(self):
+        expected = [('moe gu', 'moe@example.com', 'moe@example.com')]
+
+        migration = import_module(
+            'accounts.migrations.0002_profile_search_name')
+        Profile.objects.filter(user__username="moe").update(
+            search_name='', email='Moe@Example.com',
+            confirm_email='MOE@example.com')
+
+        with connection.schema_editor() as schema_editor:
+            migration.backfill_search_fields(apps, schema_editor)
+
+        result = list(Profile.objects.filter(user__username="moe").values_list(
+            'search_name', 'email', 'confirm_email'))
+
+        self.assertEqual(expected, result)
+
+    def test_return_search_results_as_json(self):
+        expected = {'results': [
+            {'username': 'ada', 'first_name': 'Ada', 'last_name': 'Lovelace'},
+        ]}
+
+        self.client.login(username="moe", password="hello1")
+
+        result = self.client.get('/profile/search', {'q': 'Ad'}).json()
+
+        self.assertEqual(expected, result)
@@ -0,0 +1,326 @@
+import hashlib
+import ipaddress
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+DEFAULT_LOGIN_THROTTLING = {
+    # 'memory' counts attempts per process, 'cache' shares them between
+    # workers through the CACHE_ALIAS cache
+    'STORE': 'cache',
+    'CACHE_ALIAS': 'default',
+    # the 'memory' store forgets the least recently used IPs and usernames
+    # beyond this number
+    'MAX_KEYS': 100000,
+    # failed attempts allowed per sliding window (seconds), per client IP
+    # and per username, before the IP or username is locked out
+    'IP_LIMIT': 50,
+    'IP_WINDOW': 300,
+    'USERNAME_LIMIT': 10,
+    'USERNAME_WINDOW': 900,
+    'LOCKOUT': 900,
+    # after BACKOFF_AFTER failures of a username, each failure blocks further
+    # attempts for BACKOFF_BASE seconds, doubling up to BACKOFF_MAX
+    'BACKOFF_AFTER': 3,
+    'BACKOFF_BASE': 1,
+    'BACKOFF_MAX': 60,
+}
+
+# the 'memory' store drops expired entries every this many writes
+PRUNE_INTERVAL = 1000
+
+_stats_lock = threading.Lock()
+_stats = {'allowed': 0, 'throttled': 0, 'failures': 0, 'lockouts': 0}
+_store_instance = None
+
+
+def options():
+    """
+    Returns the LOGIN_THROTTLING setting merged into the defaults
+    """
+
+    merged = dict(DEFAULT_LOGIN_THROTTLING)
+    merged.update(getattr(settings, 'LOGIN_THROTTLING', {}))
+    return merged
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+class MemoryStore(object):
+    """
+    Exact sliding windows of attempt timestamps, kept in this process only.
+    Expired windows and blocks are dropped every PRUNE_INTERVAL writes, and
+    the least recently used keys beyond max_keys, so clients rotating IPs
+    or usernames can't grow the process without bound.
+    """
+
+    def __init__(self, max_keys=DEFAULT_LOGIN_THROTTLING['MAX_KEYS']):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> (window, attempt timestamps), least recently used first
+        self._attempts = OrderedDict()
+        self._blocks = OrderedDict()
+        self._writes = 0
+
+    def _prune(self, now):
+        for key in [
+                key for key, (window, attempts) in self._attempts.items()
+                if not attempts or attempts[-1] <= now - window]:
+            del self._attempts[key]
+        for key in [
+                key for key, until in self._blocks.items() if until <= now]:
+            del self._blocks[key]
+
+    def _written(self, now):
+        self._writes += 1
+        if self._writes % PRUNE_INTERVAL == 0:
+            self._prune(now)
+        for entries in (self._attempts, self._blocks):
+            while len(entries) > self.max_keys:
+                entries.popitem(last=False)
+
+    def hit(self, key, window, now):
+        with self._lock:
+            _, attempts = self._attempts.pop(key, (window, deque()))
+            self._attempts[key] = (window, attempts)
+            attempts.append(now)
+            while attempts and attempts[0] <= now - window:
+                attempts.popleft()
+            count = len(attempts)
+            self._written(now)
+            return count
+
+    def block(self, key, until):
+        with self._lock:
+            self._blocks[key] = max(until, self._blocks.pop(key, 0))
+            self._written(time.time())
+
+    def blocked_until(self, key):
+        with self._lock:
+            return self._blocks.get(key, 0)
+
+    def reset(self, key, window):
+        with self._lock:
+            self._attempts.pop(key, None)
+            self._blocks.pop(key, None)
+
+
+class CacheStore(object):
+    """
+    Sliding windows approximated by the counts of the current and previous
+    fixed window, weighted by their overlap with the sliding window. Counts
+    are kept with atomic cache increments, so workers share them.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def _bucket_key(self, key, bucket):
+        return 'accounts:throttle:{}:{}'.format(key, bucket)
+
+    def _block_key(self, key):
+        return 'accounts:throttle-block:{}'.format(key)
+
+    def hit(self, key, window, now):
+        bucket = int(now // window)
+        current_key = self._bucket_key(key, bucket)
+        # twice the window, so the count is still there as previous bucket
+        self.cache.add(current_key, 0, timeout=2 * window)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # expired between add and incr
+            self.cache.set(current_key, 1, timeout=2 * window)
+            current = 1
+
+        previous = self.cache.get(self._bucket_key(key, bucket - 1), 0)
+        elapsed = (now % window) / window
+        return current + int(math.ceil(previous * (1 - elapsed)))
+
+    def block(self, key, until):
+        timeout = int(math.ceil(until - time.time()))
+        if timeout > 0 and until > self.blocked_until(key):
+            self.cache.set(self._block_key(key), until, timeout=timeout)
+
+    def blocked_until(self, key):
+        return self.cache.get(self._block_key(key), 0)
+
+    def reset(self, key, window):
+        bucket = int(time.time() // window)
+        self.cache.delete_many([
+            self._block_key(key),
+            self._bucket_key(key, bucket), self._bucket_key(key, bucket - 1)])
+
+
+def store():
+    """
+    Returns the counter store of the LOGIN_THROTTLING setting, created once
+    per process
+    """
+
+    global _store_instance
+
+    if _store_instance is None:
+        config = options()
+        if config['STORE'] == 'memory':
+            _store_instance = MemoryStore(config['MAX_KEYS'])
+        elif config['STORE'] == 'cache':
+            _store_instance = CacheStore(config['CACHE_ALIAS'])
+        else:
+            raise ValueError(
+                'Unknown login throttling store "{}"'.format(config['STORE']))
+
+    return _store_instance
+
+
+@receiver(setting_changed)
+def reset_store(**kwargs):
+    global _store_instance
+
+    if kwargs['setting'] in ('LOGIN_THROTTLING', 'CACHES'):
+        _store_instance = None
+
+
+def _is_trusted(address, proxies):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in network for network in proxies)
+
+
+def client_ip(request):
+    """
+    Returns the IP address of the client of request (string). Requests from
+    the proxies of the TRUSTED_PROXIES setting (addresses or networks) are
+    attributed to the right-most X-Forwarded-For address that isn't one of
+    them: each proxy appends the address it got the request from, anything
+    left of that may be forged by the client.
+    """
+
+    address = request.META.get('REMOTE_ADDR', '')
+    proxies = [
+        ipaddress.ip_network(proxy, strict=False)
+        for proxy in getattr(settings, 'TRUSTED_PROXIES', [])]
+    if not _is_trusted(address, proxies):
+        return address
+
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for hop in reversed([hop.strip() for hop in forwarded.split(',')]):
+        if not hop:
+            continue
+        if not _is_trusted(hop, proxies):
+            return hop
+        address = hop
+    # only proxies, i.e. a request made by one of them
+    return address
+
+
+def _keys(request):
+    """
+    Returns the store keys and their (limit, window) of a sign in request,
+    the client IP first
+    """
+
+    config = options()
+    keys = [('ip:' + client_ip(request),
+             config['IP_LIMIT'], config['IP_WINDOW'])]
+    username = request.POST.get('username', '').strip().lower()
+    if username:
+        # hashed, so any submitted username makes a valid cache key
+        keys.append((
+            'username:' + hashlib.sha1(username.encode('utf-8')).hexdigest(),
+            config['USERNAME_LIMIT'],
+            config['USERNAME_WINDOW']))
+    return keys
+
+
+def retry_after(request):
+    """
+    Checks whether a sign in attempt is allowed. Meant to be called before
+    the credentials are validated, so throttled attempts never reach a
+    password hasher.
+
+    Args:
+        request: HttpRequest of the sign in attempt
+
+    Returns:
+        Seconds until the client or username may try again (int), or None
+        if the attempt is allowed
+    """
+
+    now = time.time()
+    until = max(
+        store().blocked_until(key) for key, _, _ in _keys(request))
+
+    if until > now:
+        _record('throttled')
+        return int(math.ceil(until - now))
+
+    _record('allowed')
+    return None
+
+
+def attempt_failed(request):
+    """
+    Records a failed sign in attempt, locking the client IP or username out
+    once it exceeds its limit and backing off before that
+    """
+
+    config = options()
+    now = time.time()
+    _record('failures')
+
+    for position, (key, limit, window) in enumerate(_keys(request)):
+        failures = store().hit(key, window, now)
+        if failures >= limit:
+            _record('lockouts')
+            store().block(key, now + config['LOCKOUT'])
+        elif position > 0 and failures >= config['BACKOFF_AFTER']:
+            # clients behind a shared IP aren't slowed down by each other
+            delay = min(
+                config['BACKOFF_BASE'] * 2 ** (
+                    failures - config['BACKOFF_AFTER']),
+                config['BACKOFF_MAX'])
+            store().block(key, now + delay)
+
+
+def attempt_succeeded(request):
+    """
+    Clears the failed attempts of the username of a successful sign in. The
+    attempts of the client IP are kept.
+    """
+
+    for key, _, window in _keys(request)[1:]:
+        store().reset(key, window)
+
+
+def throttle_stats():
+    """
+    Returns counts of sign in attempts since the process started (or the
+    stats were reset), i.e. {'allowed': 10, 'throttled': 2, 'failures': 5,
+    'lockouts': 1}
+    """
+
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_throttle_stats():
+    """
+    Resets the counts returned by throttle_stats
+    """
+
+    with _stats_lock:
+        for outcome in _stats:
+            _stats[outcome] = 0
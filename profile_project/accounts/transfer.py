@@ -0,0 +1,312 @@
+import csv
+import json
+from datetime import datetime
+
+from django.contrib.auth.hashers import identify_hasher
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from . import forms, models
+
+
+# columns of exported and imported rows, user fields first
+USER_FIELDS = ['username', 'password']
+PROFILE_FIELDS = [
+    'first_name',
+    'last_name',
+    'date_of_birth',
+    'email',
+    'confirm_email',
+    'short_bio',
+]
+FIELDS = USER_FIELDS + PROFILE_FIELDS
+# older SQLite versions allow at most 999 parameters per query
+MAX_QUERY_PARAMS = 500
+
+
+def export_rows(chunk_size=2000, queryset=None):
+    """
+    Yields users and their profiles as dictionaries of FIELDS. Profiles are
+    read in primary key order, chunk_size rows per query, so memory use
+    doesn't grow with the number of profiles.
+
+    Args:
+        chunk_size: number of profiles fetched per query (int)
+        queryset: profiles to export, defaults to all of them
+
+    Yields:
+        Dictionaries
+    """
+
+    columns = ['pk'] + ['user__' + name for name in USER_FIELDS] + (
+        PROFILE_FIELDS)
+    if queryset is None:
+        queryset = models.Profile.objects.all()
+    last_pk = 0
+
+    while True:
+        chunk = queryset.filter(pk__gt=last_pk).order_by(
+            'pk').values_list(*columns)[:chunk_size]
+
+        count = 0
+        for values in chunk.iterator():
+            count += 1
+            last_pk = values[0]
+            row = dict(zip(FIELDS, values[1:]))
+            if row['date_of_birth']:
+                row['date_of_birth'] = row['date_of_birth'].isoformat()
+            yield row
+
+        if count < chunk_size:
+            return
+
+
+def parse_date(value):
+    """
+    Parses a date of birth in one of the formats of ProfileForm
+
+    Args:
+        value: (string)
+
+    Returns:
+        date, or None for empty values
+
+    Raises:
+        ValidationError if the date has none of the formats
+    """
+
+    value = (value or '').strip()
+    if not value:
+        return None
+
+    for date_format in forms.DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+
+    raise ValidationError(forms.DATE_INPUT_ERROR)
+
+
+def validate_row(row):
+    """
+    Validates an imported row with the rules of ProfileForm, without
+    building a form for it
+
+    Args:
+        row: dictionary of FIELDS (missing fields are empty)
+
+    Returns:
+        (User, Profile) unsaved instances, the profile without its user
+
+    Raises:
+        ValidationError listing every problem of the row
+    """
+
+    values = {
+        name: ('' if row.get(name) is None else str(row[name]).strip())
+        for name in FIELDS}
+    errors = []
+
+    if not values['username']:
+        errors.append(ValidationError('username is required'))
+    elif len(values['username']) > User._meta.get_field(
+            'username').max_length:
+        errors.append(ValidationError('username is too long'))
+
+    # passwords are migrated as hashes, rows without one get an unusable
+    # password
+    password = values['password'] or None
+    if password:
+        try:
+            identify_hasher(password)
+        except ValueError:
+            errors.append(ValidationError(
+                'password must be a hash of a configured hasher'))
+
+    for name in ('first_name', 'last_name'):
+        if len(values[name]) > 255:
+            errors.append(ValidationError('{} is too long'.format(name)))
+
+    try:
+        date_of_birth = parse_date(values['date_of_birth'])
+    except ValidationError as error:
+        errors.append(error)
+        date_of_birth = None
+
+    for name in ('email', 'confirm_email'):
+        if values[name]:
+            try:
+                validate_email(values[name])
+            except ValidationError as error:
+                errors.append(error)
+
+    try:
+        forms.validate_matching_emails(
+            values['email'], values['confirm_email'])
+    except ValidationError as error:
+        errors.append(error)
+
+    if values['short_bio'] and len(values['short_bio']) < 10:
+        errors.append(ValidationError(
+            'Entry must be 10 characters or longer'))
+
+    if errors:
+        raise ValidationError(errors)
+
+    user = User(username=values['username'])
+    if password:
+        user.password = password
+    else:
+        user.set_unusable_password()
+
+    profile = models.Profile(
+        first_name=values['first_name'],
+        last_name=values['last_name'],
+        date_of_birth=date_of_birth,
+        email=values['email'].lower(),
+        confirm_email=values['confirm_email'].lower(),
+        short_bio=values['short_bio'],
+        # bulk_create doesn't call save, which keeps these up to date
+        search_name=models.search_name(
+            values['first_name'], values['last_name']))
+
+    return user, profile
+
+
+def _user_ids(usernames):
+    """
+    Returns ids of the existing users of usernames, keyed by username
+    """
+
+    user_ids = {}
+    for start in range(0, len(usernames), MAX_QUERY_PARAMS):
+        user_ids.update(User.objects.filter(
+            username__in=usernames[start:start + MAX_QUERY_PARAMS]
+        ).values_list('username', 'id'))
+    return user_ids
+
+
+def _create_batch(batch):
+    """
+    Creates the users and profiles of a batch of validated rows in a single
+    transaction. Users that already exist are skipped.
+
+    Returns:
+        Number of created users (int)
+    """
+
+    with transaction.atomic():
+        existing = _user_ids([user.username for user, _ in batch])
+        batch = [(user, profile) for user, profile in batch
+                 if user.username not in existing]
+        # a repeated username within the batch is created once
+        batch = list({user.username: (user, profile)
+                      for user, profile in batch}.values())
+        if not batch:
+            return 0
+
+        # bulk_create doesn't send post_save, so profiles are created here
+        User.objects.bulk_create([user for user, _ in batch])
+
+        # SQLite doesn't return primary keys of bulk created rows
+        user_ids = _user_ids([user.username for user, _ in batch])
+        profiles = []
+        for user, profile in batch:
+            profile.user_id = user_ids[user.username]
+            profiles.append(profile)
+        models.Profile.objects.bulk_create(profiles)
+
+    return len(batch)
+
+
+def import_rows(rows, batch_size=1000, on_error=None):
+    """
+    Creates users and profiles of rows in batches of batch_size, each in its
+    own transaction. Invalid rows and rows of existing users are skipped.
+
+    Args:
+        rows: iterable of dictionaries of FIELDS
+        batch_size: number of rows created per transaction (int)
+        on_error: called with the row number and ValidationError of invalid
+            rows (optional)
+
+    Returns:
+        (created, skipped) counts
+    """
+
+    created = skipped = 0
+    batch = []
+
+    for number, row in enumerate(rows, 1):
+        try:
+            batch.append(validate_row(row))
+        except ValidationError as error:
+            skipped += 1
+            if on_error is not None:
+                on_error(number, error)
+            continue
+
+        if len(batch) >= batch_size:
+            count = _create_batch(batch)
+            created += count
+            skipped += len(batch) - count
+            batch = []
+
+    if batch:
+        count = _create_batch(batch)
+        created += count
+        skipped += len(batch) - count
+
+    return created, skipped
+
+
+def format_of(path, file_format=None):
+    """
+    Returns 'csv' or 'jsonl', given explicitly or by the extension of path
+    """
+
+    file_format = file_format or path.rsplit('.', 1)[-1].lower()
+    if file_format not in ('csv', 'jsonl'):
+        raise ValueError('Unknown format "{}", use csv or jsonl'.format(
+            file_format))
+    return file_format
+
+
+def write_rows(rows, f, file_format):
+    """
+    Writes rows to an open text file as CSV (with a header) or JSON lines
+
+    Returns:
+        Number of written rows (int)
+    """
+
+    count = 0
+    if file_format == 'csv':
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            f.write(json.dumps(row, sort_keys=True))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def read_rows(f, file_format):
+    """
+    Yields rows of an open text file of CSV (with a header) or JSON lines
+    """
+
+    if file_format == 'csv':
+        for row in csv.DictReader(f):
+            yield row
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
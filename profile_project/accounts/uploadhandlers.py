@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class RejectedUploadedFile(UploadedFile):
+    """
+    Placeholder for an upload that exceeded the size limit. Carries the name
+    and size of the upload but no content, so that form validation can
+    report the error.
+    """
+
+    rejected = True
+
+
+class AvatarUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every uploaded file chunk by chunk to a temporary file, so an
+    upload is never held in memory. Once a file grows past
+    AVATAR_MAX_UPLOAD_SIZE bytes, the temporary file is discarded and the
+    remaining chunks are dropped without being written.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(AvatarUploadHandler, self).__init__(*args, **kwargs)
+        self.max_size = settings.AVATAR_MAX_UPLOAD_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super(AvatarUploadHandler, self).new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.rejected:
+            return None
+
+        self.received += len(raw_data)
+
+        if self.received > self.max_size:
+            self.rejected = True
+            # temporary file is deleted on close
+            self.file.close()
+            return None
+
+        return super(AvatarUploadHandler, self).receive_data_chunk(
+            raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.rejected:
+            return RejectedUploadedFile(
+                name=self.file_name,
+                content_type=self.content_type,
+                size=file_size,
+                charset=self.charset,
+                content_type_extra=self.content_type_extra)
+
+        return super(AvatarUploadHandler, self).file_complete(file_size)
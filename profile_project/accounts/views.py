@@ -4,15 +4,34 @@ from django.contrib.auth.forms import (
     AuthenticationForm,
     UserCreationForm)
 from django.core.urlresolvers import reverse
+from django.db import transaction
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
 
+from . import throttling
+
 
 def sign_in(request):
     form = AuthenticationForm()
     if request.method == 'POST':
+        # throttled attempts are rejected before any password is hashed
+        retry_after = throttling.retry_after(request)
+        if retry_after is not None:
+            messages.error(
+                request,
+                "Too many sign in attempts. Try again in {} second(s).".format(
+                    retry_after)
+            )
+            response = render(
+                request, 'accounts/sign_in.html', {'form': form}, status=429)
+            response['Retry-After'] = retry_after
+            return response
+
         form = AuthenticationForm(data=request.POST)
-        if form.is_valid():
+        if not form.is_valid():
+            throttling.attempt_failed(request)
+        else:
+            throttling.attempt_succeeded(request)
             if form.user_cache is not None:
                 user = form.user_cache
                 if user.is_active:
@@ -49,7 +68,9 @@ def sign_up(request):
     if request.method == 'POST':
         form = UserCreationForm(data=request.POST)
         if form.is_valid():
-            form.save()
+            # profile is created by post_save hook in the same transaction
+            with transaction.atomic():
+                form.save()
             user = authenticate(
                 username=form.cleaned_data['username'],
                 password=form.cleaned_data['password1']
@@ -0,0 +1 @@
+default_app_config = 'project_7.apps.Project7Config'
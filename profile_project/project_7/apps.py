@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class Project7Config(AppConfig):
+    name = 'project_7'
+
+    def ready(self):
+        from . import database  # noqa: F401
@@ -0,0 +1,236 @@
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, .br files are skipped without it
+    brotli = None
+
+
+BUNDLE_DIR = 'bundles'
+MANIFEST_NAME = 'manifest.json'
+
+CSS_TOKENS = re.compile(
+    r'(/\*.*?\*/)|("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', re.DOTALL)
+CSS_IMPORT = re.compile(
+    r'@import\s+(?:url\(\s*)?["\']?([^"\')\s]+)["\']?\s*\)?\s*([^;]*);')
+CSS_URL = re.compile(r'url\(\s*(["\']?)([^"\')]+)\1\s*\)')
+
+_manifest = None
+
+
+def bundles():
+    """
+    Returns configured bundles, i.e. {'global.css': ['css/global.css']}
+    """
+
+    return getattr(settings, 'ASSET_BUNDLES', {})
+
+
+def _find(path):
+    fullpath = finders.find(path)
+    if not fullpath:
+        raise ImproperlyConfigured(
+            'Static file "{}" of asset bundle not found'.format(path))
+    return fullpath
+
+
+def _is_local(url):
+    return not re.match(r'^([a-z]+:|/|#)', url, re.IGNORECASE)
+
+
+def _strip_comments(css):
+    return CSS_TOKENS.sub(lambda match: match.group(2) or '', css)
+
+
+def _rebase_urls(css, path):
+    """
+    Rewrites relative url() references of the stylesheet at the given static
+    path, so that they resolve from the bundle directory
+    """
+
+    def rebase(match):
+        url = match.group(2).strip()
+        if not _is_local(url):
+            return match.group(0)
+        target = posixpath.normpath(
+            posixpath.join(posixpath.dirname(path), url))
+        return 'url("{}")'.format(posixpath.relpath(target, BUNDLE_DIR))
+
+    return CSS_URL.sub(rebase, css)
+
+
+def resolve_css(path, seen=None):
+    """
+    Reads the stylesheet at the given static path and inlines its local
+    @import rules recursively. Imports with media queries are wrapped in
+    @media blocks, imports of remote stylesheets are kept as they are.
+
+    Args:
+        path: static path of the stylesheet, i.e. 'css/global.css' (string)
+
+    Returns:
+        Stylesheet (string)
+    """
+
+    seen = seen or set()
+    if path in seen:
+        return ''
+    seen.add(path)
+
+    with open(_find(path), encoding='utf-8') as f:
+        css = _rebase_urls(_strip_comments(f.read()), path)
+
+    def inline(match):
+        url, media = match.group(1), match.group(2).strip()
+        if not _is_local(url):
+            return match.group(0)
+
+        imported = posixpath.normpath(
+            posixpath.join(posixpath.dirname(path), url))
+        if not posixpath.splitext(imported)[1]:
+            imported += '.css'
+
+        content = resolve_css(imported, seen)
+        if media:
+            return '@media {}{{{}}}'.format(media, content)
+        return content
+
+    return CSS_IMPORT.sub(inline, css)
+
+
+def minify_css(css):
+    """
+    Removes comments and redundant whitespace from a stylesheet. Strings are
+    left untouched.
+
+    Args:
+        css: stylesheet (string)
+
+    Returns:
+        Minified stylesheet (string)
+    """
+
+    def squeeze(text):
+        text = re.sub(r'\s+', ' ', text)
+        text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+        text = re.sub(r':\s+', ':', text)
+        return text.replace(';}', '}')
+
+    output = []
+    position = 0
+    for match in CSS_TOKENS.finditer(css):
+        output.append(squeeze(css[position:match.start()]))
+        if match.group(2):
+            output.append(match.group(2))
+        position = match.end()
+    output.append(squeeze(css[position:]))
+
+    return ''.join(output).strip()
+
+
+def render_bundle(name, paths):
+    """
+    Returns the content of a bundle. Stylesheets are resolved and minified,
+    scripts are concatenated.
+
+    Args:
+        name: bundle name, its extension decides the type (string)
+        paths: static paths of the bundled files (list)
+
+    Returns:
+        Bundle content (bytes)
+    """
+
+    if name.endswith('.css'):
+        return minify_css(
+            '\n'.join(resolve_css(path) for path in paths)).encode('utf-8')
+
+    scripts = []
+    for path in paths:
+        with open(_find(path), 'rb') as f:
+            scripts.append(f.read().strip())
+    # guard against scripts missing their final semicolon
+    return b'\n;\n'.join(scripts) + b'\n'
+
+
+def _write(path, content):
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def _gzip(content):
+    # fixed mtime keeps the output identical across builds
+    output = BytesIO()
+    with gzip.GzipFile(fileobj=output, mode='wb', compresslevel=9,
+                       mtime=0) as f:
+        f.write(content)
+    return output.getvalue()
+
+
+def build_bundles(output_dir=None):
+    """
+    Writes every configured bundle under a fingerprinted name (i.e.
+    'bundles/global.1a2b3c4d5e6f.css') together with precompressed .gz and
+    .br siblings, and a manifest mapping bundle names to those files.
+
+    Args:
+        output_dir: defaults to STATIC_ROOT (string)
+
+    Returns:
+        Manifest (dict)
+    """
+
+    output_dir = os.path.join(output_dir or settings.STATIC_ROOT, BUNDLE_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+
+    manifest = {}
+    for name, paths in sorted(bundles().items()):
+        content = render_bundle(name, paths)
+        root, extension = os.path.splitext(name)
+        fingerprint = hashlib.sha256(content).hexdigest()[:12]
+        hashed_name = '{}.{}{}'.format(root, fingerprint, extension)
+        path = os.path.join(output_dir, hashed_name)
+
+        _write(path, content)
+        _write(path + '.gz', _gzip(content))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(content))
+
+        manifest[name] = posixpath.join(BUNDLE_DIR, hashed_name)
+
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    global _manifest
+    _manifest = manifest
+
+    return manifest
+
+
+def manifest():
+    """
+    Returns the manifest written by build_bundles, or an empty dictionary if
+    the bundles haven't been built. It is read once per process.
+    """
+
+    global _manifest
+
+    if _manifest is None:
+        try:
+            with open(os.path.join(
+                    settings.STATIC_ROOT, BUNDLE_DIR, MANIFEST_NAME)) as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+
+    return _manifest
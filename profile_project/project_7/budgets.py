@@ -0,0 +1,158 @@
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext
+
+from .metrics import view_name
+
+
+# view name -> method -> limits of a single request: SQL queries, rendered
+# templates (each include counts) and wall time in ms. Query counts are
+# those of the default 'db' session engine, which reads the session of
+# signed in requests from the database. Wall times are loose bounds for the
+# test database meant to catch orders of magnitude, not noise; POSTs
+# verifying or setting passwords include a password hash. They depend on
+# the machine, so they are only enforced with the ENFORCE_TIME_BUDGETS
+# setting (see violations).
+BUDGETS = {
+    'home': {
+        'GET': {'queries': 2, 'templates': 2, 'ms': 200},
+    },
+    'accounts:sign_up': {
+        'GET': {'queries': 0, 'templates': 2, 'ms': 100},
+        'POST': {'queries': 17, 'templates': 0, 'ms': 1000},
+    },
+    'accounts:sign_in': {
+        'GET': {'queries': 0, 'templates': 2, 'ms': 100},
+        'POST': {'queries': 12, 'templates': 0, 'ms': 1000},
+    },
+    'accounts:sign_out': {
+        'GET': {'queries': 4, 'templates': 0, 'ms': 100},
+    },
+    'profile_view': {
+        'GET': {'queries': 3, 'templates': 2, 'ms': 100},
+    },
+    'profile_edit': {
+        'GET': {'queries': 3, 'templates': 2, 'ms': 100},
+        'POST': {'queries': 3, 'templates': 0, 'ms': 250},
+    },
+    'profile_password_edit': {
+        'GET': {'queries': 3, 'templates': 2, 'ms': 100},
+        'POST': {'queries': 6, 'templates': 0, 'ms': 1000},
+    },
+    'profile_avatar_edit': {
+        'GET': {'queries': 3, 'templates': 2, 'ms': 100},
+        'POST': {'queries': 3, 'templates': 0, 'ms': 250},
+    },
+    'profile_avatar_preview': {
+        'GET': {'queries': 2, 'templates': 0, 'ms': 250},
+    },
+    'profile_search': {
+        'GET': {'queries': 3, 'templates': 0, 'ms': 100},
+    },
+    'metrics': {
+        'GET': {'queries': 0, 'templates': 0, 'ms': 100},
+    },
+    'media': {
+        'GET': {'queries': 0, 'templates': 0, 'ms': 100},
+    },
+    'bundle': {
+        'GET': {'queries': 0, 'templates': 1, 'ms': 100},
+    },
+}
+
+
+def measure(client, method, path, data=None, **extra):
+    """
+    Sends a request with the test client, counting its queries and template
+    renders. Templates are only seen under the test runner, which
+    instruments rendering.
+
+    Args:
+        client: django.test.Client
+        method: 'GET' or 'POST'
+        path: URL path (string)
+        data: query or form data (dict)
+        extra: request headers, i.e. HTTP_RANGE='bytes=0-1'
+
+    Returns:
+        (response, measurement), measurement being a dict of the view name,
+        method, executed SQL (list), rendered template names (list) and
+        wall time in ms
+    """
+
+    templates = []
+
+    def rendered(sender, template, context, **kwargs):
+        # templates built from strings, i.e. the default 404 page, have no name
+        templates.append(template.name or '<string>')
+
+    template_rendered.connect(rendered)
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(client, method.lower())(
+                path, data or {}, **extra)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            duration = time.perf_counter() - start
+    finally:
+        template_rendered.disconnect(rendered)
+
+    return response, {
+        'view': view_name(response.wsgi_request),
+        'method': method,
+        'queries': [query['sql'] for query in queries.captured_queries],
+        'templates': templates,
+        'ms': duration * 1000,
+    }
+
+
+def violations(measurement, budgets=None, timed=None):
+    """
+    Returns the limits exceeded by a measurement (list of strings), empty if
+    it is within the budget of its view. The wall time is only checked if
+    timed, which defaults to the ENFORCE_TIME_BUDGETS setting.
+    """
+
+    if timed is None:
+        timed = getattr(settings, 'ENFORCE_TIME_BUDGETS', False)
+    keys = ('queries', 'templates', 'ms') if timed else (
+        'queries', 'templates')
+
+    budget = (budgets or BUDGETS).get(
+        measurement['view'], {}).get(measurement['method'])
+    if budget is None:
+        return ['{view} {method} has no budget'.format(**measurement)]
+
+    actual = {
+        'queries': len(measurement['queries']),
+        'templates': len(measurement['templates']),
+        'ms': round(measurement['ms'], 1),
+    }
+    return [
+        '{} {}: {} {}, the budget is {}'.format(
+            measurement['view'], measurement['method'], actual[key], key,
+            budget[key])
+        for key in keys
+        if actual[key] > budget[key]
+    ]
+
+
+def report(measurement, budgets=None):
+    """
+    Returns the exceeded limits of a measurement, followed by its wall
+    time, queries and templates, as text for assertion messages
+    """
+
+    lines = violations(measurement, budgets)
+    lines.append('{:.1f} ms'.format(measurement['ms']))
+    lines.append('{} queries:'.format(len(measurement['queries'])))
+    lines.extend(
+        '  {}. {}'.format(number, sql)
+        for number, sql in enumerate(measurement['queries'], 1))
+    lines.append('{} templates: {}'.format(
+        len(measurement['templates']), ', '.join(measurement['templates'])))
+    return '\n'.join(lines)
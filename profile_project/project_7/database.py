@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+# applied in this order, journal_mode first since it needs a lock of its own
+PRAGMA_ORDER = (
+    'journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+
+
+def sqlite_pragmas(pragmas):
+    """
+    Returns PRAGMA statements of the given settings, i.e.
+    {'journal_mode': 'wal'} -> ['PRAGMA journal_mode=wal']
+
+    Args:
+        pragmas: pragma names and values (dict)
+
+    Returns:
+        List of strings
+    """
+
+    names = sorted(pragmas, key=lambda name: (
+        PRAGMA_ORDER.index(name) if name in PRAGMA_ORDER else
+        len(PRAGMA_ORDER), name))
+    return ['PRAGMA {}={}'.format(name, pragmas[name]) for name in names]
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Tunes every new SQLite connection with the SQLITE_PRAGMAS setting
+    """
+
+    if connection.vendor != 'sqlite':
+        return
+
+    cursor = connection.cursor()
+    try:
+        for statement in sqlite_pragmas(getattr(settings, 'SQLITE_PRAGMAS', {})):
+            cursor.execute(statement)
+    finally:
+        cursor.close()
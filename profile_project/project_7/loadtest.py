@@ -0,0 +1,327 @@
+import http.cookiejar
+import math
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+
+
+# latency percentiles reported per step
+PERCENTILES = (50, 95, 99)
+# compared against the baseline, p99 of a short run is mostly its slowest
+# request
+COMPARED_PERCENTILES = ('p50_ms', 'p95_ms')
+# messages of failed requests kept for the report
+MAX_FAILURES = 10
+
+
+def avatar_upload():
+    """
+    Returns a fresh 400x300 PNG upload for the avatar field
+    """
+
+    content = BytesIO()
+    Image.new('RGB', (400, 300), (200, 120, 40)).save(content, 'PNG')
+    return SimpleUploadedFile(
+        'avatar.png', content.getvalue(), content_type='image/png')
+
+
+class InProcessClient(object):
+    """
+    Sends requests through the Django test client, i.e. the full middleware
+    stack and URLconf without a server or network in between
+    """
+
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data=None):
+        if method == 'POST':
+            response = self.client.post(path, data or {})
+        else:
+            response = self.client.get(path)
+        # streamed responses are consumed like a server would
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        return response.status_code
+
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    # redirects are part of the flows' expected responses
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient(object):
+    """
+    Sends requests to a running server at base_url, keeping its cookies and
+    adding the CSRF token to the posted forms
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirects)
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == settings.CSRF_COOKIE_NAME:
+                return cookie.value
+        return ''
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {}
+        if method == 'POST':
+            data = dict(data or {}, csrfmiddlewaretoken=self._csrf_token())
+            body = encode_multipart(BOUNDARY, data)
+            headers['Content-Type'] = MULTIPART_CONTENT
+            headers['Referer'] = url
+
+        request = urllib.request.Request(
+            url, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as error:
+            error.read()
+            return error.code
+
+
+class Flow(object):
+    """
+    Account and profile flow of one new user: sign up, sign out, sign in,
+    view the profile, edit it with an avatar upload, change the password
+    and sign out. Each step is a (name, method, path, data, expected status)
+    tuple, requests are timed per step name.
+    """
+
+    def __init__(self, username):
+        self.username = username
+        self.passwords = ['Quartz#Lantern47', 'Velvet@Harbor92']
+
+    def steps(self):
+        password, new_password = self.passwords
+        profile = {
+            'first_name': 'Ada',
+            'last_name': 'Lovelace',
+            'date_of_birth': '1815-12-10',
+            'email': '{}@example.com'.format(self.username),
+            'confirm_email': '{}@example.com'.format(self.username),
+            'short_bio': 'Wrote the first published algorithm.',
+        }
+
+        yield 'sign_up GET', 'GET', reverse('accounts:sign_up'), None, 200
+        yield 'sign_up POST', 'POST', reverse('accounts:sign_up'), {
+            'username': self.username,
+            'password1': password,
+            'password2': password,
+        }, 302
+        yield 'sign_out', 'GET', reverse('accounts:sign_out'), None, 302
+        yield 'sign_in GET', 'GET', reverse('accounts:sign_in'), None, 200
+        yield 'sign_in POST', 'POST', reverse('accounts:sign_in'), {
+            'username': self.username,
+            'password': password,
+        }, 302
+        yield 'profile_view', 'GET', reverse('profile_view'), None, 200
+        yield 'profile_edit GET', 'GET', reverse('profile_edit'), None, 200
+        yield 'profile_edit POST', 'POST', reverse('profile_edit'), dict(
+            profile, avatar=avatar_upload()), 302
+        yield ('profile_password_edit GET', 'GET',
+               reverse('profile_password_edit'), None, 200)
+        yield ('profile_password_edit POST', 'POST',
+               reverse('profile_password_edit'), {
+                   'current_password': password,
+                   'new_password': new_password,
+                   'confirm_password': new_password,
+               }, 302)
+        yield 'sign_out', 'GET', reverse('accounts:sign_out'), None, 302
+
+
+class Recorder(object):
+    """
+    Latencies (seconds) and failures per step name of one worker
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+        self.failures = []
+
+    def run(self, client, flow):
+        """
+        Runs the steps of flow, stopping at the first unexpected response
+        since the following steps depend on it
+        """
+
+        for name, method, path, data, expected in flow.steps():
+            start = time.perf_counter()
+            try:
+                status = client.request(method, path, data)
+            except Exception as error:
+                status = error
+            duration = time.perf_counter() - start
+
+            self.timings.setdefault(name, []).append(duration)
+            if status != expected:
+                self.errors[name] = self.errors.get(name, 0) + 1
+                self.failures.append('{} {} ({}): got {}, expected {}'.format(
+                    method, path, flow.username, status, expected))
+                return False
+        return True
+
+    def merge(self, other):
+        for name, timings in other.timings.items():
+            self.timings.setdefault(name, []).extend(timings)
+        for name, count in other.errors.items():
+            self.errors[name] = self.errors.get(name, 0) + count
+        self.failures.extend(other.failures)
+
+
+def run(client_factory, workers, iterations):
+    """
+    Runs the flows of workers concurrent clients, each signing up iterations
+    new users one after the other. A single worker runs in the calling
+    thread.
+
+    Args:
+        client_factory: callable returning a new client with a
+            request(method, path, data) method returning the status code
+        workers: number of concurrent clients (int)
+        iterations: flows run by each client (int)
+
+    Returns:
+        (Recorder with the requests of all workers, wall time in seconds)
+    """
+
+    prefix = uuid.uuid4().hex[:8]
+    total = Recorder()
+    lock = threading.Lock()
+
+    def worker(number):
+        recorder = Recorder()
+        try:
+            for iteration in range(iterations):
+                recorder.run(client_factory(), Flow(
+                    'flow{}-{}-{}'.format(prefix, number, iteration)))
+        finally:
+            with lock:
+                total.merge(recorder)
+
+    def threaded_worker(number):
+        try:
+            worker(number)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    if workers == 1:
+        worker(0)
+    else:
+        threads = [
+            threading.Thread(target=threaded_worker, args=(number,))
+            for number in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return total, time.perf_counter() - start
+
+
+def percentile(values, percent):
+    """
+    Returns the nearest-rank percentile of sorted values
+    """
+
+    rank = int(math.ceil(percent / 100 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def summarize(recorder, duration):
+    """
+    Returns the report of a run, i.e.
+
+        {'duration': 12.5, 'requests': 1100, 'errors': 0,
+         'requests_per_second': 88.0,
+         'steps': {'profile_view': {'requests': 100, 'errors': 0,
+                                    'requests_per_second': 8.0,
+                                    'mean_ms': 9.1, 'p50_ms': 8.4,
+                                    'p95_ms': 14.0, 'p99_ms': 21.3}, ...},
+         'failures': [...]}
+    """
+
+    steps = {}
+    for name, timings in sorted(recorder.timings.items()):
+        timings = sorted(timings)
+        step = {
+            'requests': len(timings),
+            'errors': recorder.errors.get(name, 0),
+            'requests_per_second': round(len(timings) / duration, 2),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+        }
+        for percent in PERCENTILES:
+            step['p{}_ms'.format(percent)] = round(
+                percentile(timings, percent) * 1000, 2)
+        steps[name] = step
+
+    requests = sum(step['requests'] for step in steps.values())
+    return {
+        'duration': round(duration, 3),
+        'requests': requests,
+        'errors': sum(recorder.errors.values()),
+        'requests_per_second': round(requests / duration, 2),
+        'steps': steps,
+        'failures': recorder.failures[:MAX_FAILURES],
+    }
+
+
+def compare(baseline, result, threshold):
+    """
+    Compares a report against a baseline report
+
+    Args:
+        baseline: report of summarize (dict)
+        result: report of summarize (dict)
+        threshold: tolerated share of slowdown, i.e. 0.1 for 10% (float)
+
+    Returns:
+        descriptions of the regressions (list of strings), empty if there
+        are none
+    """
+
+    regressions = []
+
+    def slower(label, before, after):
+        if before and after > before * (1 + threshold):
+            regressions.append('{}: {} -> {} (+{:.0%})'.format(
+                label, before, after, after / before - 1))
+
+    before = baseline['requests_per_second']
+    after = result['requests_per_second']
+    if before and after < before * (1 - threshold):
+        regressions.append('requests_per_second: {} -> {} (-{:.0%})'.format(
+            before, after, 1 - after / before))
+
+    for name, step in sorted(result['steps'].items()):
+        baseline_step = baseline['steps'].get(name)
+        if baseline_step is None:
+            continue
+        for key in COMPARED_PERCENTILES:
+            slower('{} {}'.format(name, key), baseline_step[key], step[key])
+
+    return regressions
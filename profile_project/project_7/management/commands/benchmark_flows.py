@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from accounts import avatars
+from project_7 import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs concurrent sign up, sign in, profile view, profile edit (with '
+        'an avatar upload) and password change flows through the URLconf, '
+        'in-process on a scratch database or against a running server, and '
+        'reports requests/sec and latency percentiles per step')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running server, i.e. http://127.0.0.1:8000 '
+                 '(requests run in-process on a scratch database if not '
+                 'given). The flows sign up new users on it.')
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Number of concurrent clients')
+        parser.add_argument(
+            '--iterations', type=int, default=10,
+            help='Flows (new users) run by each client')
+        parser.add_argument(
+            '--output', help='Writes the report as JSON to this file')
+        parser.add_argument(
+            '--baseline',
+            help='JSON report of a previous run; the command fails if this '
+                 'run is slower beyond --threshold')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Tolerated slowdown against the baseline, i.e. 0.1 for 10%%')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        if options['url']:
+            mode = 'http'
+            recorder, duration = loadtest.run(
+                lambda: loadtest.HttpClient(options['url']),
+                options['workers'],
+                options['iterations'])
+        else:
+            mode = 'in-process'
+            recorder, duration = self.run_in_process(
+                options['workers'], options['iterations'])
+
+        report = loadtest.summarize(recorder, duration)
+        report.update({
+            'mode': mode,
+            'workers': options['workers'],
+            'iterations': options['iterations'],
+        })
+
+        self.write_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+        if report['errors']:
+            raise CommandError('{} flow(s) failed'.format(report['errors']))
+
+        if baseline is not None:
+            regressions = loadtest.compare(
+                baseline, report, options['threshold'])
+            if regressions:
+                raise CommandError('Slower than the baseline:\n    {}'.format(
+                    '\n    '.join(regressions)))
+            self.stdout.write('No regression against the baseline')
+
+    def run_in_process(self, workers, iterations):
+        """
+        Runs the flows through the test client on a scratch copy of the
+        schema, with uploads written to a temporary MEDIA_ROOT
+        """
+
+        directory = tempfile.mkdtemp()
+        test_settings = connection.settings_dict.setdefault('TEST', {})
+        if connection.vendor == 'sqlite':
+            # a file, unlike the in-memory default, is shared by the workers
+            test_settings['NAME'] = os.path.join(
+                directory, 'benchmark.sqlite3')
+
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                    MEDIA_ROOT=os.path.join(directory, 'media'),
+                    ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+                try:
+                    return loadtest.run(
+                        loadtest.InProcessClient, workers, iterations)
+                finally:
+                    avatars.wait_for_avatar_processing()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(directory)
+
+    def write_report(self, report):
+        self.stdout.write(
+            '{mode}: {workers} worker(s) x {iterations} flow(s), {requests} '
+            'requests in {duration:.1f}s, {requests_per_second:.1f} req/s, '
+            '{errors} error(s)'.format(**report))
+        self.stdout.write('{:<28} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+            'step', 'requests', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for name, step in sorted(report['steps'].items()):
+            self.stdout.write(
+                '{:<28} {:>8} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f}'.format(
+                    name,
+                    step['requests'],
+                    step['requests_per_second'],
+                    step['p50_ms'],
+                    step['p95_ms'],
+                    step['p99_ms']))
+        for failure in report['failures']:
+            self.stdout.write('    ' + failure)
@@ -0,0 +1,168 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.test import override_settings
+
+
+SCHEMA = [
+    'CREATE TABLE profile (id INTEGER PRIMARY KEY, bio TEXT, version INTEGER)',
+    'CREATE TABLE session (session_key TEXT PRIMARY KEY, session_data TEXT, '
+    'expire_date REAL)',
+]
+
+
+def _request(connection, rows, write_ratio):
+    """
+    Runs the queries of one authenticated request: a session and a profile
+    read, followed by a profile edit and session write for write_ratio of
+    the requests
+    """
+
+    user_id = random.randint(1, rows)
+    session_key = 'session{}'.format(user_id)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT session_data FROM session WHERE session_key = %s',
+            [session_key])
+        cursor.fetchall()
+        cursor.execute('SELECT bio FROM profile WHERE id = %s', [user_id])
+        cursor.fetchall()
+
+        if random.random() < write_ratio:
+            cursor.execute(
+                'UPDATE profile SET bio = %s, version = version + 1 '
+                'WHERE id = %s',
+                ['x' * random.randint(10, 500), user_id])
+            cursor.execute(
+                'INSERT OR REPLACE INTO session VALUES (%s, %s, %s)',
+                [session_key, 'y' * 200, time.time() + 3600])
+
+
+def run_load(path, mode, threads, duration, rows, write_ratio, pragmas):
+    """
+    Runs requests from several threads against the database at path, for
+    the given number of seconds
+
+    Args:
+        path: SQLite database file (string)
+        mode: 'default' (no pragmas, connection per request) or 'tuned'
+        threads: number of concurrent clients (int)
+        duration: seconds (float)
+        rows: number of profiles and sessions in the database (int)
+        write_ratio: share of requests writing (float)
+        pragmas: SQLITE_PRAGMAS of the tuned mode (dict)
+
+    Returns:
+        (completed requests, "database is locked" errors)
+    """
+
+    tuned = mode == 'tuned'
+    connections = ConnectionHandler({'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': 600 if tuned else 0,
+    }})
+    counts = {'requests': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        requests = locked = 0
+        connection = connections['default']
+        while time.perf_counter() < deadline:
+            try:
+                _request(connection, rows, write_ratio)
+                requests += 1
+            except OperationalError:
+                locked += 1
+            # what the request_finished signal does
+            connection.close_if_unusable_or_obsolete()
+        connection.close()
+        with lock:
+            counts['requests'] += requests
+            counts['locked'] += locked
+
+    with override_settings(SQLITE_PRAGMAS=pragmas if tuned else {}):
+        workers = [threading.Thread(target=client) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    return counts['requests'], counts['locked']
+
+
+def create_database(path, rows):
+    connections = ConnectionHandler({'default': {
+        'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}})
+    connection = connections['default']
+    with override_settings(SQLITE_PRAGMAS={}):
+        with connection.cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            cursor.executemany(
+                'INSERT INTO profile VALUES (%s, %s, 0)',
+                [(number, 'bio') for number in range(1, rows + 1)])
+            cursor.executemany(
+                'INSERT INTO session VALUES (%s, %s, %s)',
+                [('session{}'.format(number), 'data', time.time())
+                 for number in range(1, rows + 1)])
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Load tests concurrent profile and session reads and writes on a '
+        'scratch SQLite database, with SQLite defaults and a connection per '
+        'request against SQLITE_PRAGMAS and reused connections')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Number of concurrent clients')
+        parser.add_argument(
+            '--duration', type=float, default=5.0,
+            help='Seconds to run each mode for')
+        parser.add_argument(
+            '--rows', type=int, default=1000,
+            help='Number of profiles and sessions')
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.3,
+            help='Share of requests editing a profile and writing a session')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            '{} thread(s), {:.1f}s per mode, {:.0%} writes'.format(
+                options['threads'],
+                options['duration'],
+                options['write_ratio']))
+        self.stdout.write('{:<10} {:>10} {:>10} {:>10}'.format(
+            'mode', 'requests', 'req/s', 'locked'))
+
+        for mode in ('default', 'tuned'):
+            directory = tempfile.mkdtemp()
+            try:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                create_database(path, options['rows'])
+                requests, locked = run_load(
+                    path,
+                    mode,
+                    options['threads'],
+                    options['duration'],
+                    options['rows'],
+                    options['write_ratio'],
+                    settings.SQLITE_PRAGMAS)
+            finally:
+                shutil.rmtree(directory)
+
+            self.stdout.write('{:<10} {:>10} {:>10.1f} {:>10}'.format(
+                mode, requests, requests / options['duration'], locked))
@@ -0,0 +1,118 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.urlresolvers import reverse
+
+
+# run in a new interpreter, so nothing is imported or cached beforehand
+CHILD = '''
+import json
+import sys
+import time
+
+start = time.perf_counter()
+from project_7.wsgi import application
+loaded = time.perf_counter()
+
+from django.test import RequestFactory
+
+factory = RequestFactory()
+requests = []
+
+
+def start_response(status, headers, *args):
+    statuses.append(int(status.split()[0]))
+
+
+for path in sys.argv[1:]:
+    environ = factory.get(path).environ
+    statuses = []
+    request_start = time.perf_counter()
+    response = application(environ, start_response)
+    b''.join(response)
+    response.close()
+    duration = time.perf_counter() - request_start
+    requests.append([path, statuses[0], duration * 1000])
+
+print(json.dumps({'startup': (loaded - start) * 1000, 'requests': requests}))
+'''
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares startup time and first request latencies of new processes '
+        'loading project_7.wsgi without (cold) and with (warm) the warm-up '
+        'of project_7.warmup. Templates stay compiled only with DEBUG = '
+        'False.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='Path requested after startup, repeatable (defaults to the '
+                 'home, sign in and sign up pages)')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Processes started per mode; medians are reported')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or [
+            reverse('home'),
+            reverse('accounts:sign_in'),
+            reverse('accounts:sign_up'),
+        ]
+
+        results = {}
+        for mode in ('cold', 'warm'):
+            runs = [self.start(mode, paths) for _ in range(options['repeat'])]
+            results[mode] = {
+                'startup': _median([run['startup'] for run in runs]),
+                'requests': [
+                    _median([run['requests'][index][2] for run in runs])
+                    for index in range(len(paths))],
+                'statuses': runs[0]['requests'],
+            }
+
+        self.stdout.write(
+            'DEBUG = {}, median of {} process(es) per mode'.format(
+                settings.DEBUG, options['repeat']))
+        self.stdout.write('{:<40} {:>10} {:>10}'.format(
+            '', 'cold ms', 'warm ms'))
+        self.stdout.write('{:<40} {:>10.1f} {:>10.1f}'.format(
+            'startup', results['cold']['startup'],
+            results['warm']['startup']))
+        for index, path in enumerate(paths):
+            self.stdout.write('{:<40} {:>10.1f} {:>10.1f}'.format(
+                'first GET {} ({})'.format(
+                    path, results['warm']['statuses'][index][1]),
+                results['cold']['requests'][index],
+                results['warm']['requests'][index]))
+        self.stdout.write('{:<40} {:>10.1f} {:>10.1f}'.format(
+            'first requests', sum(results['cold']['requests']),
+            sum(results['warm']['requests'])))
+
+    def start(self, mode, paths):
+        env = dict(os.environ)
+        env.pop('DJANGO_SKIP_WARMUP', None)
+        if mode == 'cold':
+            env['DJANGO_SKIP_WARMUP'] = '1'
+
+        process = subprocess.run(
+            [sys.executable, '-c', CHILD] + paths,
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True)
+        if process.returncode:
+            raise CommandError('{} start failed:\n{}'.format(
+                mode, process.stderr))
+        return json.loads(process.stdout.strip().splitlines()[-1])
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from project_7 import assets
+
+
+class Command(BaseCommand):
+    help = (
+        'Bundles, minifies and fingerprints the stylesheets and scripts in '
+        'ASSET_BUNDLES and writes precompressed copies to STATIC_ROOT')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir',
+            help='Directory to write the bundles to (defaults to STATIC_ROOT)')
+
+    def handle(self, *args, **options):
+        manifest = assets.build_bundles(options['output_dir'])
+
+        for name, hashed_name in sorted(manifest.items()):
+            self.stdout.write('{} -> {}'.format(name, hashed_name))
+
+        if assets.brotli is None:
+            self.stdout.write(
+                'brotli is not installed, skipped .br files')
@@ -0,0 +1,67 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+def clear_expired_sessions(batch_size=1000, pause=0.0):
+    """
+    Deletes expired database sessions in batches, each in its own short
+    transaction, so the table isn't locked for the whole cleanup
+
+    Args:
+        batch_size: number of sessions deleted per transaction (int)
+        pause: seconds to wait between batches (float)
+
+    Returns:
+        Number of deleted sessions (int)
+    """
+
+    now = timezone.now()
+    deleted = 0
+
+    while True:
+        with transaction.atomic():
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list(
+                    'session_key', flat=True)[:batch_size])
+            if not keys:
+                return deleted
+            Session.objects.filter(session_key__in=keys).delete()
+
+        deleted += len(keys)
+        if len(keys) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired sessions in small batches. Sessions of the cache '
+        'and signed cookie engines expire on their own.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of sessions deleted per transaction')
+        parser.add_argument(
+            '--pause', type=float, default=0.0,
+            help='Seconds to wait between batches')
+
+    def handle(self, *args, **options):
+        engine = settings.SESSION_ENGINE
+        if not engine.endswith(('.db', '.cached_db')):
+            import_module(engine).SessionStore.clear_expired()
+            self.stdout.write(
+                'Sessions of {} expire on their own'.format(engine))
+            return
+
+        deleted = clear_expired_sessions(
+            batch_size=options['batch_size'], pause=options['pause'])
+
+        self.stdout.write('Deleted {} expired session(s)'.format(deleted))
@@ -0,0 +1,92 @@
+import os
+import pstats
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from project_7 import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        'Summarizes the hottest functions of the requests captured by '
+        'ProfilingMiddleware')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            help='Directory of the captures (defaults to '
+                 'PROFILING[\'DIRECTORY\'])')
+        parser.add_argument(
+            '--view', help='Only captures of this view, i.e. profile_edit')
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Number of functions to list')
+
+    def handle(self, *args, **options):
+        directory = options['directory'] or profiling.options()['DIRECTORY']
+        if not os.path.isdir(directory):
+            raise CommandError('{} does not exist'.format(directory))
+
+        captures = {'prof': [], 'collapsed': []}
+        for name in sorted(os.listdir(directory)):
+            match = profiling.CAPTURE_NAME.match(name)
+            if not match:
+                continue
+            view = match.group('view')
+            if options['view'] and view != options['view'].replace(':', '.'):
+                continue
+            captures[match.group('kind')].append(os.path.join(directory, name))
+
+        self.summarize_profiles(captures['prof'], options['limit'])
+        self.summarize_stacks(captures['collapsed'], options['limit'])
+
+    def summarize_profiles(self, paths, limit):
+        self.stdout.write('{} sampled request profile(s)'.format(len(paths)))
+        if not paths:
+            return
+
+        stats = pstats.Stats(*paths)
+        rows = sorted(
+            stats.stats.items(),
+            key=lambda item: item[1][2],  # total time in the function itself
+            reverse=True)[:limit]
+
+        self.stdout.write('{:>10} {:>10} {:>10}  {}'.format(
+            'calls', 'tottime', 'cumtime', 'function'))
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in (
+                rows):
+            self.stdout.write('{:>10} {:>10.4f} {:>10.4f}  {}:{}({})'.format(
+                calls, tottime, cumtime, filename, line, function))
+
+    def summarize_stacks(self, paths, limit):
+        self.stdout.write('{} slow request stack capture(s)'.format(
+            len(paths)))
+        if not paths:
+            return
+
+        # samples per function at the top of the stack (self time) and
+        # anywhere on the stack (total time)
+        own = Counter()
+        total = Counter()
+        samples = 0
+        for path in paths:
+            with open(path) as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if not stack:
+                        continue
+                    count = int(count)
+                    frames = stack.split(';')
+                    samples += count
+                    own[frames[-1]] += count
+                    for frame in set(frames):
+                        total[frame] += count
+
+        self.stdout.write('{:>8} {:>8}  {}'.format('self %', 'total %',
+                                                   'function'))
+        for frame, count in own.most_common(limit):
+            self.stdout.write('{:>8.1f} {:>8.1f}  {}'.format(
+                100.0 * count / samples,
+                100.0 * total[frame] / samples,
+                frame))
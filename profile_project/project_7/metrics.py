@@ -0,0 +1,266 @@
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends import utils
+from django.http import Http404, HttpResponse
+from django.template import base
+
+from accounts import hashers, profiles, throttling
+
+
+# upper bounds of the histogram buckets
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+HISTOGRAMS = [
+    # name, help, buckets, key of the request state
+    ('http_request_duration_seconds',
+     'Wall time of requests', DURATION_BUCKETS, 'duration'),
+    ('http_request_sql_queries',
+     'SQL queries per request', COUNT_BUCKETS, 'sql_queries'),
+    ('http_request_sql_duration_seconds',
+     'Time spent in SQL queries per request', DURATION_BUCKETS, 'sql_time'),
+    ('http_request_template_duration_seconds',
+     'Time spent rendering templates per request', DURATION_BUCKETS,
+     'template_time'),
+    ('http_request_password_hash_duration_seconds',
+     'Time spent hashing passwords per request', DURATION_BUCKETS,
+     'hash_time'),
+]
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_local = threading.local()
+_lock = threading.Lock()
+# (histogram name, view name) -> Histogram
+_histograms = {}
+# (view name, status class) -> count
+_responses = {}
+
+
+class Histogram(object):
+    """
+    Counts of observed values per bucket, with their sum. Buckets are upper
+    bounds, counts are kept per bucket and accumulated when rendered.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Yields (upper bound, count of values up to it), '+Inf' last
+        """
+
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+def _timed_sql(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        state = getattr(_local, 'state', None)
+        if state is None:
+            return method(self, *args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            state['sql_queries'] += 1
+            state['sql_time'] += time.perf_counter() - start
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _timed_render(method):
+    @functools.wraps(method)
+    def wrapper(self, context):
+        state = getattr(_local, 'state', None)
+        if state is None or state['template_depth']:
+            # included templates are part of the outermost render
+            return method(self, context)
+
+        state['template_depth'] += 1
+        start = time.perf_counter()
+        try:
+            return method(self, context)
+        finally:
+            state['template_depth'] -= 1
+            state['template_time'] += time.perf_counter() - start
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _record_hash(sender, duration, **kwargs):
+    state = getattr(_local, 'state', None)
+    if state is not None:
+        state['hash_time'] += duration
+
+
+_install_lock = threading.Lock()
+
+
+def install():
+    """
+    Wraps SQL cursors and template rendering, and listens to password
+    hashing, so they are timed for instrumented requests. Outside of them
+    the wrappers cost a thread local lookup.
+    """
+
+    with _install_lock:
+        if getattr(utils.CursorWrapper.execute, 'instrumented', False):
+            return
+
+        utils.CursorWrapper.execute = _timed_sql(utils.CursorWrapper.execute)
+        utils.CursorWrapper.executemany = _timed_sql(
+            utils.CursorWrapper.executemany)
+        base.Template.render = _timed_render(base.Template.render)
+        hashers.password_hashed.connect(
+            _record_hash, dispatch_uid='project_7.metrics')
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name
+
+
+def record(view, state, status):
+    """
+    Adds the measurements of a request to the histograms of its view
+    """
+
+    with _lock:
+        for name, _, buckets, key in HISTOGRAMS:
+            histogram = _histograms.get((name, view))
+            if histogram is None:
+                histogram = _histograms[(name, view)] = Histogram(buckets)
+            histogram.observe(state[key])
+
+        status_class = '{}xx'.format(status // 100)
+        _responses[(view, status_class)] = (
+            _responses.get((view, status_class), 0) + 1)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _responses.clear()
+
+
+class MetricsMiddleware(object):
+    """
+    Records wall time, SQL query count and time, template render time and
+    password hash time of every request, per URL name, into in-process
+    histograms exposed by the metrics view. Put it first in
+    MIDDLEWARE_CLASSES to include the time of the other middleware.
+    """
+
+    def __init__(self):
+        install()
+
+    def process_request(self, request):
+        _local.state = {
+            'start': time.perf_counter(),
+            'sql_queries': 0,
+            'sql_time': 0.0,
+            'template_time': 0.0,
+            'template_depth': 0,
+            'hash_time': 0.0,
+        }
+
+    def process_response(self, request, response):
+        state = getattr(_local, 'state', None)
+        if state is None:
+            return response
+        _local.state = None
+
+        state['duration'] = time.perf_counter() - state['start']
+        record(view_name(request), state, response.status_code)
+        return response
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n'))
+        for name, value in sorted(labels.items()))
+
+
+def render_metrics():
+    """
+    Returns the metrics in the Prometheus text format (string)
+    """
+
+    lines = []
+
+    with _lock:
+        for name, help_text, _, _ in HISTOGRAMS:
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} histogram'.format(name))
+            for (histogram_name, view), histogram in sorted(
+                    _histograms.items()):
+                if histogram_name != name:
+                    continue
+                for bound, count in histogram.cumulative():
+                    lines.append('{}_bucket{{{}}} {}'.format(
+                        name, _labels(view=view, le=bound), count))
+                lines.append('{}_sum{{{}}} {}'.format(
+                    name, _labels(view=view), histogram.sum))
+                lines.append('{}_count{{{}}} {}'.format(
+                    name, _labels(view=view), histogram.count))
+
+        lines.append('# HELP http_responses_total Responses per status class')
+        lines.append('# TYPE http_responses_total counter')
+        for (view, status), count in sorted(_responses.items()):
+            lines.append('http_responses_total{{{}}} {}'.format(
+                _labels(view=view, status=status), count))
+
+    counters = [
+        ('profile_cache_requests_total', 'Profile cache lookups',
+         'outcome', profiles.cache_stats()),
+        ('login_attempts_total', 'Sign in attempts seen by the throttle',
+         'outcome', throttling.throttle_stats()),
+    ]
+    for name, help_text, label, values in counters:
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} counter'.format(name))
+        for value_name, count in sorted(values.items()):
+            lines.append('{}{{{}}} {}'.format(
+                name, _labels(**{label: value_name}), count))
+
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """
+    Serves the metrics to the addresses of METRICS_ALLOWED_IPS. Behind the
+    TRUSTED_PROXIES, the client address is taken from X-Forwarded-For, so a
+    proxy on an allowed address doesn't expose them to everyone.
+    """
+
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    if throttling.client_ip(request) not in allowed:
+        raise Http404('Not found')
+
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,204 @@
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import view_name
+
+
+DEFAULT_PROFILING = {
+    'ENABLED': False,
+    # share of requests profiled with cProfile (0 to 1)
+    'SAMPLE_RATE': 0.01,
+    # requests slower than this (ms) keep their sampled stacks, None to
+    # disable the stack sampler
+    'SLOW_THRESHOLD': 1000,
+    # ms between stack samples
+    'SAMPLE_INTERVAL': 5,
+    'DIRECTORY': None,
+    # oldest captures are deleted beyond this number of files
+    'MAX_FILES': 200,
+}
+
+CAPTURE_NAME = re.compile(
+    r'^(?P<time>\d+)-(?P<view>[\w.-]+)-(?P<ms>\d+)ms\.'
+    r'(?P<kind>prof|collapsed)$')
+
+
+def options():
+    """
+    Returns the PROFILING setting merged into the defaults
+    """
+
+    merged = dict(DEFAULT_PROFILING)
+    merged.update(getattr(settings, 'PROFILING', {}))
+    if not merged['DIRECTORY']:
+        merged['DIRECTORY'] = os.path.join(settings.BASE_DIR, 'profiles')
+    return merged
+
+
+def collapse(frame):
+    """
+    Returns the stack of frame in the collapsed format of flamegraph.pl,
+    outermost call first, i.e. 'module:function;module:function'
+    """
+
+    names = []
+    while frame is not None:
+        names.append('{}:{}'.format(
+            frame.f_globals.get('__name__', '?'), frame.f_code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler(object):
+    """
+    Samples the stacks of the threads serving requests from a background
+    thread, every interval seconds. The thread is started by the first
+    request of each process rather than on creation: servers forking after
+    loading the application (i.e. gunicorn --preload) would leave their
+    workers without it, with a copy of its lock in whatever state it had at
+    the fork.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._requests = {}
+
+    def _ensure_running(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # nothing of the parent's sampler carries over to this process
+            self._lock = threading.Lock()
+            self._requests = {}
+            threading.Thread(
+                target=self._run, name='stack-sampler', daemon=True).start()
+            self._pid = os.getpid()
+
+    def start(self, thread_id):
+        self._ensure_running()
+        with self._lock:
+            self._requests[thread_id] = Counter()
+
+    def stop(self, thread_id):
+        """
+        Returns the stack counts sampled since start (Counter)
+        """
+
+        with self._lock:
+            return self._requests.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._requests:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._requests.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+
+def _capture_path(directory, view, duration, kind):
+    return os.path.join(directory, '{}-{}-{}ms.{}'.format(
+        int(time.time() * 1000),
+        re.sub(r'[^\w.-]', '.', view),
+        int(duration * 1000),
+        kind))
+
+
+def rotate(directory, max_files):
+    """
+    Deletes the oldest captures of directory beyond max_files
+    """
+
+    captures = sorted(
+        name for name in os.listdir(directory) if CAPTURE_NAME.match(name))
+    for name in captures[:max(len(captures) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+class ProfilingMiddleware(object):
+    """
+    Opt-in profiler (PROFILING['ENABLED']). A SAMPLE_RATE share of the
+    requests runs under cProfile and is written as pstats file. Stacks of
+    every request are sampled, and those of requests slower than
+    SLOW_THRESHOLD are written as collapsed stacks for flame graphs. Files
+    are named after time, view and duration; summarize them with `manage.py
+    profile_summary`.
+    """
+
+    def __init__(self):
+        self.options = options()
+        if not self.options['ENABLED']:
+            raise MiddlewareNotUsed
+
+        os.makedirs(self.options['DIRECTORY'], exist_ok=True)
+        self.sampler = None
+        if self.options['SLOW_THRESHOLD'] is not None:
+            self.sampler = StackSampler(
+                self.options['SAMPLE_INTERVAL'] / 1000)
+
+    def process_request(self, request):
+        request._profiling_start = time.perf_counter()
+        request._profiler = None
+
+        if random.random() < self.options['SAMPLE_RATE']:
+            request._profiler = cProfile.Profile()
+            request._profiler.enable()
+
+        if self.sampler is not None:
+            self.sampler.start(threading.get_ident())
+
+    def process_response(self, request, response):
+        start = getattr(request, '_profiling_start', None)
+        if start is None:
+            return response
+
+        profiler = request._profiler
+        if profiler is not None:
+            profiler.disable()
+        stacks = None
+        if self.sampler is not None:
+            stacks = self.sampler.stop(threading.get_ident())
+
+        duration = time.perf_counter() - start
+        view = view_name(request)
+        directory = self.options['DIRECTORY']
+        written = False
+
+        if profiler is not None:
+            profiler.dump_stats(
+                _capture_path(directory, view, duration, 'prof'))
+            written = True
+
+        if stacks is not None:
+            if stacks and duration * 1000 >= self.options['SLOW_THRESHOLD']:
+                path = _capture_path(directory, view, duration, 'collapsed')
+                with open(path, 'w') as f:
+                    for stack, count in stacks.most_common():
+                        f.write('{} {}\n'.format(stack, count))
+                written = True
+
+        if written:
+            rotate(directory, self.options['MAX_FILES'])
+
+        return response
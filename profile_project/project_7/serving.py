@@ -0,0 +1,294 @@
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views.static import was_modified_since
+
+from . import assets
+
+
+# content addressed names (see accounts.storage) contain the SHA-256 digest
+HASHED_NAME = re.compile(r'(?:^|[/_.-])([0-9a-f]{64})(?:[_.-]|$)')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+BLOCK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# precompressed siblings written by assets.build_bundles, preferred first
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+
+def file_etag(path, stat_result):
+    """
+    Returns (unquoted) ETag of a file. Content addressed files are tagged
+    with their digest, other files with modification time and size.
+
+    Args:
+        path: name of the file (string)
+        stat_result: os.stat result of the file
+
+    Returns:
+        String
+    """
+
+    match = HASHED_NAME.search(path)
+    if match:
+        return match.group(1)
+
+    return '{:x}-{:x}'.format(int(stat_result.st_mtime), stat_result.st_size)
+
+
+def is_not_modified(request, etag, stat_result):
+    """
+    Checks conditional request headers. If-None-Match takes precedence over
+    If-Modified-Since.
+
+    Args:
+        request: HttpRequest
+        etag: ETag of the file (string, unquoted)
+        stat_result: os.stat result of the file
+
+    Returns:
+        True if the client's copy is still valid, False otherwise
+    """
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return (if_none_match.strip() == '*' or
+                etag in parse_etags(if_none_match))
+
+    return not was_modified_since(
+        request.META.get('HTTP_IF_MODIFIED_SINCE'),
+        stat_result.st_mtime,
+        stat_result.st_size)
+
+
+def requested_range(request, etag, size):
+    """
+    Parses the Range header. Only single byte ranges are supported, requests
+    for multiple ranges get the whole file.
+
+    Args:
+        request: HttpRequest
+        etag: ETag of the file (string, unquoted)
+        size: size of the file in bytes (int)
+
+    Returns:
+        (first, last) byte positions, None to serve the whole file, or
+        False if the range cannot be satisfied
+    """
+
+    header = request.META.get('HTTP_RANGE')
+    if not header or request.method != 'GET':
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range.strip('"') != etag:
+        return None
+
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first, last = match.groups()
+    if first == '':
+        # suffix range, i.e. the last N bytes
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+
+    if first >= size or first > last:
+        return False
+
+    return first, last
+
+
+def _read_range(path, first, last):
+    with open(path, 'rb') as f:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = f.read(min(BLOCK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, fullpath, immutable=False,
+               content_type=None, content_encoding=None):
+    """
+    Serves a file with conditional GET (ETag, Last-Modified) and single
+    byte range support. Whole files are returned as FileResponse, so the
+    WSGI server can send them with sendfile.
+
+    Args:
+        request: HttpRequest
+        path: public name of the file, used for the ETag (string)
+        fullpath: location of the file on disk (string)
+        immutable: whether the content of the path never changes (bool)
+        content_type: defaults to the type guessed from path (string)
+        content_encoding: i.e. 'gzip' for precompressed files (string)
+
+    Returns:
+        HttpResponse
+
+    Raises:
+        Http404 if the file doesn't exist
+    """
+
+    try:
+        stat_result = os.stat(fullpath)
+    except OSError:
+        raise Http404('"{}" does not exist'.format(path))
+
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('"{}" does not exist'.format(path))
+
+    etag = file_etag(path, stat_result)
+    if content_encoding:
+        etag = '{}-{}'.format(etag, content_encoding)
+
+    if is_not_modified(request, etag, stat_result):
+        response = HttpResponseNotModified()
+    else:
+        if content_type is None:
+            content_type = (
+                mimetypes.guess_type(path)[0] or 'application/octet-stream')
+
+        size = stat_result.st_size
+        byte_range = requested_range(request, etag, size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+
+        if byte_range:
+            first, last = byte_range
+            response = StreamingHttpResponse(
+                _read_range(fullpath, first, last),
+                status=206,
+                content_type=content_type)
+            response['Content-Range'] = 'bytes {}-{}/{}'.format(
+                first, last, size)
+            response['Content-Length'] = last - first + 1
+        else:
+            response = FileResponse(
+                open(fullpath, 'rb'), content_type=content_type)
+            response.block_size = BLOCK_SIZE
+            response['Content-Length'] = size
+
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+
+    response['ETag'] = quote_etag(etag)
+    response['Last-Modified'] = http_date(stat_result.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+
+    if immutable:
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = 'public, max-age={}'.format(
+            getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600))
+
+    return response
+
+
+def serve_media(request, path):
+    """
+    Serves uploaded media (i.e. avatars) from MEDIA_ROOT. Content addressed
+    names are cached forever. If MEDIA_ACCEL_REDIRECT_PREFIX is set, the
+    file is handed off to the front-end server (nginx) by X-Accel-Redirect
+    instead.
+    """
+
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404('"{}" does not exist'.format(path))
+
+    immutable = HASHED_NAME.search(path) is not None
+    accel_prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', None)
+
+    if accel_prefix:
+        response = HttpResponse()
+        # let the front-end server pick the content type
+        del response['Content-Type']
+        response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + path
+        if immutable:
+            response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+    return serve_file(request, path, fullpath, immutable=immutable)
+
+
+def accepts_encoding(request, encoding):
+    """
+    Checks whether the Accept-Encoding header allows the given encoding
+
+    Args:
+        request: HttpRequest
+        encoding: content coding, i.e. 'gzip' (string)
+
+    Returns:
+        Boolean
+    """
+
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip().lower() != encoding:
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+
+    return False
+
+
+def serve_bundle(request, path):
+    """
+    Serves fingerprinted asset bundles (see project_7.assets) with immutable
+    caching, picking the precompressed variant the client accepts
+    """
+
+    try:
+        fullpath = safe_join(
+            os.path.join(settings.STATIC_ROOT, assets.BUNDLE_DIR), path)
+    except (SuspiciousFileOperation, ValueError):
+        raise Http404('"{}" does not exist'.format(path))
+
+    content_type = mimetypes.guess_type(path)[0]
+
+    for encoding, suffix in PRECOMPRESSED:
+        if (accepts_encoding(request, encoding) and
+                os.path.isfile(fullpath + suffix)):
+            response = serve_file(
+                request,
+                path + suffix,
+                fullpath + suffix,
+                immutable=True,
+                content_type=content_type,
+                content_encoding=encoding)
+            break
+    else:
+        response = serve_file(
+            request, path, fullpath, immutable=True, content_type=content_type)
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
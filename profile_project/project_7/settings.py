@@ -11,11 +11,21 @@ https://docs.djangoproject.com/en/1.9/ref/settings/
 """
 
 import os
+import sys
+from collections import OrderedDict
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
+def _env_flag(name):
+    # '1', 'true', 'yes' or 'on' turn a flag on, anything else leaves it off
+    return os.environ.get(name, '').strip().lower() in (
+        '1', 'true', 'yes', 'on')
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/1.9/howto/deployment/checklist/
 
@@ -38,9 +48,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'accounts',
+    'project_7',
 ]
 
 MIDDLEWARE_CLASSES = [
+    # first, so the time of the other middleware is measured as well
+    'project_7.metrics.MetricsMiddleware',
+    'project_7.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,11 +67,46 @@ MIDDLEWARE_CLASSES = [
 
 ROOT_URLCONF = 'project_7.urls'
 
+# Opt-in request profiling (see project_7.profiling), enabled with the
+# DJANGO_PROFILING environment variable set to 1, true or yes. Captures are
+# written to DIRECTORY and summarized with `manage.py profile_summary`.
+PROFILING = {
+    'ENABLED': _env_flag('DJANGO_PROFILING'),
+    'SAMPLE_RATE': 0.01,
+    'SLOW_THRESHOLD': 1000,
+    'SAMPLE_INTERVAL': 5,
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+    'MAX_FILES': 200,
+}
+
+# Wall time limits of project_7.budgets, checked by the tests only if the
+# DJANGO_TIME_BUDGETS environment variable is 1, true or yes. Query and
+# template limits are always checked.
+ENFORCE_TIME_BUDGETS = _env_flag('DJANGO_TIME_BUDGETS')
+
+# Addresses or networks of the reverse proxies in front of the app, i.e.
+# ['127.0.0.1'] behind an nginx on the same host. Requests from them are
+# attributed to the client in their X-Forwarded-For header by the sign in
+# throttle and the metrics view (see accounts.throttling.client_ip).
+TRUSTED_PROXIES = []
+
+# Addresses allowed to read the Prometheus metrics of project_7.metrics at
+# /metrics. Behind a proxy, list it in TRUSTED_PROXIES, or its own address
+# lets every client in.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+# Compiled templates are cached per process, except in DEBUG where edits are
+# picked up on the next request. DEBUG is on in this development setup, so
+# the cached loader only applies once it is turned off.
+_TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -65,10 +114,20 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            'loaders': _TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', _TEMPLATE_LOADERS),
+            ],
         },
     },
 ]
 
+# project_7.wsgi compiles the templates, resolves the URLconf and imports
+# the apps' modules before serving (see project_7.warmup), so they are
+# shared by the workers of servers forking after loading the application
+# (i.e. gunicorn --preload). Skipped if DJANGO_SKIP_WARMUP is 1, true or
+# yes.
+WARMUP = not _env_flag('DJANGO_SKIP_WARMUP')
+
 WSGI_APPLICATION = 'project_7.wsgi.application'
 
 
@@ -79,34 +138,182 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # reuse connections across requests instead of reconnecting (and
+        # re-applying SQLITE_PRAGMAS) for every request
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# Applied to every new SQLite connection (see project_7.database). WAL lets
+# readers continue while a profile or session is written, and busy_timeout
+# (ms) waits for the write lock instead of failing with "database is
+# locked". Compare against the defaults with `manage.py benchmark_sqlite`.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 64 * 1024 * 1024,
+    # negative sizes are KiB
+    'cache_size': -16000,
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+
+# Local memory is per process. With several workers use a shared backend,
+# i.e. 'django.core.cache.backends.memcached.MemcachedCache' or
+# 'django.core.cache.backends.filebased.FileBasedCache'.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Profiles are read through the cache by accounts.profiles.get_profile
+PROFILE_CACHE_ALIAS = 'default'
+PROFILE_CACHE_TIMEOUT = 300
+# Rendered profile pages are cached per user and profile version. Change the
+# cache KEY_PREFIX on deploys that change the profile templates.
+PROFILE_PAGE_CACHE_TIMEOUT = 600
+
+# Profile edits invalidate the cached profiles and pages in the cache of the
+# worker handling the edit only, unless it is shared. Outside DEBUG and the tests,
+# which run in a single process, the local memory cache is refused.
+if not DEBUG and sys.argv[1:2] != ['test'] and CACHES[PROFILE_CACHE_ALIAS][
+        'BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    raise ImproperlyConfigured(
+        'The profile and page caches need a cache shared by the workers, the '
+        '"{}" cache is local to each process'.format(PROFILE_CACHE_ALIAS))
+
+
+# Sessions
+# https://docs.djangoproject.com/en/1.9/topics/http/sessions/
+#
+# Picked with the DJANGO_SESSION_ENGINE environment variable: 'db' (the
+# default) keeps sessions in the database, 'cached_db' reads them from the
+# cache and writes them through to the database, 'cache' keeps them in the
+# cache only and 'signed_cookies' in the client's cookie. 'cached_db' and
+# 'cache' need a cache shared by all workers: with the per-process local
+# memory cache, a session deleted by one worker (i.e. on sign out) stays
+# valid in the others. SessionAuthenticationMiddleware verifies the session
+# auth hash with every engine, so changing the password invalidates other
+# sessions. Clear expired database sessions with `manage.py
+# clear_expired_sessions`.
+
+SESSION_BACKEND = os.environ.get('DJANGO_SESSION_ENGINE', 'db')
+
+_SESSION_ENGINES = OrderedDict([
+    ('db', 'django.contrib.sessions.backends.db'),
+    ('cached_db', 'django.contrib.sessions.backends.cached_db'),
+    ('cache', 'django.contrib.sessions.backends.cache'),
+    ('signed_cookies', 'django.contrib.sessions.backends.signed_cookies'),
+])
+
+if SESSION_BACKEND not in _SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        'Unknown DJANGO_SESSION_ENGINE "{}", choose one of: {}'.format(
+            SESSION_BACKEND, ', '.join(_SESSION_ENGINES)))
+
+SESSION_ENGINE = _SESSION_ENGINES[SESSION_BACKEND]
+
+SESSION_CACHE_ALIAS = 'default'
+
+if SESSION_BACKEND in ('cached_db', 'cache') and CACHES[SESSION_CACHE_ALIAS][
+        'BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    raise ImproperlyConfigured(
+        'The "{}" session engine needs a cache shared by the workers, the '
+        '"{}" cache is local to each process'.format(
+            SESSION_BACKEND, SESSION_CACHE_ALIAS))
+
+SESSION_COOKIE_HTTPONLY = True
+
+# Messages are kept in a signed cookie, so flashing one doesn't write the
+# session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/1.9/topics/auth/passwords/
+#
+# The preferred hasher (first in PASSWORD_HASHERS) hashes new passwords; the
+# others only verify existing hashes, which are rehashed with the preferred
+# hasher and current cost on the next login. 'bcrypt' requires bcrypt,
+# 'argon2' requires argon2-cffi. Measure costs with `manage.py
+# benchmark_hashers`.
+
+PASSWORD_HASHER = os.environ.get('DJANGO_PASSWORD_HASHER', 'pbkdf2')
+
+PASSWORD_HASHING = {
+    'PBKDF2_ITERATIONS': 24000,
+    'BCRYPT_ROUNDS': 12,
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 512,
+    'ARGON2_PARALLELISM': 2,
+}
+
+_PASSWORD_HASHER_CLASSES = OrderedDict([
+    ('pbkdf2', 'accounts.hashers.PBKDF2PasswordHasher'),
+    ('argon2', 'accounts.hashers.Argon2PasswordHasher'),
+    ('bcrypt', 'accounts.hashers.BCryptSHA256PasswordHasher'),
+])
+
+if PASSWORD_HASHER not in _PASSWORD_HASHER_CLASSES:
+    raise ImproperlyConfigured(
+        'Unknown DJANGO_PASSWORD_HASHER "{}", choose one of: {}'.format(
+            PASSWORD_HASHER, ', '.join(_PASSWORD_HASHER_CLASSES)))
+
+PASSWORD_HASHERS = [_PASSWORD_HASHER_CLASSES.pop(PASSWORD_HASHER)] + list(
+    _PASSWORD_HASHER_CLASSES.values()) + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptPasswordHasher',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
 
 AUTH_PASSWORD_VALIDATORS = [
     {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-        'OPTIONS': {
-            'max_similarity': 0.3,
-        }
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-        'OPTIONS': {
-            'min_length': 14,
-        }
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+        'NAME': 'accounts.password_policy.PasswordPolicyValidator',
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+        'NAME': 'accounts.breached_passwords.BreachedPasswordValidator',
     },
 ]
 
+# Rules of accounts.password_policy, checked in a single pass over the
+# password by both the validator above and the change password form. The
+# change password form always requires every character class; list them in
+# CHARACTER_CLASSES (i.e. ['upper', 'lower', 'digit', 'special']) to
+# require them on sign up too.
+PASSWORD_POLICY = {
+    'MIN_LENGTH': 14,
+    'CHARACTER_CLASSES': [],
+    'USER_ATTRIBUTES': ['username', 'profile.first_name', 'profile.last_name'],
+}
+
+# Memory-mapped index of breached passwords, built with
+# `python manage.py build_password_index <list>`. Django's list of common
+# passwords is checked instead as long as the index doesn't exist.
+BREACHED_PASSWORDS_INDEX = os.path.join(BASE_DIR, 'breached_passwords.idx')
+
+# Sign in throttling (see accounts.throttling). Failed attempts are counted
+# per client IP and per username in sliding windows (seconds); the 'cache'
+# store shares the counts between workers, 'memory' keeps them per process.
+LOGIN_THROTTLING = {
+    'STORE': 'cache',
+    'CACHE_ALIAS': 'default',
+    'IP_LIMIT': 50,
+    'IP_WINDOW': 300,
+    'USERNAME_LIMIT': 10,
+    'USERNAME_WINDOW': 900,
+    'LOCKOUT': 900,
+    'BACKOFF_AFTER': 3,
+    'BACKOFF_BASE': 1,
+    'BACKOFF_MAX': 60,
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.9/topics/i18n/
@@ -129,8 +336,52 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'assets'),
 ]
+STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+
+# Bundles built by `manage.py build_assets` (see project_7.assets), name ->
+# static paths of the bundled files
+ASSET_BUNDLES = {
+    'global.css': [
+        'css/global.css',
+    ],
+    'global.js': [
+        'js/vendor/jquery-2.2.4.min.js',
+        'js/autogrow.js',
+        'js/global.js',
+    ],
+}
 
 
 # Media files (for imageField)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Media serving (see project_7.serving). Content addressed files are cached
+# forever, others for MEDIA_CACHE_MAX_AGE seconds. Set the redirect prefix to
+# an internal nginx location to let nginx send the files.
+MEDIA_CACHE_MAX_AGE = 3600
+MEDIA_ACCEL_REDIRECT_PREFIX = None
+
+# Avatars are stored once per distinct content (see accounts.storage)
+AVATAR_STORAGE = 'accounts.storage.ContentAddressedStorage'
+
+# Avatar renditions (see accounts.avatars), label -> edge length in pixels
+AVATAR_RENDITION_SIZES = {
+    'small': 96,
+    'medium': 256,
+    'large': 512,
+}
+AVATAR_RENDITION_FORMATS = ('webp', 'jpeg')
+AVATAR_WORKERS = 2
+AVATAR_PROCESS_ASYNC = True
+
+# Avatar editor previews (see accounts.editor)
+AVATAR_PREVIEW_SIZE = 256
+AVATAR_PREVIEW_CACHE_TIMEOUT = 600
+
+# Uploads are streamed to disk and capped (see accounts.uploadhandlers)
+FILE_UPLOAD_HANDLERS = [
+    'accounts.uploadhandlers.AvatarUploadHandler',
+]
+AVATAR_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+AVATAR_MAX_DIMENSIONS = (4096, 4096)
\ No newline at end of file
@@ -0,0 +1,39 @@
+from django import template
+from django.contrib.staticfiles.templatetags.staticfiles import static
+from django.utils.html import format_html_join
+
+from project_7 import assets
+
+
+register = template.Library()
+
+
+def bundle_urls(name):
+    """
+    Returns URL of the fingerprinted bundle if the bundles have been built
+    (see build_assets command), otherwise URLs of the individual files
+    """
+
+    hashed_name = assets.manifest().get(name)
+    if hashed_name:
+        return [static(hashed_name)]
+
+    return [static(path) for path in assets.bundles()[name]]
+
+
+@register.simple_tag
+def bundle_css(name):
+    return format_html_join(
+        '\n',
+        '<link rel="stylesheet" href="{}">',
+        ((url,) for url in bundle_urls(name)))
+
+
+@register.simple_tag
+def bundle_js(name):
+    # deferred scripts run in order once the document has been parsed
+    return format_html_join(
+        '\n',
+        '<script type="text/javascript" src="{}" defer></script>',
+        ((url,) for url in bundle_urls(name)))
+
@@ -0,0 +1,742 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db.utils import ConnectionHandler
+from django.shortcuts import render
+from django.template import engines
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from accounts import urls as accounts_urls
+from accounts.models import Profile, search_name
+from project_7 import (
+    assets, budgets, loadtest, metrics, profiling, views, warmup)
+from project_7 import urls as project_urls
+
+
+# MEDIA SERVING TEST
+class MediaServingTest(TestCase):
+    digest = 'ab' * 32
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        os.makedirs(os.path.join(self.media_root, 'avatars', 'ab'))
+        self.path = 'avatars/ab/{}.png'.format(self.digest)
+        with open(os.path.join(self.media_root, self.path), 'wb') as f:
+            f.write(b'0123456789')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_return_immutable_file_with_etag(self):
+        expected = [200, b'0123456789', '"{}"'.format(self.digest), True]
+
+        response = self.client.get('/media/' + self.path)
+
+        result = [
+            response.status_code,
+            b''.join(response.streaming_content),
+            response['ETag'],
+            'immutable' in response['Cache-Control'],
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_not_modified_if_etag_matches(self):
+        expected = 304
+
+        response = self.client.get(
+            '/media/' + self.path,
+            HTTP_IF_NONE_MATCH='"{}"'.format(self.digest))
+
+        result = response.status_code
+
+        self.assertEqual(expected, result)
+
+    def test_return_partial_content_for_byte_range(self):
+        expected = [206, b'2345', 'bytes 2-5/10']
+
+        response = self.client.get(
+            '/media/' + self.path, HTTP_RANGE='bytes=2-5')
+
+        result = [
+            response.status_code,
+            b''.join(response.streaming_content),
+            response['Content-Range'],
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_not_satisfiable_for_range_past_end(self):
+        expected = 416
+
+        response = self.client.get(
+            '/media/' + self.path, HTTP_RANGE='bytes=20-')
+
+        result = response.status_code
+
+        self.assertEqual(expected, result)
+
+    def test_return_not_found_outside_media_root(self):
+        expected = 404
+
+        response = self.client.get('/media/../settings.py')
+
+        result = response.status_code
+
+        self.assertEqual(expected, result)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT_PREFIX='/internal-media/')
+    def test_return_accel_redirect_if_configured(self):
+        expected = '/internal-media/' + self.path
+
+        response = self.client.get('/media/' + self.path)
+
+        result = response['X-Accel-Redirect']
+
+        self.assertEqual(expected, result)
+
+
+# ASSET PIPELINE TEST
+class AssetPipelineTest(TestCase):
+    def setUp(self):
+        self.assets_dir = tempfile.mkdtemp()
+        self.static_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            STATICFILES_DIRS=[self.assets_dir],
+            STATIC_ROOT=self.static_root,
+            ASSET_BUNDLES={'global.css': ['css/global.css']})
+        self.settings_override.enable()
+
+        os.makedirs(os.path.join(self.assets_dir, 'css', 'parts'))
+        with open(os.path.join(self.assets_dir, 'css', 'global.css'),
+                  'w') as f:
+            f.write('@import "parts/base";\n'
+                    '/* comment */\n'
+                    'a:hover {\n  color:  red;\n}\n')
+        with open(os.path.join(
+                self.assets_dir, 'css', 'parts', 'base.css'), 'w') as f:
+            f.write('body {\n  background: url(../../images/star.svg);\n'
+                    '  content: "a  {  b";\n}\n')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        assets._manifest = None
+        shutil.rmtree(self.assets_dir)
+        shutil.rmtree(self.static_root)
+
+    def test_return_resolved_and_minified_stylesheet(self):
+        expected = (
+            'body{background:url("../images/star.svg");content:"a  {  b"}'
+            'a:hover{color:red}')
+
+        result = assets.minify_css(assets.resolve_css('css/global.css'))
+
+        self.assertEqual(expected, result)
+
+    def test_return_precompressed_bundle_if_accepted(self):
+        expected = ['gzip', 'Accept-Encoding', True]
+
+        manifest = assets.build_bundles()
+        response = self.client.get(
+            '/static/' + manifest['global.css'],
+            HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        result = [
+            response['Content-Encoding'],
+            response['Vary'],
+            'immutable' in response['Cache-Control'],
+        ]
+
+        self.assertEqual(expected, result)
+
+
+# LAYOUT TEST
+class LayoutTest(TestCase):
+    def test_return_page_without_third_party_assets(self):
+        expected = [False, False, True]
+
+        content = self.client.get('/').content.decode()
+
+        result = [
+            'fonts.googleapis.com' in content,
+            'code.jquery.com' in content,
+            'js/vendor/jquery-2.2.4.min.js" defer' in content,
+        ]
+
+        self.assertEqual(expected, result)
+
+
+# SESSION TEST
+class SessionTest(TestCase):
+    password = 'Current5!2345444555'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='test', password=self.password)
+
+    def change_password(self, client):
+        return client.post('/profile/password/edit', {
+            'current_password': self.password,
+            'new_password': 'Changed5!2345444555',
+            'confirm_password': 'Changed5!2345444555'})
+
+    def assert_session_auth_hash_verified(self):
+        client = Client()
+        other_client = Client()
+        client.login(username='test', password=self.password)
+        other_client.login(username='test', password=self.password)
+
+        self.change_password(client)
+
+        self.assertEqual(
+            [200, 302],
+            [client.get('/profile/').status_code,
+             other_client.get('/profile/').status_code])
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_return_signed_cookie_sessions_verifying_auth_hash(self):
+        self.assert_session_auth_hash_verified()
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_return_cache_sessions_verifying_auth_hash(self):
+        self.assert_session_auth_hash_verified()
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_return_expired_sessions_deleted_in_batches(self):
+        expected = [5, 1]
+
+        now = timezone.now()
+        for number in range(6):
+            Session.objects.create(
+                session_key='session{}'.format(number),
+                session_data='',
+                expire_date=now + timedelta(days=-1 if number < 5 else 1))
+
+        call_command(
+            'clear_expired_sessions', batch_size=2, stdout=StringIO())
+
+        result = [6 - Session.objects.count(), Session.objects.count()]
+
+        self.assertEqual(expected, result)
+
+
+# DATABASE TEST
+class SQLiteTuningTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'wal', 'synchronous': 'normal', 'busy_timeout': 1234})
+    def test_return_pragmas_applied_to_new_connections(self):
+        expected = ['wal', 1, 1234]
+
+        connection = ConnectionHandler({'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(self.directory, 'test.sqlite3'),
+        }})['default']
+        self.addCleanup(connection.close)
+
+        result = []
+        with connection.cursor() as cursor:
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute('PRAGMA ' + pragma)
+                result.append(cursor.fetchone()[0])
+
+        self.assertEqual(expected, result)
+
+
+# METRICS TEST
+@override_settings(PASSWORD_HASHING={'PBKDF2_ITERATIONS': 1000})
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        User.objects.create_user(username='test', password='hello1')
+
+    def sample(self, text, name, **labels):
+        prefix = '{}{{{}}} '.format(name, metrics._labels(**labels))
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+
+    def test_return_request_measurements_per_view(self):
+        self.client.post('/accounts/sign_in/', {
+            'username': 'test', 'password': 'hello1'})
+        self.client.get('/profile/')
+
+        text = self.client.get('/metrics').content.decode()
+
+        result = [
+            self.sample(
+                text, 'http_request_duration_seconds_count',
+                view='accounts:sign_in'),
+            self.sample(
+                text, 'http_request_sql_queries_sum',
+                view='profile_view') > 0,
+            self.sample(
+                text, 'http_request_template_duration_seconds_sum',
+                view='profile_view') > 0,
+            self.sample(
+                text, 'http_request_password_hash_duration_seconds_sum',
+                view='accounts:sign_in') > 0,
+            self.sample(
+                text, 'http_responses_total',
+                view='accounts:sign_in', status='3xx'),
+        ]
+
+        self.assertEqual([1, True, True, True, 1], result)
+
+    def test_return_cumulative_histogram_buckets(self):
+        expected = [(0.01, 1), (0.1, 2), ('+Inf', 3)]
+
+        histogram = metrics.Histogram((0.01, 0.1))
+        for value in (0.005, 0.05, 5):
+            histogram.observe(value)
+
+        result = list(histogram.cumulative())
+
+        self.assertEqual(expected, result)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_return_not_found_for_other_addresses(self):
+        expected = 404
+
+        result = self.client.get('/metrics').status_code
+
+        self.assertEqual(expected, result)
+
+    @override_settings(TRUSTED_PROXIES=['127.0.0.1'])
+    def test_return_not_found_for_clients_behind_proxy(self):
+        expected = [404, 200]
+
+        result = [
+            self.client.get(
+                '/metrics', HTTP_X_FORWARDED_FOR=forwarded).status_code
+            for forwarded in ('203.0.113.9', '127.0.0.1')]
+
+        self.assertEqual(expected, result)
+
+
+# PROFILING TEST
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def slow_render(self, *args, **kwargs):
+        # long enough for the stack sampler to catch the request
+        time.sleep(0.05)
+        return render(*args, **kwargs)
+
+    def test_return_profile_and_slow_stacks_tagged_with_view(self):
+        expected = [['home'], ['collapsed', 'prof'], True]
+
+        with override_settings(PROFILING={
+                'ENABLED': True,
+                'SAMPLE_RATE': 1,
+                'SLOW_THRESHOLD': 0,
+                'SAMPLE_INTERVAL': 1,
+                'DIRECTORY': self.directory}):
+            with mock.patch.object(views, 'render', self.slow_render):
+                self.client.get('/')
+
+        matches = [
+            profiling.CAPTURE_NAME.match(name)
+            for name in os.listdir(self.directory)]
+        output = StringIO()
+        call_command(
+            'profile_summary', directory=self.directory, stdout=output)
+
+        result = [
+            sorted({match.group('view') for match in matches}),
+            sorted(match.group('kind') for match in matches),
+            '1 sampled request profile(s)' in output.getvalue(),
+        ]
+
+        self.assertEqual(expected, result)
+
+    def sampler_threads(self):
+        return sum(
+            thread.name == 'stack-sampler'
+            for thread in threading.enumerate())
+
+    def test_return_sampler_started_per_process_on_first_request(self):
+        expected = [0, 1, 2]
+
+        initial = self.sampler_threads()
+        sampler = profiling.StackSampler(0.001)
+        result = [self.sampler_threads() - initial]
+
+        sampler.start(threading.get_ident())
+        sampler.stop(threading.get_ident())
+        result.append(self.sampler_threads() - initial)
+
+        # a forked worker, whose copy of the lock is held by the parent
+        sampler._lock.acquire()
+        with mock.patch.object(
+                profiling.os, 'getpid', return_value=os.getpid() + 1):
+            sampler.start(threading.get_ident())
+            sampler.stop(threading.get_ident())
+        result.append(self.sampler_threads() - initial)
+
+        self.assertEqual(expected, result)
+
+    def test_return_oldest_captures_rotated_out(self):
+        expected = ['3-home-1ms.prof', '4-home-1ms.prof']
+
+        for number in range(5):
+            open(os.path.join(
+                self.directory, '{}-home-1ms.prof'.format(number)), 'w').close()
+
+        profiling.rotate(self.directory, 2)
+
+        result = sorted(os.listdir(self.directory))
+
+        self.assertEqual(expected, result)
+
+
+# FLOW BENCHMARK TEST
+class BenchmarkFlowsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def report(self, requests_per_second, p50, p95):
+        return {
+            'requests_per_second': requests_per_second,
+            'steps': {'profile_view': {'p50_ms': p50, 'p95_ms': p95}},
+        }
+
+    def test_return_every_step_of_the_flow_completed(self):
+        expected = [0, [
+            'profile_edit GET',
+            'profile_edit POST',
+            'profile_password_edit GET',
+            'profile_password_edit POST',
+            'profile_view',
+            'sign_in GET',
+            'sign_in POST',
+            'sign_out',
+            'sign_up GET',
+            'sign_up POST',
+        ], 2, True]
+
+        with override_settings(MEDIA_ROOT=self.media_root):
+            recorder, duration = loadtest.run(loadtest.InProcessClient, 1, 1)
+        report = loadtest.summarize(recorder, duration)
+
+        result = [
+            report['errors'],
+            sorted(report['steps']),
+            report['steps']['sign_out']['requests'],
+            User.objects.get().check_password('Velvet@Harbor92'),
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_nearest_rank_percentiles(self):
+        expected = [5, 10, 10]
+
+        values = list(range(1, 11))
+
+        result = [
+            loadtest.percentile(values, 50),
+            loadtest.percentile(values, 95),
+            loadtest.percentile(values, 99),
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_regressions_beyond_threshold(self):
+        expected = [
+            [],
+            ['requests_per_second: 100 -> 80 (-20%)',
+             'profile_view p95_ms: 10 -> 13 (+30%)'],
+        ]
+
+        baseline = self.report(100, 5, 10)
+
+        result = [
+            loadtest.compare(baseline, self.report(95, 5.4, 10.5), 0.1),
+            loadtest.compare(baseline, self.report(80, 5.4, 13), 0.1),
+        ]
+
+        self.assertEqual(expected, result)
+
+
+# REQUEST BUDGET TEST
+class RequestBudgetTest(TestCase):
+    password = 'Quartz#Lantern47'
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user(
+            username='moe', password=self.password)
+        Profile.objects.filter(user=self.user).update(
+            first_name='Moe', last_name='Gu', email='moe@example.com',
+            confirm_email='moe@example.com', date_of_birth='1990-01-01',
+            search_name=search_name('Moe', 'Gu'))
+        self.client.login(username='moe', password=self.password)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def assertWithinBudget(self, method, path, data=None, **extra):
+        response, measurement = budgets.measure(
+            self.client, method, path, data, **extra)
+        self.assertEqual(
+            [], budgets.violations(measurement), budgets.report(measurement))
+        return response
+
+    def add_avatar(self):
+        profile = Profile.objects.get(user=self.user)
+        profile.avatar.save('moe.png', loadtest.avatar_upload())
+        cache.clear()
+
+    def profile_data(self, **data):
+        return dict({
+            'first_name': 'Moe',
+            'last_name': 'Gu',
+            'date_of_birth': '1990-01-01',
+            'email': 'moe@example.com',
+            'confirm_email': 'moe@example.com',
+            'short_bio': 'Writes profiles for a living.',
+        }, **data)
+
+    def test_return_every_route_with_a_budget(self):
+        expected = sorted(budgets.BUDGETS)
+
+        names = [
+            pattern.name for pattern in project_urls.urlpatterns
+            if getattr(pattern, 'name', None)]
+        names.extend(
+            'accounts:' + pattern.name
+            for pattern in accounts_urls.urlpatterns)
+
+        result = sorted(names)
+
+        self.assertEqual(expected, result)
+
+    def test_return_violations_listing_the_queries(self):
+        expected = [
+            ['profile_view GET: 2 queries, the budget is 0'],
+            True,
+        ]
+
+        self.client.get('/profile/')
+        _, measurement = budgets.measure(self.client, 'GET', '/profile/')
+
+        with mock.patch.dict(budgets.BUDGETS, {'profile_view': {
+                'GET': {'queries': 0, 'templates': 10, 'ms': 1000}}}):
+            result = [
+                budgets.violations(measurement),
+                '1. SELECT' in budgets.report(measurement),
+            ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_time_budget_enforced_only_if_enabled(self):
+        expected = [[], ['home GET: 5.0 ms, the budget is 1']]
+
+        measurement = {
+            'view': 'home', 'method': 'GET', 'queries': [], 'templates': [],
+            'ms': 5.0}
+        limits = {'home': {'GET': {'queries': 0, 'templates': 0, 'ms': 1}}}
+
+        result = []
+        for enforced in (False, True):
+            with self.settings(ENFORCE_TIME_BUDGETS=enforced):
+                result.append(budgets.violations(measurement, limits))
+
+        self.assertEqual(expected, result)
+
+    def test_return_home_within_budget(self):
+        self.assertWithinBudget('GET', '/')
+
+    def test_return_sign_up_within_budget(self):
+        expected = 302
+
+        self.client.logout()
+        self.assertWithinBudget('GET', '/accounts/sign_up/')
+        response = self.assertWithinBudget('POST', '/accounts/sign_up/', {
+            'username': 'ada',
+            'password1': self.password,
+            'password2': self.password,
+        })
+
+        result = response.status_code
+
+        self.assertEqual(expected, result)
+
+    def test_return_sign_in_within_budget(self):
+        expected = 302
+
+        self.client.logout()
+        self.assertWithinBudget('GET', '/accounts/sign_in/')
+        response = self.assertWithinBudget('POST', '/accounts/sign_in/', {
+            'username': 'moe', 'password': self.password})
+
+        result = response.status_code
+
+        self.assertEqual(expected, result)
+
+    def test_return_sign_out_within_budget(self):
+        self.assertWithinBudget('GET', '/accounts/sign_out/')
+
+    def test_return_profile_view_within_budget(self):
+        self.add_avatar()
+        self.assertWithinBudget('GET', '/profile/')
+        # served from the page cache
+        self.assertWithinBudget('GET', '/profile/')
+
+    def test_return_profile_edit_within_budget(self):
+        expected = 302
+
+        self.assertWithinBudget('GET', '/profile/edit')
+        response = self.assertWithinBudget(
+            'POST', '/profile/edit',
+            self.profile_data(avatar=loadtest.avatar_upload()))
+
+        result = response.status_code
+
+        self.assertEqual(expected, result)
+
+    def test_return_profile_password_edit_within_budget(self):
+        expected = 302
+
+        self.assertWithinBudget('GET', '/profile/password/edit')
+        response = self.assertWithinBudget(
+            'POST', '/profile/password/edit', {
+                'current_password': self.password,
+                'new_password': 'Velvet@Harbor92',
+                'confirm_password': 'Velvet@Harbor92',
+            })
+
+        result = response.status_code
+
+        self.assertEqual(expected, result)
+
+    def test_return_profile_avatar_edit_within_budget(self):
+        expected = 302
+
+        self.add_avatar()
+        self.assertWithinBudget('GET', '/profile/avatar/edit')
+        self.assertWithinBudget(
+            'GET', '/profile/avatar/preview', {'rotate': 90})
+        response = self.assertWithinBudget(
+            'POST', '/profile/avatar/edit', {'rotate': 90})
+
+        result = response.status_code
+
+        self.assertEqual(expected, result)
+
+    def test_return_profile_search_within_budget(self):
+        expected = 1
+
+        response = self.assertWithinBudget(
+            'GET', '/profile/search', {'q': 'moe'})
+
+        result = len(response.json()['results'])
+
+        self.assertEqual(expected, result)
+
+    def test_return_metrics_within_budget(self):
+        self.assertWithinBudget('GET', '/metrics')
+
+    def test_return_media_and_bundles_within_budget(self):
+        expected = [200, 404]
+
+        self.add_avatar()
+        avatar = Profile.objects.get(user=self.user).avatar
+
+        result = [
+            self.assertWithinBudget('GET', avatar.url).status_code,
+            self.assertWithinBudget(
+                'GET', '/static/bundles/missing.css').status_code,
+        ]
+
+        self.assertEqual(expected, result)
+
+
+# WARM-UP TEST
+class WarmupTest(TestCase):
+    def cached_templates(self):
+        return [dict(settings.TEMPLATES[0], OPTIONS=dict(
+            settings.TEMPLATES[0]['OPTIONS'],
+            loaders=[('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ])]))]
+
+    def test_return_project_and_app_templates_found(self):
+        expected = [True, True, True]
+
+        names = list(warmup.template_names(engines['django'].engine))
+
+        result = [
+            'profile.html' in names,
+            'accounts/sign_in.html' in names,
+            'admin/base.html' in names,
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_templates_compiled_into_cached_loader(self):
+        expected = [True, True, True]
+
+        with override_settings(TEMPLATES=self.cached_templates()):
+            warmup.compile_templates()
+            loader = engines['django'].engine.template_loaders[0]
+            cached = {key.split('-')[0] for key in loader.get_template_cache}
+
+        result = [
+            'layout.html' in cached,
+            'profile_edit.html' in cached,
+            'accounts/sign_up.html' in cached,
+        ]
+
+        self.assertEqual(expected, result)
+
+    def test_return_middleware_loaded_and_gc_frozen(self):
+        expected = [True, True, True]
+
+        handler = WSGIHandler()
+        with mock.patch.object(warmup.gc, 'freeze', create=True) as freeze:
+            stats = warmup.warm(handler)
+
+        result = [
+            handler._request_middleware is not None,
+            stats['urls'] >= len(budgets.BUDGETS),
+            freeze.called,
+        ]
+
+        self.assertEqual(expected, result)
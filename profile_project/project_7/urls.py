@@ -13,24 +13,42 @@ Including another URLconf
     1. Import the include() function: from django.conf.urls import url, include
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
+import re
+
 from django.conf.urls import url, include
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.conf import settings
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 
-from . import views
+from . import metrics, serving, views
 
 urlpatterns = [
     url(r'^profile/password/edit$', views.profile_password_edit,
         name='profile_password_edit'),
+    url(r'^profile/avatar/edit$', views.profile_avatar_edit,
+        name='profile_avatar_edit'),
+    url(r'^profile/avatar/preview$', views.profile_avatar_preview,
+        name='profile_avatar_preview'),
+    url(r'^profile/search$', views.profile_search,
+        name='profile_search'),
     url(r'^profile/edit', views.profile_edit,
         name='profile_edit'),
     url(r'^profile/', views.profile_view,
         name='profile_view'),
+    url(r'^metrics$', metrics.metrics, name='metrics'),
     url(r'^admin/', admin.site.urls),
     url(r'^accounts/', include('accounts.urls', namespace='accounts')),
     url(r'^$', views.home, name='home')
 ]
+urlpatterns += [
+    url(r'^{}bundles/(?P<path>.*)$'.format(
+        re.escape(settings.STATIC_URL.lstrip('/'))),
+        serving.serve_bundle,
+        name='bundle'),
+]
 urlpatterns += staticfiles_urlpatterns()
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+urlpatterns += [
+    url(r'^{}(?P<path>.*)$'.format(re.escape(settings.MEDIA_URL.lstrip('/'))),
+        serving.serve_media,
+        name='media'),
+]
@@ -1,12 +1,19 @@
+import os
+
 from django.shortcuts import render, get_object_or_404
+from django.core.files.base import ContentFile
 from django.core.urlresolvers import reverse
-from django.http import HttpResponseRedirect
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse)
 from django.contrib import messages
-from django.contrib.auth import authenticate, login
+from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 
-from accounts import forms, models
+from accounts import avatars, editor, forms, models, profiles
 
 
 def home(request):
@@ -16,26 +23,62 @@ def home(request):
 @login_required
 def profile_view(request):
     """
-    Renders profile page. User profile is created if it doesn't exist
-    (due to newly creation of account)
+    Renders profile page. User profile is created along with the account
+    (see accounts.signals), so this is a read only view. The rendered page is
+    cached until the profile changes.
     """
 
-    try:
-        profile = models.Profile.objects.get(user=request.user)
-    except models.Profile.DoesNotExist:
-        profile = models.Profile.objects.create(user=request.user)
+    # pages with pending messages are personal to this request
+    cacheable = not len(messages.get_messages(request))
+
+    if cacheable:
+        content = profiles.get_cached_page(request.user.pk, 'profile_view')
+        if content is not None:
+            return HttpResponse(content)
 
-    return render(request, 'profile.html', {
+    profile = profiles.get_profile_or_404(request.user)
+
+    response = render(request, 'profile.html', {
         'profile': profile
     })
 
+    if cacheable:
+        profiles.set_cached_page(
+            request.user.pk, 'profile_view', response.content)
+
+    return response
+
+
+@login_required
+def profile_search(request):
+    """
+    Returns JSON of the profiles whose full name or email starts with the q
+    parameter, i.e. {"results": [{"username": "moe", "first_name": "Moe",
+    "last_name": "Gu"}]}. At most limit (default 20, at most 100) profiles
+    are returned, ordered by name.
+    """
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+
+    results = models.Profile.objects.search(
+        request.GET.get('q', '')).order_by('search_name').values(
+            'user__username', 'first_name', 'last_name')[:limit]
+
+    return JsonResponse({'results': [{
+        'username': result['user__username'],
+        'first_name': result['first_name'],
+        'last_name': result['last_name'],
+    } for result in results]})
+
 
 @login_required
 def profile_edit(request):
     """
-    Renders profile edit page. User profile is pre-filled, or created anew with
-    empty fields if it doesn't exist. Form is saved only if the following
-    criteria are satisfied:
+    Renders profile edit page. User profile is pre-filled. Form is saved only
+    if the following criteria are satisfied:
         - Date of Birth is one of three formats: YYYY-MM-DD, MM/DD/YYYY,
         or MM/DD/YY.
         - Email and confirm email match and are in a valid format.
@@ -43,12 +86,8 @@ def profile_edit(request):
         formatting.
     """
 
-    try:
-        profile = models.Profile.objects.get(user=request.user)
-        form = forms.ProfileForm(instance=profile)
-    except models.Profile.DoesNotExist:
-        form = forms.ProfileForm()
-        profile = models.Profile.objects.create(user=request.user)
+    profile = profiles.get_profile_or_404(request.user)
+    form = forms.ProfileForm(instance=profile)
 
     if request.method == 'POST':
         form = forms.ProfileForm(request.POST, request.FILES, instance=profile)
@@ -68,6 +107,65 @@ def profile_edit(request):
     })
 
 
+@login_required
+def profile_avatar_edit(request):
+    """
+    Renders avatar edit page and saves the edited avatar. The page previews
+    the edit (rotate, flip and crop) through profile_avatar_preview; the
+    full resolution avatar is rendered only once, when the edit is saved.
+    """
+
+    profile = profiles.get_profile_or_404(request.user)
+
+    if not profile.avatar:
+        messages.error(request, "Please upload an avatar first")
+        return HttpResponseRedirect(reverse('profile_edit'))
+
+    form = forms.AvatarEditForm(request.GET or None)
+
+    if request.method == 'POST':
+        form = forms.AvatarEditForm(request.POST)
+
+        if form.is_valid():
+            root, extension = os.path.splitext(
+                os.path.basename(profile.avatar.name))
+            avatars.replace_avatar(
+                profile,
+                '{}_edited{}'.format(root, extension),
+                ContentFile(editor.render_full(
+                    profile.avatar, form.operations())))
+
+            messages.success(request, "Avatar has been updated successfully")
+
+            return HttpResponseRedirect(reverse('profile_view'))
+
+    return render(request, 'profile_avatar_edit.html', {
+        'form': form,
+        'profile': profile,
+        'preview_query': request.GET.urlencode()
+    })
+
+
+@login_required
+def profile_avatar_preview(request):
+    """
+    Returns low resolution JPEG preview of the avatar edit given by the
+    query string
+    """
+
+    profile = profiles.get_profile_or_404(request.user)
+    form = forms.AvatarEditForm(request.GET)
+
+    if not profile.avatar or not form.is_valid():
+        raise Http404('No preview available')
+
+    response = HttpResponse(
+        editor.render_preview(profile.avatar, form.operations()),
+        content_type='image/jpeg')
+    response['Cache-Control'] = 'private, max-age=600'
+    return response
+
+
 @login_required
 def profile_password_edit(request):
     """
@@ -85,10 +183,7 @@ def profile_password_edit(request):
 
     user = request.user
 
-    try:
-        profile = models.Profile.objects.get(user=user)
-    except models.Profile.DoesNotExist:
-        profile = models.Profile.objects.create(user=user)
+    profile = profiles.get_profile_or_404(user)
 
     form = forms.ChangePasswordForm(user=user, profile=profile)
 
@@ -111,13 +206,9 @@ def profile_password_edit(request):
             user.set_password(form.cleaned_data['new_password'])
             user.save()
 
-            # re-auth user to circumvent force log-out issue
-            user = authenticate(
-                username=user,
-                password=form.cleaned_data['new_password']
-            )
-
-            login(request, user)
+            # keep the session valid for the new password without verifying
+            # the password (hashing it) once more
+            update_session_auth_hash(request, user)
 
             messages.success(
                 request,
@@ -0,0 +1,161 @@
+import gc
+import logging
+import os
+import time
+from importlib import import_module
+
+from django.apps import apps
+from django.core.urlresolvers import get_resolver
+from django.template import TemplateSyntaxError, engines
+from django.utils.module_loading import module_has_submodule
+
+
+logger = logging.getLogger(__name__)
+
+# extensions of the files compiled as templates
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+# submodules imported from every installed app
+APP_MODULES = ('models', 'forms', 'views', 'admin')
+
+
+def template_names(engine):
+    """
+    Yields the name of every template file in the directories of the
+    loaders of engine (django.template.Engine)
+    """
+
+    loaders = []
+    for loader in engine.template_loaders:
+        # the cached loader wraps the loaders finding the files
+        loaders.extend(getattr(loader, 'loaders', [loader]))
+
+    seen = set()
+    for loader in loaders:
+        for directory in loader.get_dirs():
+            for root, _, files in os.walk(directory):
+                for filename in sorted(files):
+                    if not filename.endswith(TEMPLATE_EXTENSIONS):
+                        continue
+                    name = os.path.relpath(
+                        os.path.join(root, filename),
+                        directory).replace(os.sep, '/')
+                    if name not in seen:
+                        seen.add(name)
+                        yield name
+
+
+def compile_templates():
+    """
+    Compiles every template of the Django template engines, which keeps
+    them in memory if the cached loader is configured
+
+    Returns:
+        Number of compiled templates (int)
+    """
+
+    count = 0
+    for backend in engines.all():
+        engine = getattr(backend, 'engine', None)
+        if engine is None:
+            continue
+        for name in template_names(engine):
+            try:
+                engine.get_template(name)
+            except TemplateSyntaxError:
+                # i.e. fragments of other template languages
+                logger.warning('Template %s does not compile', name)
+                continue
+            count += 1
+    return count
+
+
+def resolve_urls(resolver=None):
+    """
+    Compiles the patterns of the URLconf and builds its reverse lookups
+
+    Returns:
+        Number of URL patterns (int)
+    """
+
+    if resolver is None:
+        resolver = get_resolver()
+
+    resolver.reverse_dict
+    resolver.namespace_dict
+
+    count = 0
+    for pattern in resolver.url_patterns:
+        pattern.regex
+        if hasattr(pattern, 'url_patterns'):
+            count += resolve_urls(pattern)
+        else:
+            pattern.callback
+            count += 1
+    return count
+
+
+def import_modules():
+    """
+    Imports the APP_MODULES of the installed apps
+
+    Returns:
+        Number of imported modules (int)
+    """
+
+    count = 0
+    for app_config in apps.get_app_configs():
+        for name in APP_MODULES:
+            if module_has_submodule(app_config.module, name):
+                import_module('{}.{}'.format(app_config.name, name))
+                count += 1
+    return count
+
+
+def freeze_gc():
+    """
+    Moves the objects allocated so far out of the garbage collector's reach
+    (Python 3.7+), so collections in forked workers don't write to them and
+    their memory stays shared copy-on-write
+
+    Returns:
+        True if the objects were frozen, False otherwise
+    """
+
+    gc.collect()
+    if not hasattr(gc, 'freeze'):
+        return False
+    gc.freeze()
+    return True
+
+
+def warm(handler=None):
+    """
+    Does the work of the first requests ahead of them: loads the middleware
+    of handler (WSGIHandler), compiles the templates, resolves the URLconf
+    and imports the apps' modules, then freezes the garbage collector
+
+    Returns:
+        dict of the counts of warmed templates, URL patterns and modules,
+        whether the garbage collector was frozen and the seconds taken
+    """
+
+    start = time.perf_counter()
+
+    # WSGIHandler loads its middleware on the first request otherwise
+    if handler is not None and handler._request_middleware is None:
+        with handler.initLock:
+            if handler._request_middleware is None:
+                handler.load_middleware()
+
+    stats = {
+        'templates': compile_templates(),
+        'urls': resolve_urls(),
+        'modules': import_modules(),
+        'frozen': freeze_gc(),
+    }
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+
+    logger.info(
+        'Warmed up %(templates)s templates, %(urls)s URL patterns and '
+        '%(modules)s modules in %(seconds)ss', stats)
+    return stats
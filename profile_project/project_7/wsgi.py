@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project_7.settings")
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+from project_7 import warmup  # noqa: E402
+
+if settings.WARMUP:
+    warmup.warm(application)